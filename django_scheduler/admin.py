@@ -5,7 +5,7 @@ from .models import Job
 
 @admin.register(Job)
 class JobAdmin(admin.ModelAdmin):
-    list_display = ['key', 'last_run']
+    list_display = ['key', 'last_run', 'next_run', 'lease_owner', 'lease_until']
 
     def has_add_permission(self, request):
         return False
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_scheduler', '0002_job_next_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
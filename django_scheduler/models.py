@@ -1,22 +1,43 @@
 import datetime
+import heapq
 import inspect
 import logging
+import socket
 import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Callable
 
 from django.db import models, transaction
 from django.utils import timezone
 
+from .notifications import Listener
+
 
 logger = logging.getLogger(__name__)
 
 
+# while jobs run, how often the scheduler checks whether one finished
+POLL_INTERVAL = datetime.timedelta(milliseconds=100)
+# A running job holds a lease on its row, so no other instance runs it meanwhile.
+# The scheduler renews the leases of its running jobs,
+# so a lease outlives its holder by this long at most.
+LEASE_DURATION = datetime.timedelta(minutes=1)
+LEASE_RENEW_INTERVAL = LEASE_DURATION / 3
+# identifies this process as a lease holder
+LEASE_OWNER = f'{socket.gethostname()}:{uuid.uuid4().hex[:12]}'
+
+
 class Job(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     key = models.CharField(max_length=100, unique=True)
     last_run = models.DateTimeField(null=True, blank=True)
+    # set by each run, from the interval or the handler's RunAgain
+    next_run = models.DateTimeField(null=True, blank=True)
+    # who runs the job right now, see acquire_lease
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_until = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['key']
@@ -30,20 +51,44 @@ class LocalJob:
     key: str
     handler: Callable
     interval: datetime.timedelta
+    # a NOTIFY channel that runs the job right away, due or not
+    wake_on: str | None = None
+    # Runs in every instance on a schedule of its own, kept in memory only,
+    # for jobs that split their work between instances themselves.
+    per_instance: bool = False
+
+
+@dataclass(frozen=True)
+class RunAgain:
+    """
+    What a handler may return to override its job's interval once.
+
+    `RunAgain()` runs the job again right away, as there is more work waiting;
+    `RunAgain(after=...)` runs it after that long,
+    for instance longer than the interval while there is nothing to do.
+    Returning anything else keeps the interval.
+    """
+    after: datetime.timedelta = datetime.timedelta(0)
 
 
 _local_jobs = []
 
 
-def register_job(handler, interval, key=None):
-    job = get_job_from_function(handler, interval, key)
+def register_job(handler, interval, key=None, wake_on=None, per_instance=False):
+    job = get_job_from_function(handler, interval, key, wake_on, per_instance)
     _local_jobs.append(job)
 
 
-def get_job_from_function(handler, interval, key=None):
+def get_job_from_function(handler, interval, key=None, wake_on=None, per_instance=False):
     if key is None:
         key = inspect.getmodule(handler).__name__ + '.' + handler.__name__
-    return LocalJob(key=key, handler=handler, interval=interval)
+    return LocalJob(
+        key=key,
+        handler=handler,
+        interval=interval,
+        wake_on=wake_on,
+        per_instance=per_instance,
+    )
 
 
 def run(local_jobs=None, blocking=True, stop_event=None):
@@ -56,46 +101,98 @@ def run(local_jobs=None, blocking=True, stop_event=None):
         local_jobs = _local_jobs.copy()
         del _local_jobs  # prevent adding more jobs after we started
 
-    # build a queue of jobs to run
-    db_jobs = get_or_create_db_jobs(local_jobs)
+    # build a heap of jobs to run, the index breaks ties as jobs don't compare
+    db_jobs = get_or_create_db_jobs([job for job in local_jobs if not job.per_instance])
     queue = []
     now = timezone.now()
-    for local_job in local_jobs:
-        db_job = db_jobs[local_job.key]
-        if db_job.last_run:
-            next_run = db_job.last_run + local_job.interval
-        else:
-            next_run = now
-        queue.append((next_run, local_job))
-    queue.sort(key=lambda x: x[0])
+    for index, local_job in enumerate(local_jobs):
+        next_run = None
+        if not local_job.per_instance:
+            next_run = get_next_run(db_jobs[local_job.key], local_job)
+        queue.append((next_run or now, index, local_job))
+    heapq.heapify(queue)
     del db_jobs
-    del local_jobs
 
-    logger.info("Starting scheduler. Jobs: %s", [job.key for _, job in queue])
+    logger.info("Starting scheduler. Jobs: %s", [job.key for job in local_jobs])
+
+    # Every job gets a thread, so a slow one doesn't hold back the second-interval ticks.
+    # A running job is out of the queue, so it never overlaps itself in this process;
+    # the lease on its row keeps other processes from overlapping it.
+    listener = None
+    if blocking and (channels := {job.wake_on for job in local_jobs if job.wake_on}):
+        listener = Listener(channels, stop_event)
+        listener.start()
+    try:
+        with ThreadPoolExecutor(
+            max_workers=max(len(local_jobs), 1),
+            thread_name_prefix='scheduler',
+        ) as executor:
+            _run_queue(queue, executor, blocking, stop_event, listener)
+    finally:
+        if listener is not None:
+            listener.stop()
+            listener.join()
+
 
-    # run jobs
+def _run_queue(queue, executor, blocking, stop_event, listener=None):
+    running = {}  # future -> (index, local job)
+    woken = set()  # keys of jobs notified to run as soon as they can
+    leases_renewed_at = timezone.now()
+    snapshot = listener.snapshot() if listener else None
     while not stop_event.is_set():
+        for future in [future for future in running if future.done()]:
+            index, local_job = running.pop(future)
+            # a job that crashed run_job itself takes the scheduler down, as it always did
+            db_job = future.result()
+            heapq.heappush(queue, (get_next_run(db_job, local_job), index, local_job))
+
         now = timezone.now()
-        if not queue:
+        if listener is not None:
+            channels, snapshot = listener.notified_since(snapshot)
+            woken.update(
+                local_job.key
+                for local_job in [job for _, _, job in queue] + [job for _, job in running.values()]
+                if local_job.wake_on in channels
+            )
+        if woken:
+            # a woken job that is running goes again once it finishes
+            queue = [
+                (now if local_job.key in woken else next_run, index, local_job)
+                for next_run, index, local_job in queue
+            ]
+            heapq.heapify(queue)
+        if running and now - leases_renewed_at >= LEASE_RENEW_INTERVAL:
+            renew_leases([local_job for _, local_job in running.values()], now)
+            leases_renewed_at = now
+        while queue and queue[0][0] <= now:
+            _, index, local_job = heapq.heappop(queue)
+            future = executor.submit(run_job, local_job, woken=local_job.key in woken)
+            woken.discard(local_job.key)
+            running[future] = (index, local_job)
+
+        if not queue and not running:
             logger.info("No jobs in queue, exiting")
             break
-
-        next_run, local_job = queue[0]
-        if next_run > now:
-            if not blocking:
-                logger.info("Next job is in the future, exiting")
-                break
-            time_to_sleep = (next_run - now).total_seconds()
-            logger.info("Sleeping for %s seconds until next job %s", time_to_sleep, local_job.key)
-            if stop_event.wait(time_to_sleep):
-                logger.info("Stop requested, exiting")
-                break
-
-        next_run, local_job = queue.pop(0)
-        db_job = run_job(local_job)
-
-        queue.append((db_job.last_run + local_job.interval, local_job))
-        queue.sort(key=lambda x: x[0])
+        if running:
+            # wake up for whichever comes first, a job finishing or the next one due
+            timeout = POLL_INTERVAL
+            if queue:
+                timeout = min(timeout, queue[0][0] - now)
+        elif not blocking:
+            logger.info("Next job is in the future, exiting")
+            break
+        else:
+            timeout = queue[0][0] - now
+            logger.info("Sleeping for %s seconds until next job %s", timeout.total_seconds(), queue[0][2].key)
+        if listener is None:
+            stopped = stop_event.wait(timeout.total_seconds())
+        else:
+            # the channels notified are picked up at the top of the loop
+            listener.wait(snapshot, timeout.total_seconds())
+            stopped = stop_event.is_set()
+        if stopped:
+            logger.info("Stop requested, exiting")
+            break
 
 
 def get_or_create_db_jobs(local_jobs):
@@ -114,29 +211,97 @@ def get_or_create_db_jobs(local_jobs):
     return db_jobs
 
 
-@transaction.atomic
-def run_job(local_job):
-    db_job = Job.objects.filter(
-        key=local_job.key,
-    ).select_for_update(
-        no_key=True,
-    ).first()
-    if not db_job:
-        db_job = get_or_create_db_jobs([local_job])[local_job.key]
+def run_job(local_job, woken=False):
+    """
+    Run the job if it is due, or woken by a notification,
+    and no other instance is running it.
 
+    The handler runs outside of any transaction of ours,
+    handlers that need one open it themselves.
+    A per-instance job is neither checked nor recorded in the DB,
+    the returned row is unsaved.
+    """
     now = timezone.now()
-    if db_job.last_run:
-        next_run = db_job.last_run + local_job.interval
-        if next_run > now:
-            logger.info("Job %s is not due yet, skipping", local_job.key)
+    if local_job.per_instance:
+        db_job = Job(key=local_job.key)
+    else:
+        db_job, leased = acquire_lease(local_job, now, woken)
+        if not leased:
             return db_job
 
     logger.info("Running job %s", local_job.key)
+    hint = None
     try:
-        with transaction.atomic():  # savepoint protects from transaction errors in handler
-            local_job.handler(now=now)
+        hint = local_job.handler(now=now)
     except Exception:
         logger.exception("Error running job %s", local_job.key)
     db_job.last_run = now
-    db_job.save(update_fields=['last_run'])
+    if isinstance(hint, RunAgain):
+        db_job.next_run = now + hint.after
+    else:
+        db_job.next_run = now + local_job.interval
+    if local_job.per_instance:
+        return db_job
+    db_job.lease_owner = ''
+    db_job.lease_until = None
+    if not Job.objects.filter(
+        key=local_job.key,
+        lease_owner=LEASE_OWNER,
+    ).update(
+        last_run=db_job.last_run,
+        next_run=db_job.next_run,
+        lease_owner='',
+        lease_until=None,
+    ):
+        logger.warning("Job %s lost its lease while running", local_job.key)
     return db_job
+
+
+@transaction.atomic
+def acquire_lease(local_job, now, woken=False):
+    """
+    Lease the job's row for this process, if the job is due (or woken) and the row is free.
+
+    The row is locked only for this short transaction.
+    Returns the row and whether it was leased.
+    """
+    db_job = Job.objects.filter(
+        key=local_job.key,
+    ).select_for_update(
+        no_key=True,
+    ).first()
+    if not db_job:
+        get_or_create_db_jobs([local_job])
+        db_job = Job.objects.select_for_update(no_key=True).get(key=local_job.key)
+
+    next_run = get_next_run(db_job, local_job)
+    if not woken and next_run is not None and next_run > now:
+        logger.info("Job %s is not due yet, skipping", local_job.key)
+        return db_job, False
+    if db_job.lease_until is not None and db_job.lease_until > now:
+        logger.info("Job %s is running at %s, skipping", local_job.key, db_job.lease_owner)
+        return db_job, False
+
+    db_job.lease_owner = LEASE_OWNER
+    db_job.lease_until = now + LEASE_DURATION
+    db_job.save(update_fields=['lease_owner', 'lease_until'])
+    return db_job, True
+
+
+def renew_leases(local_jobs, now):
+    Job.objects.filter(
+        key__in=[local_job.key for local_job in local_jobs],
+        lease_owner=LEASE_OWNER,
+    ).update(
+        lease_until=now + LEASE_DURATION,
+    )
+
+
+def get_next_run(db_job, local_job):
+    """When the job is due, None if it never ran."""
+    if db_job.next_run is not None:
+        return db_job.next_run
+    if db_job.last_run is not None:
+        # ran before runs recorded when they are due next
+        return db_job.last_run + local_job.interval
+    return None
@@ -4,12 +4,14 @@ from datetime import timedelta
 from unittest.mock import Mock
 
 import pytest
+from django.db import connection
 from django.utils import timezone
 
 from .models import (
-    Job, LocalJob, _local_jobs, get_or_create_db_jobs, register_job, run,
-    run_job,
+    LEASE_DURATION, LEASE_OWNER, Job, LocalJob, RunAgain, _local_jobs,
+    get_or_create_db_jobs, register_job, renew_leases, run, run_job,
 )
+from .notifications import notify
 
 
 @pytest.mark.django_db
@@ -38,7 +40,7 @@ def test_register_job():
     assert local_job.key == "django_scheduler.models_tests.sample_handler"
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(transaction=True)
 def test_run_executes_job_immediately():
     """Test job with no last_run gets executed immediately"""
     mock_handler = Mock()
@@ -57,7 +59,7 @@ def test_run_executes_job_immediately():
     assert db_job.last_run == now
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(transaction=True)
 def test_job_not_run_if_interval_not_passed():
     """Test job isn't run if interval hasn't passed"""
     mock_handler = Mock()
@@ -106,7 +108,7 @@ def test_get_or_create_db_jobs():
     assert Job.objects.filter(key="job2").exists()
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(transaction=True)
 def test_non_blocking_exits_early(caplog):
     """Test non-blocking mode exits when jobs are in future"""
     Job.objects.create(
@@ -152,7 +154,7 @@ def test_stop_event_interrupts_sleep():
     assert not handler.called
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(transaction=True)
 def test_pre_set_stop_event_exits_immediately():
     """A stop_event set before run() skips even due jobs"""
     handler = Mock()
@@ -167,3 +169,210 @@ def test_pre_set_stop_event_exits_immediately():
     run([local_job], stop_event=stop_event)
 
     assert not handler.called
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fast_job_keeps_cadence_while_slow_job_runs():
+    """A slow job runs on its own thread, the fast one ticks meanwhile and never overlaps itself"""
+    stop_event = threading.Event()
+    fast_calls = []
+    overlaps = []
+    fast_running = threading.Lock()
+
+    def slow(now):
+        # holds its thread until the fast job has ticked a few times
+        stop_event.wait(timeout=5)
+
+    def fast(now):
+        if not fast_running.acquire(blocking=False):
+            overlaps.append(now)
+            return
+        fast_calls.append(now)
+        if len(fast_calls) == 3:
+            stop_event.set()
+        fast_running.release()
+
+    run([
+        LocalJob(key="slow_job", handler=slow, interval=timedelta(hours=1)),
+        LocalJob(key="fast_job", handler=fast, interval=timedelta(milliseconds=10)),
+    ], stop_event=stop_event)
+
+    assert len(fast_calls) == 3
+    assert not overlaps
+    assert Job.objects.get(key="slow_job").last_run is not None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_again_now():
+    """A handler with more work pending runs again without waiting out the interval"""
+    handler = Mock(side_effect=[RunAgain(), RunAgain(), None])
+    local_job = LocalJob(
+        key="busy_job",
+        handler=handler,
+        interval=timedelta(minutes=30),
+    )
+
+    run([local_job], blocking=False)
+
+    assert handler.call_count == 3
+    db_job = Job.objects.get(key="busy_job")
+    assert db_job.next_run == db_job.last_run + timedelta(minutes=30)
+
+
+@pytest.mark.django_db
+def test_run_again_later():
+    """A handler with nothing to do can push its next run past the interval"""
+    local_job = LocalJob(
+        key="idle_job",
+        handler=Mock(return_value=RunAgain(after=timedelta(hours=2))),
+        interval=timedelta(minutes=30),
+    )
+
+    db_job = run_job(local_job)
+
+    assert db_job.next_run == db_job.last_run + timedelta(hours=2)
+    local_job.handler.reset_mock()
+    run_job(local_job)
+    local_job.handler.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_job_leased_elsewhere_is_skipped():
+    """A due job another instance is running is left to it"""
+    now = timezone.now()
+    Job.objects.create(
+        key="leased_job",
+        lease_owner="other-host:1234",
+        lease_until=now + timedelta(seconds=30),
+    )
+    local_job = LocalJob(key="leased_job", handler=Mock(), interval=timedelta(minutes=30))
+
+    db_job = run_job(local_job)
+
+    local_job.handler.assert_not_called()
+    assert db_job.lease_owner == "other-host:1234"
+    assert db_job.last_run is None
+
+
+@pytest.mark.django_db
+def test_expired_lease_is_taken_over():
+    """A lease its holder stopped renewing, for instance as it died, frees the job"""
+    Job.objects.create(
+        key="orphaned_job",
+        lease_owner="dead-host:1234",
+        lease_until=timezone.now() - timedelta(seconds=1),
+    )
+    local_job = LocalJob(key="orphaned_job", handler=Mock(), interval=timedelta(minutes=30))
+
+    run_job(local_job)
+
+    local_job.handler.assert_called_once()
+    db_job = Job.objects.get(key="orphaned_job")
+    assert db_job.last_run is not None
+    assert db_job.lease_owner == ""
+    assert db_job.lease_until is None
+
+
+@pytest.mark.django_db(transaction=True)
+def test_handler_runs_outside_transaction():
+    """The job row is leased, not locked, while the handler runs"""
+    seen = {}
+
+    def handler(now):
+        seen["in_transaction"] = connection.in_atomic_block
+        seen["job"] = Job.objects.get(key="long_job")
+
+    run_job(LocalJob(key="long_job", handler=handler, interval=timedelta(hours=1)))
+
+    assert seen["in_transaction"] is False
+    assert seen["job"].lease_owner == LEASE_OWNER
+    assert seen["job"].lease_until > timezone.now()
+
+
+@pytest.mark.django_db
+def test_renew_leases():
+    """Only leases held by this process are renewed"""
+    now = timezone.now()
+    Job.objects.create(key="ours", lease_owner=LEASE_OWNER, lease_until=now)
+    Job.objects.create(key="theirs", lease_owner="other-host:1234", lease_until=now)
+    local_jobs = [
+        LocalJob(key=key, handler=Mock(), interval=timedelta(minutes=30))
+        for key in ["ours", "theirs"]
+    ]
+
+    renew_leases(local_jobs, now)
+
+    assert Job.objects.get(key="ours").lease_until == now + LEASE_DURATION
+    assert Job.objects.get(key="theirs").lease_until == now
+
+
+@pytest.mark.django_db(transaction=True)
+def test_notification_wakes_job():
+    """A job runs as soon as its channel is notified, however far it is from due"""
+    Job.objects.create(key="woken_job", last_run=timezone.now())
+    stop_event = threading.Event()
+    calls = []
+
+    def handler(now):
+        calls.append(now)
+        stop_event.set()
+
+    thread = threading.Thread(
+        target=run,
+        args=([LocalJob(key="woken_job", handler=handler, interval=timedelta(hours=1), wake_on="test_wake")],),
+        kwargs={"stop_event": stop_event},
+    )
+    thread.start()
+    # notifications sent before the scheduler listens are lost, keep sending until it hears one
+    while not stop_event.wait(timeout=0.1):
+        notify("test_wake")
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert len(calls) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_notification_while_running_runs_job_again():
+    """A job notified while it runs goes again once it finishes"""
+    stop_event = threading.Event()
+    calls = []
+
+    def handler(now):
+        calls.append(now)
+        if len(calls) > 1:
+            stop_event.set()
+            return
+        # the scheduler starts listening as this first run starts
+        for _ in range(10):
+            notify("test_wake")
+            stop_event.wait(timeout=0.1)
+
+    run_thread = threading.Thread(
+        target=run,
+        args=([LocalJob(key="busy_job", handler=handler, interval=timedelta(hours=1), wake_on="test_wake")],),
+        kwargs={"stop_event": stop_event},
+    )
+    run_thread.start()
+    run_thread.join(timeout=5)
+
+    assert not run_thread.is_alive()
+    assert len(calls) == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_per_instance_job():
+    """A per-instance job runs without a DB row, so other instances run it too"""
+    handler = Mock(side_effect=[RunAgain(), None])
+    local_job = LocalJob(
+        key="sharded_job",
+        handler=handler,
+        interval=timedelta(minutes=30),
+        per_instance=True,
+    )
+    Job.objects.create(key="sharded_job", lease_owner="other-host:1", lease_until=timezone.now() + timedelta(minutes=1))
+
+    run([local_job], blocking=False)
+
+    assert handler.call_count == 2
+    assert Job.objects.get(key="sharded_job").last_run is None
@@ -0,0 +1,104 @@
+"""
+Postgres LISTEN/NOTIFY, to wake up loops that would otherwise poll.
+
+NOTIFY is transactional, listeners hear it once the notifying transaction commits.
+Notifications are hints rather than messages:
+they are lost while a listener reconnects, and carry nothing a loop needs to act on,
+so whoever waits for them still polls, only less often.
+"""
+import datetime
+import logging
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+
+
+logger = logging.getLogger(__name__)
+
+
+# how often the listener checks whether it should stop
+STOP_CHECK_INTERVAL = datetime.timedelta(seconds=1)
+RECONNECT_DELAY = datetime.timedelta(seconds=5)
+
+
+def notify(channel):
+    with connection.cursor() as cursor:
+        cursor.execute(f'NOTIFY {channel}')
+
+
+class Listener(threading.Thread):
+    """
+    Listens on channels, on a connection of its own, and counts notifications per channel.
+
+    A waiter takes a snapshot of the counts before it looks for work,
+    and waits for them to change, so a notification that arrives
+    while it is looking isn't missed.
+    Stops with `stop()` or with the `stop_event`, waking up every waiter.
+    """
+
+    def __init__(self, channels, stop_event=None):
+        super().__init__(name='listener', daemon=True)
+        self.channels = sorted(channels)
+        self.stop_event = stop_event
+        self.stopped = threading.Event()
+        self.ready = threading.Event()  # set once listening
+        self.counts = dict.fromkeys(self.channels, 0)
+        self.condition = threading.Condition()
+
+    def stop(self):
+        self.stopped.set()
+
+    def is_stopping(self):
+        return self.stopped.is_set() or (self.stop_event is not None and self.stop_event.is_set())
+
+    def run(self):
+        while not self.is_stopping():
+            db = connections.create_connection(DEFAULT_DB_ALIAS)
+            try:
+                self._listen(db)
+            except DatabaseError:
+                logger.exception('Listener lost its connection, reconnecting')
+                self.stopped.wait(RECONNECT_DELAY.total_seconds())
+            finally:
+                db.close()
+        with self.condition:
+            self.condition.notify_all()
+
+    def _listen(self, db):
+        db.ensure_connection()
+        pg_connection = db.connection
+        with db.wrap_database_errors:
+            for channel in self.channels:
+                pg_connection.execute(f'LISTEN {channel}')
+            logger.info('Listening on %s', self.channels)
+            self.ready.set()
+            while not self.is_stopping():
+                for notification in pg_connection.notifies(timeout=STOP_CHECK_INTERVAL.total_seconds()):
+                    with self.condition:
+                        self.counts[notification.channel] += 1
+                        self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            return dict(self.counts)
+
+    def wait(self, snapshot, timeout):
+        """
+        Wait until a channel is notified after the snapshot was taken,
+        the timeout passes, or the listener stops.
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.counts != snapshot or self.is_stopping(),
+                timeout=timeout,
+            )
+
+    def notified_since(self, snapshot):
+        """The channels notified after the snapshot was taken, and a fresh snapshot."""
+        with self.condition:
+            channels = {
+                channel
+                for channel, count in self.counts.items()
+                if count != snapshot[channel]
+            }
+            return channels, dict(self.counts)
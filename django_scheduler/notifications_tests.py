@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from .notifications import Listener, notify
+
+
+@pytest.fixture
+def listener():
+    listener = Listener(['test_channel', 'other_channel'])
+    listener.start()
+    assert listener.ready.wait(timeout=5)
+    yield listener
+    listener.stop()
+    listener.join(timeout=5)
+    assert not listener.is_alive()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_listener_hears_notification(listener):
+    snapshot = listener.snapshot()
+
+    notify('test_channel')
+    listener.wait(snapshot, timeout=5)
+
+    channels, snapshot = listener.notified_since(snapshot)
+    assert channels == {'test_channel'}
+    assert listener.notified_since(snapshot) == (set(), snapshot)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_listener_wait_times_out(listener):
+    snapshot = listener.snapshot()
+
+    listener.wait(snapshot, timeout=0.1)
+
+    assert listener.notified_since(snapshot)[0] == set()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stop_event_wakes_waiters():
+    stop_event = threading.Event()
+    listener = Listener(['test_channel'], stop_event)
+    listener.start()
+    assert listener.ready.wait(timeout=5)
+    waiter = threading.Thread(target=listener.wait, args=(listener.snapshot(), 60))
+    waiter.start()
+
+    stop_event.set()
+
+    waiter.join(timeout=5)
+    assert not waiter.is_alive()
+    listener.join(timeout=5)
+    assert not listener.is_alive()
@@ -8,6 +8,9 @@ def get_voyage_embedding(text):
     Returns bit string of '0' and '1' characters (2048 bits),
     ready for pgvector BitField storage.
     """
+    if settings.FAKE_BACKENDS:
+        from warriors.llms import fake
+        return fake.get_voyage_embedding(text)
     response = requests.post(
         'https://api.voyageai.com/v1/embeddings',
         headers={
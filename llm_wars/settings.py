@@ -160,6 +160,45 @@ ANTHROPIC_API_KEY = env.str('ANTHROPIC_API_KEY', default='')
 VOYAGE_API_KEY = env.str('VOYAGE_API_KEY', default='')
 GOOGLE_AI_API_KEY = env.str('GOOGLE_AI_API_KEY', default='')
 
+# client-side LLM rate limits (warriors/llms/rate_limit.py), 0 means unlimited
+LLM_REQUESTS_PER_MINUTE = {
+    'openai-gpt': env.int('OPENAI_REQUESTS_PER_MINUTE', default=0),
+    'claude-3-haiku': env.int('ANTHROPIC_REQUESTS_PER_MINUTE', default=0),
+    'google-gemini': env.int('GOOGLE_AI_REQUESTS_PER_MINUTE', default=0),
+}
+LLM_TOKENS_PER_MINUTE = {
+    'openai-gpt': env.int('OPENAI_TOKENS_PER_MINUTE', default=0),
+    'claude-3-haiku': env.int('ANTHROPIC_TOKENS_PER_MINUTE', default=0),
+    'google-gemini': env.int('GOOGLE_AI_TOKENS_PER_MINUTE', default=0),
+}
+# LLMs whose background games go through the batch API (warriors/llm_batches.py)
+LLM_BATCH = {
+    'openai-gpt': env.bool('OPENAI_BATCH', default=False),
+    'claude-3-haiku': env.bool('ANTHROPIC_BATCH', default=False),
+    'google-gemini': env.bool('GOOGLE_AI_BATCH', default=False),
+}
+# duplicate calls a day for slow fast-lane games (warriors/llm_hedging.py), 0 means no hedging
+LLM_HEDGES_PER_DAY = {
+    'openai-gpt': env.int('OPENAI_HEDGES_PER_DAY', default=0),
+    'claude-3-haiku': env.int('ANTHROPIC_HEDGES_PER_DAY', default=0),
+    'google-gemini': env.int('GOOGLE_AI_HEDGES_PER_DAY', default=0),
+}
+# deterministic stand-ins for every paid API, for load testing (warriors/llms/fake.py)
+FAKE_BACKENDS = env.bool('FAKE_BACKENDS', default=False)
+# median and 95th percentile of fake call latency, in seconds
+FAKE_BACKEND_LATENCY = {
+    'llm': env.list('FAKE_LLM_LATENCY', cast=float, default=[2.0, 10.0]),
+    'moderation': env.list('FAKE_MODERATION_LATENCY', cast=float, default=[0.2, 0.5]),
+    'embedding': env.list('FAKE_EMBEDDING_LATENCY', cast=float, default=[0.2, 0.5]),
+}
+# shares of fake calls failing with a transient error and with a 429
+FAKE_BACKEND_ERROR_RATE = env.float('FAKE_BACKEND_ERROR_RATE', default=0.0)
+FAKE_BACKEND_RATE_LIMIT_RATE = env.float('FAKE_BACKEND_RATE_LIMIT_RATE', default=0.0)
+# pausing an LLM's games and matchmaking during its outages (warriors/llms/circuit_breaker.py)
+LLM_CIRCUIT_BREAKER = env.bool('LLM_CIRCUIT_BREAKER', default=True)
+# splitting matchmaking and rating between worker instances by arena (warriors/arena_leases.py)
+ARENA_SHARDING = env.bool('ARENA_SHARDING', default=False)
+
 # recaptcha (default are disclosed testing keys)
 RECAPTCHA_PUBLIC_KEY = env.str('RECAPTCHA_PUBLIC_KEY', '6LeIxAcTAAAAAJcZVRqyHh71UMIEGNQ_MXjiZKhI')
 RECAPTCHA_PRIVATE_KEY = env.str('RECAPTCHA_PRIVATE_KEY', '6LeIxAcTAAAAAGG-vFI1TnRWxMZNFuojJ4WifJWe')
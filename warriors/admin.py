@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .battles import Battle
+from .battles import Battle, DBGame
+from .llm_usage import llm_usage_report
 from .models import Arena, WarriorArena
 from .text_unit import TextUnit
 from .warriors import Warrior
@@ -85,6 +86,33 @@ class BattleAdmin(ReadOnlyModelAdminMixin, admin.ModelAdmin):
     date_hierarchy = 'scheduled_at'
 
 
+@admin.register(DBGame)
+class DBGameAdmin(ReadOnlyModelAdminMixin, admin.ModelAdmin):
+    list_display = (
+        'id',
+        'llm',
+        'llm_version',
+        'finish_reason',
+        'input_tokens',
+        'output_tokens',
+        'reasoning_tokens',
+        'latency',
+        'resolved_at',
+    )
+    list_filter = (
+        'llm',
+        'finish_reason',
+    )
+    date_hierarchy = 'scheduled_at'
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {
+            **(extra_context or {}),
+            'llm_usage_report': llm_usage_report(),
+        }
+        return super().changelist_view(request, extra_context=extra_context)
+
+
 @admin.register(TextUnit)
 class TextUnitAdmin(ReadOnlyModelAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'sha_256_hex', 'created_at')
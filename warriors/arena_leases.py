@@ -0,0 +1,121 @@
+"""
+Arena leases, splitting matchmaking and rating between worker instances.
+
+Matchmaking and rating are scheduler jobs, and a job's lease
+lets one instance at a time run it, however many instances there are.
+With `ARENA_SHARDING` on, both run in every instance instead,
+each instance on the warriors of the arenas it leases.
+
+Instances share out the arenas through the leases alone.
+Every `LEASE_RENEW_INTERVAL` an instance renews its leases,
+counts the instances holding any, itself included, to get its fair share,
+and gives back what it holds above that share.
+Below it, it takes free arenas, or ones whose lease expired,
+and when there are none, arenas of an instance holding more than its share.
+So a new instance gets its arenas within a round or two,
+and the arenas of one that died are taken over once its leases expire.
+Right after an arena is taken from an instance,
+both may matchmake in it for a moment, which is harmless:
+warriors are locked while they are matched.
+"""
+import collections
+import logging
+import math
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from django_scheduler.models import LEASE_DURATION, LEASE_OWNER
+
+
+logger = logging.getLogger(__name__)
+
+
+LEASE_RENEW_INTERVAL = LEASE_DURATION / 3
+
+
+_lock = threading.Lock()
+_arena_ids = []
+_rebalanced_at = None
+
+
+def owned_arena_ids():
+    """
+    Ids of the arenas this instance matchmakes and rates, None when every instance does all.
+
+    Leases are renewed and rebalanced here, when due,
+    so the jobs asking for their arenas keep them.
+    """
+    global _arena_ids, _rebalanced_at
+    if not settings.ARENA_SHARDING:
+        return None
+    with _lock:
+        now = timezone.now()
+        if _rebalanced_at is None or now - _rebalanced_at >= LEASE_RENEW_INTERVAL:
+            _arena_ids = rebalance(now)
+            _rebalanced_at = now
+        return _arena_ids
+
+
+@transaction.atomic
+def rebalance(now):
+    from .models import Arena
+
+    # locking every arena in one order keeps instances rebalancing at once from deadlocking
+    arenas = list(Arena.objects.order_by('id').select_for_update(no_key=True))
+    holders = collections.defaultdict(list)  # lease owner -> arenas
+    free = []
+    for arena in arenas:
+        if arena.lease_owner and arena.lease_until is not None and arena.lease_until > now:
+            holders[arena.lease_owner].append(arena)
+        else:
+            free.append(arena)
+    ours = holders.pop(LEASE_OWNER, [])
+    fair_share = math.ceil(len(arenas) / (len(holders) + 1))
+
+    released = ours[fair_share:]
+    ours = ours[:fair_share]
+    wanted = fair_share - len(ours)
+    taken = free[:wanted]
+    for owner, theirs in sorted(holders.items(), key=lambda item: -len(item[1])):
+        taken_over = theirs[fair_share:][:wanted - len(taken)]
+        if taken_over:
+            logger.info('Taking over %s arenas from %s', len(taken_over), owner)
+        taken += taken_over
+    ours += taken
+
+    Arena.objects.filter(
+        id__in=[arena.id for arena in released],
+    ).update(
+        lease_owner='',
+        lease_until=None,
+    )
+    Arena.objects.filter(
+        id__in=[arena.id for arena in ours],
+    ).update(
+        lease_owner=LEASE_OWNER,
+        lease_until=now + LEASE_DURATION,
+    )
+    if released or taken:
+        logger.info(
+            'Arena leases: %s held, %s released, %s taken, %s other instances',
+            len(ours), len(released), len(taken), len(holders),
+        )
+    return [arena.id for arena in ours]
+
+
+def release():
+    """Give back this instance's arenas, for others to take over right away."""
+    global _arena_ids, _rebalanced_at
+    from .models import Arena
+    with _lock:
+        Arena.objects.filter(
+            lease_owner=LEASE_OWNER,
+        ).update(
+            lease_owner='',
+            lease_until=None,
+        )
+        _arena_ids = []
+        _rebalanced_at = None
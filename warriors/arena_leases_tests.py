@@ -0,0 +1,96 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from django_scheduler.models import LEASE_OWNER
+
+from . import arena_leases
+from .battles import Battle
+from .models import Arena
+from .random_matchmaking import schedule_battle
+from .tests.factories import ArenaFactory, WarriorArenaFactory
+
+
+@pytest.fixture
+def sharding(settings, monkeypatch):
+    settings.ARENA_SHARDING = True
+    # a fresh instance, that hasn't rebalanced yet
+    monkeypatch.setattr(arena_leases, '_arena_ids', [])
+    monkeypatch.setattr(arena_leases, '_rebalanced_at', None)
+
+
+def lease(arena, owner, until):
+    Arena.objects.filter(id=arena.id).update(lease_owner=owner, lease_until=until)
+
+
+def held_by(owner):
+    return Arena.objects.filter(lease_owner=owner).count()
+
+
+@pytest.mark.django_db
+def test_no_sharding():
+    assert arena_leases.owned_arena_ids() is None
+
+
+@pytest.mark.django_db
+def test_single_instance_takes_all(sharding):
+    arenas = ArenaFactory.create_batch(3)
+
+    assert set(arena_leases.owned_arena_ids()) == {arena.id for arena in arenas}
+    assert held_by(LEASE_OWNER) == 3
+
+
+@pytest.mark.django_db
+def test_new_instance_takes_its_share(sharding):
+    now = timezone.now()
+    for arena in ArenaFactory.create_batch(4):
+        lease(arena, 'other-host:1', now + datetime.timedelta(seconds=30))
+
+    assert len(arena_leases.rebalance(now)) == 2
+    assert held_by('other-host:1') == 2
+
+
+@pytest.mark.django_db
+def test_instance_gives_back_above_share(sharding):
+    now = timezone.now()
+    arenas = ArenaFactory.create_batch(4)
+    lease(arenas[0], 'other-host:1', now + datetime.timedelta(seconds=30))
+    for arena in arenas[1:]:
+        lease(arena, LEASE_OWNER, now + datetime.timedelta(seconds=30))
+
+    assert len(arena_leases.rebalance(now)) == 2
+    assert held_by('') == 1
+
+
+@pytest.mark.django_db
+def test_expired_leases_are_taken_over(sharding):
+    now = timezone.now()
+    for arena in ArenaFactory.create_batch(2):
+        lease(arena, 'dead-host:1', now - datetime.timedelta(seconds=1))
+
+    assert len(arena_leases.rebalance(now)) == 2
+
+
+@pytest.mark.django_db
+def test_release(sharding):
+    ArenaFactory.create_batch(2)
+    arena_leases.owned_arena_ids()
+
+    arena_leases.release()
+
+    assert held_by(LEASE_OWNER) == 0
+
+
+@pytest.mark.django_db
+def test_matchmaking_leaves_other_instances_arenas_alone(sharding):
+    now = timezone.now()
+    arena = ArenaFactory()
+    WarriorArenaFactory.create_batch(2, arena=arena, next_battle_schedule=now)
+    lease(arena, 'other-host:1', now + datetime.timedelta(seconds=30))
+    # the other instance holds its fair share of one arena
+    ArenaFactory()
+
+    schedule_battle(now)
+
+    assert not Battle.objects.exists()
@@ -13,6 +13,7 @@ from django.utils.translation import gettext_lazy as _
 from django_goals.models import schedule
 from django_goals.utils import GoalRelatedMixin
 
+from . import priority
 from .lcs import lcs_ranges
 from .rating import get_expected_game_score
 from .rating_models import M_ELO_K, normalize_playstyle_len
@@ -182,7 +183,10 @@ class Battle(models.Model):
         ]
 
     @classmethod
-    def create_from_warriors(cls, warrior_arena_1, warrior_arena_2):
+    def create_from_warriors(
+        cls, warrior_arena_1, warrior_arena_2,
+        resolve_in_batch=False, latency_critical=False, interactive=False,
+    ):
         assert warrior_arena_1.arena_id == warrior_arena_2.arena_id
         arena_id = warrior_arena_1.arena_id
 
@@ -207,13 +211,17 @@ class Battle(models.Model):
                 warrior_2=warrior_2,
                 scheduled_at=TransactionNow(),
             )
+            # somebody waiting to see the battle puts it in the interactive lane
+            deadline = priority.get_deadline(interactive)
             resolve_1_2_goal = schedule(
                 resolve_battle_1_2,
                 args=(str(battle.id),),
+                deadline=deadline,
             )
             resolve_2_1_goal = schedule(
                 resolve_battle_2_1,
                 args=(str(battle.id),),
+                deadline=deadline,
             )
             db_game_1_2 = DBGame.objects.create(
                 battle=battle,
@@ -222,6 +230,8 @@ class Battle(models.Model):
                 warrior_2=warrior_2,
                 scheduled_at=battle.scheduled_at,
                 processed_goal=resolve_1_2_goal,
+                resolve_in_batch=resolve_in_batch,
+                latency_critical=latency_critical,
             )
             db_game_2_1 = DBGame.objects.create(
                 battle=battle,
@@ -230,12 +240,15 @@ class Battle(models.Model):
                 warrior_2=warrior_1,
                 scheduled_at=battle.scheduled_at,
                 processed_goal=resolve_2_1_goal,
+                resolve_in_batch=resolve_in_batch,
+                latency_critical=latency_critical,
             )
 
             schedule(
                 transfer_rating,
                 args=(str(battle.id),),
                 precondition_goals=[resolve_1_2_goal, resolve_2_1_goal],
+                deadline=deadline,
             )
 
         return battle, db_game_1_2, db_game_2_1
@@ -317,6 +330,64 @@ class DBGame(GoalRelatedMixin, models.Model):
     attempts = models.PositiveSmallIntegerField(
         default=0,
     )
+    max_output_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text=_('Output token budget of the LLM call, raised when a call ran out of it.'),
+    )
+    # what the calls for the game cost, every attempt that reported usage added up,
+    # empty when none did
+    input_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+    )
+    cached_input_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+    )
+    output_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text=_('Including reasoning tokens.'),
+    )
+    reasoning_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+    )
+    last_output_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text=_('Output tokens of the call that resolved the game alone, what it needed in the end.'),
+    )
+    latency = models.FloatField(
+        null=True,
+        blank=True,
+        help_text=_('Seconds the synchronous LLM call that resolved the game took.'),
+    )
+    total_latency = models.FloatField(
+        null=True,
+        blank=True,
+        help_text=_('Seconds every synchronous LLM call for the game took, failed and retried ones included.'),
+    )
+    resolve_in_batch = models.BooleanField(
+        default=False,
+        help_text=_('Nobody waits for this game, so it goes through the cheaper provider batch API.'),
+    )
+    llm_batch = models.ForeignKey(
+        to='LLMBatch',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='games',
+    )
+    latency_critical = models.BooleanField(
+        default=False,
+        help_text=_('A fresh warrior\'s player waits for this game, so a slow LLM call gets a duplicate.'),
+    )
+    hedged = models.BooleanField(
+        default=False,
+        help_text=_('The LLM call was slow and got a duplicate.'),
+    )
 
     class Meta:
         db_table = 'warriors_game'
@@ -676,6 +747,17 @@ def mirror_to_battle(game, battle_mirror, field_names):
     battle_mirror.save(update_fields=field_names)
 
 
+def llm_version_family(llm_version):
+    """
+    The model part of an `llm_version`.
+
+    OpenAI versions carry a backend fingerprint after the slash
+    (`_llm_version` in `warriors/llms/openai.py`),
+    which changes with their deployments rather than with the model.
+    """
+    return llm_version.split('/', 1)[0]
+
+
 def as_bytes(value):
     """A bytea column reads back as a memoryview, which is unequal to bytes."""
     return bytes(value) if isinstance(value, memoryview) else value
@@ -0,0 +1,60 @@
+"""
+A process pool for the CPU-bound parts of goal handlers.
+
+The worker runs goals on threads of one process,
+which suits LLM calls that mostly wait on the network.
+But LCS scoring and rating fits hold the GIL while they compute,
+stalling every thread that shares the process with them.
+With `manage.py worker --cpu-processes N` those computations
+run in N processes of their own, and the goal thread waits for the result
+without holding the GIL.
+Only the pure computation moves:
+reading and writing the database stays in the handler,
+on its thread's connection and inside its transaction.
+
+Without a pool, for instance in tests, everything runs in the calling thread.
+Functions sent to the pool must be importable without Django set up,
+as the pool's processes are spawned fresh.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+_pool = None
+
+
+def start(processes):
+    global _pool
+    assert _pool is None
+    logger.info('Starting CPU lane with %s processes', processes)
+    # forking a process full of threads and open connections is asking for trouble
+    _pool = ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def run(fn, *args, **kwargs):
+    """`fn(*args, **kwargs)`, in the pool when there is one."""
+    if _pool is None:
+        return fn(*args, **kwargs)
+    return _pool.submit(fn, *args, **kwargs).result()
+
+
+def starmap(fn, args_list):
+    """`fn(*args)` for each of `args_list`, in parallel when there is a pool."""
+    if _pool is None:
+        return [fn(*args) for args in args_list]
+    futures = [_pool.submit(fn, *args) for args in args_list]
+    return [future.result() for future in futures]
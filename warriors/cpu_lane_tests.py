@@ -0,0 +1,34 @@
+import pytest
+
+from . import cpu_lane
+from .lcs import lcs_similarity
+from .rating import GameScore, get_performance_rating
+
+
+@pytest.fixture
+def cpu_pool():
+    cpu_lane.start(2)
+    yield
+    cpu_lane.shutdown()
+
+
+def test_without_pool_runs_in_place():
+    assert cpu_lane.run(lcs_similarity, 'abcd', 'xbcx') == 0.5
+    assert cpu_lane.starmap(lcs_similarity, [('ab', 'ab'), ('ab', 'cd')]) == [1.0, 0.0]
+
+
+def test_pool(cpu_pool):
+    assert cpu_lane.starmap(lcs_similarity, [
+        ('abcd', 'xbcx'),
+        ('ab', 'ab'),
+        ('ab', 'cd'),
+    ]) == [0.5, 1.0, 0.0]
+
+    rating, playstyle, _ = cpu_lane.run(
+        get_performance_rating,
+        [GameScore(score=1.0, opponent_rating=0.0, opponent_playstyle=[0.0, 0.0])],
+        allowed_rating_range=100,
+        k=1,
+    )
+    assert rating > 0
+    assert len(playstyle) == 2
@@ -5,11 +5,10 @@ from django.contrib import messages
 from django.utils.text import normalize_newlines
 from django.utils.translation import gettext as _
 from django.views.generic.edit import CreateView
-from django_goals.models import schedule
 from django_recaptcha.fields import ReCaptchaField
 
+from . import onboarding
 from .models import WarriorArena, WarriorUserPermission
-from .tasks import do_moderation
 from .views import ArenaViewMixin
 from .warriors import MAX_WARRIOR_LENGTH, Warrior
 
@@ -90,7 +89,7 @@ class WarriorCreateForm(forms.ModelForm):
             assert commit
             warrior.save()
 
-            schedule(do_moderation, args=[str(warrior.id)])
+            onboarding.start(warrior)
 
         # discovery message
         else:
@@ -44,9 +44,8 @@ def test_create_warrior(client, mocked_recaptcha, has_authorized_warriors, defau
     assert warrior.games_played == 0
     assert warrior.moderation_date is None
 
-    # moderation task scheduled
-    goal = Goal.objects.get()
-    assert goal.handler == 'warriors.tasks.do_moderation'
+    # onboarding started with moderation
+    goal = Goal.objects.get(handler='warriors.tasks.do_moderation')
     assert goal.instructions['args'] == [str(warrior.warrior.id)]
 
     # session is athorized for new warrior
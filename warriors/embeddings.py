@@ -1,19 +1,39 @@
 import voyageai
 from django.conf import settings
-from django.contrib.postgres.fields import ArrayField
 from django.db import models
 from django.utils import timezone
 from django_goals.models import AllDone, Goal, RetryMeLater, schedule
+from pgvector.django import VectorField
+
+
+class EmbeddingQuerySet(models.QuerySet):
+    def with_embeddings(self):
+        """Load every field, embeddings included."""
+        return self.defer(None)
+
+
+class EmbeddingManager(models.Manager):
+    """
+    Defers embeddings, they are kilobytes each and only scoring reads them.
+
+    Meant as the base manager too, so instances fetched through relations defer them as well.
+    `select_related` doesn't go through managers, its callers defer them explicitly.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().defer('voyage_3_embedding')
 
 
 class EmbeddingMixin(models.Model):
     class Meta:
         abstract = True
+        base_manager_name = 'objects'
 
-    voyage_3_embedding = ArrayField(
-        models.FloatField(),
-        size=1024,
-        default=list,
+    # stored as float32, None until embedded
+    voyage_3_embedding = VectorField(
+        dimensions=1024,
+        null=True,
+        blank=True,
     )
     voyage_3_embedding_goal = models.OneToOneField(
         to=Goal,
@@ -22,18 +42,29 @@ class EmbeddingMixin(models.Model):
         blank=True,
     )
 
-    def schedule_voyage_3_embedding(self):
+    objects = EmbeddingManager.from_queryset(EmbeddingQuerySet)()
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # loading a deferred embedding mustn't go through the deferring base manager
+        if from_queryset is None:
+            from_queryset = type(self)._base_manager.with_embeddings()
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+    def schedule_voyage_3_embedding(self, deadline=None):
         if (
-            self.voyage_3_embedding or
-            self.voyage_3_embedding_goal
+            self.voyage_3_embedding_goal_id or
+            self.voyage_3_embedding is not None
         ):
             return
-        self.voyage_3_embedding_goal = schedule(self.ensure_voyage_3_embedding_handler)
+        self.voyage_3_embedding_goal = schedule(
+            self.ensure_voyage_3_embedding_handler,
+            deadline=deadline,
+        )
         self.save(update_fields=('voyage_3_embedding_goal',))
 
 
 def _ensure_voyage_3_embedding(instance):
-    if instance.voyage_3_embedding:
+    if instance.voyage_3_embedding is not None:
         return AllDone()
     try:
         instance.voyage_3_embedding = get_embedding(instance.content)
@@ -47,6 +78,9 @@ def _ensure_voyage_3_embedding(instance):
 
 
 def get_embedding(content):
+    if settings.FAKE_BACKENDS:
+        from .llms import fake
+        return fake.get_embedding(content)
     response = voyage_client.embed(
         [content],
         model='voyage-3',
@@ -23,6 +23,20 @@ def lcs_len(a, b):
     return dp[-1][-1]
 
 
+def lcs_similarity(a, b):
+    """
+    Length of longest common subsequence relative to the longer of the two
+
+    None when either is missing, like the result of a game that has none,
+    and 0 for two empty strings, which have nothing in common.
+    """
+    if a is None or b is None:
+        return None
+    if not a and not b:
+        return 0.0
+    return lcs_len(a, b) / max(len(a), len(b))
+
+
 def lcs_ranges(a, b):
     """
     Return a list of ranges of matching characters indexed in a.
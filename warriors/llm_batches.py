@@ -0,0 +1,97 @@
+"""
+Resolving games through the providers' batch APIs.
+
+Batch pricing is half of the synchronous one,
+in exchange for a turnaround of up to 24 hours.
+Only games nobody is watching go this way —
+see `resolve_in_batch` on `DBGame`
+and the LLM pricing levers in `docs/strategy.md`.
+"""
+import datetime
+import uuid
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django_goals.utils import GoalRelatedMixin
+
+from .battles import LLM
+from .llms import anthropic, google, openai
+
+
+# how often pending games are collected into a new batch
+SUBMIT_INTERVAL = datetime.timedelta(minutes=10)
+# how often a submitted batch is checked for completion
+POLL_INTERVAL = datetime.timedelta(minutes=5)
+# a batch without a provider id this long after it was claimed never got submitted
+SUBMIT_TIMEOUT = datetime.timedelta(hours=1)
+# requests per batch, well below every provider's own limit
+MAX_BATCH_SIZE = 1000
+
+# The delay to a warrior's next game is about 2^N minutes after N games
+# (`get_next_battle_delay`), so from 11 games on (~34 hours)
+# it is longer than the 24 hours a batch can take to come back.
+MIN_GAMES_PLAYED = 11
+
+_backends = {
+    LLM.OPENAI_GPT: openai,
+    LLM.CLAUDE_3_HAIKU: anthropic,
+    LLM.GOOGLE_GEMINI: google,
+}
+
+
+class LLMBatch(GoalRelatedMixin, models.Model):
+    """
+    Games submitted together in one provider batch.
+
+    The processed goal polls the provider until the batch is done
+    and then fans the results out into the games.
+    """
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+    )
+    llm = models.CharField(
+        max_length=20,
+        choices=LLM.choices,
+    )
+    # empty while the batch is being submitted
+    provider_batch_id = models.CharField(
+        max_length=200,
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+    )
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+
+def is_batch_enabled(llm):
+    # the fake backends have no batch API to stand in for
+    return settings.LLM_BATCH.get(llm, False) and not settings.FAKE_BACKENDS
+
+
+def should_resolve_in_batch(llm, warrior_arena_1, warrior_arena_2):
+    """
+    Whether a game between the two warriors can wait for a batch.
+
+    Both warriors have to be past the fast window,
+    where a fresh warrior's first games come within minutes by design.
+    """
+    return (
+        is_batch_enabled(llm) and
+        warrior_arena_1.games_played >= MIN_GAMES_PLAYED and
+        warrior_arena_2.games_played >= MIN_GAMES_PLAYED
+    )
+
+
+def submit_battle_batch(llm, prompts, max_output_tokens=None):
+    return _backends[llm].submit_battle_batch(prompts, max_output_tokens)
+
+
+def get_battle_batch_results(llm, provider_batch_id):
+    return _backends[llm].get_battle_batch_results(provider_batch_id)
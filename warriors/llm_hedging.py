@@ -0,0 +1,170 @@
+"""
+Hedged LLM calls for the games a player is waiting for.
+
+A fresh warrior's first games come within minutes by design
+("keep the fast lane" in `docs/rounds.md`),
+and one slow LLM response is what makes that wait feel long.
+So when a call for such a game is slower than most,
+a duplicate is fired alongside it and whichever finishes first wins,
+the other one hangs up.
+
+Every duplicate is paid for,
+so how many are fired per LLM per day is capped in settings.
+A duplicate takes its place in the day's budget as it is fired,
+whether its game ends up resolved or not.
+"""
+import datetime
+import logging
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import DatabaseError, models
+
+from .battles import DBGame
+from .llms.rate_limit import close_connection, own_transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+# warriors with fewer games are in the fast lane (`get_next_battle_delay`)
+FAST_LANE_GAMES = 5
+# the share of recent calls that finish before a duplicate is fired
+HEDGE_QUANTILE = 0.9
+# recent calls the latency is learned from, and how few are too few to learn from
+SAMPLE_SIZE = 200
+MIN_SAMPLE_SIZE = 20
+# the budget of `LLM_HEDGES_PER_DAY` is counted over windows this long
+BUDGET_WINDOW = datetime.timedelta(days=1)
+
+
+class LLMHedgeBudget(models.Model):
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+    )
+    llm = models.CharField(
+        max_length=20,
+        unique=True,
+    )
+    # duplicates fired since the window started
+    hedges = models.PositiveIntegerField(
+        default=0,
+    )
+    window_started_at = models.DateTimeField()
+
+
+def is_hedging_enabled(llm):
+    return _get_daily_limit(llm) > 0
+
+
+def is_fast_lane(warrior_arena_1, warrior_arena_2):
+    """Whether a game between the two warriors has a player waiting for it."""
+    return min(warrior_arena_1.games_played, warrior_arena_2.games_played) < FAST_LANE_GAMES
+
+
+def should_hedge(llm, warrior_arena_1, warrior_arena_2):
+    return is_hedging_enabled(llm) and is_fast_lane(warrior_arena_1, warrior_arena_2)
+
+
+def get_hedge_delay(llm):
+    """
+    How long a call to `llm` runs before it gets a duplicate, None to never.
+
+    The `HEDGE_QUANTILE` of recent synchronous call latencies.
+    """
+    latencies = sorted(DBGame.objects.filter(
+        llm=llm,
+        latency__isnull=False,
+    ).order_by(
+        '-scheduled_at',
+    ).values_list('latency', flat=True)[:SAMPLE_SIZE])
+    if len(latencies) < MIN_SAMPLE_SIZE:
+        return None
+    return datetime.timedelta(seconds=latencies[int(len(latencies) * HEDGE_QUANTILE)])
+
+
+def has_hedge_budget(llm, now):
+    """Whether the budget looks like it has room, without taking any of it."""
+    budget = LLMHedgeBudget.objects.filter(llm=llm).first()
+    if budget is None or now - budget.window_started_at >= BUDGET_WINDOW:
+        return _get_daily_limit(llm) > 0
+    return budget.hedges < _get_daily_limit(llm)
+
+
+def take_hedge(llm):
+    """
+    Take one duplicate out of the budget, as it is about to be fired.
+
+    Every worker takes from the same row, in one conditional update,
+    so the budget holds however many of them hedge at once.
+    No duplicate is fired while the database cannot be asked.
+    """
+    try:
+        with own_transaction() as cursor:
+            cursor.execute(
+                f'INSERT INTO {LLMHedgeBudget._meta.db_table} (id, llm, hedges, window_started_at) '
+                'VALUES (%s, %s, 0, now()) '
+                'ON CONFLICT (llm) DO NOTHING',
+                [uuid.uuid4(), llm],
+            )
+            cursor.execute(
+                f'UPDATE {LLMHedgeBudget._meta.db_table} '
+                'SET hedges = CASE WHEN now() - window_started_at >= %(window)s THEN 1 ELSE hedges + 1 END, '
+                'window_started_at = CASE WHEN now() - window_started_at >= %(window)s '
+                'THEN now() ELSE window_started_at END '
+                'WHERE llm = %(llm)s AND (now() - window_started_at >= %(window)s OR hedges < %(limit)s)',
+                {'window': BUDGET_WINDOW, 'llm': llm, 'limit': _get_daily_limit(llm)},
+            )
+            return cursor.rowcount == 1
+    except DatabaseError:
+        logger.exception('Hedge budget for %s unavailable, not hedging', llm)
+        close_connection()
+        return False
+
+
+def _get_daily_limit(llm):
+    return settings.LLM_HEDGES_PER_DAY.get(llm, 0)
+
+
+def call_hedged(call, hedge_delay, may_hedge):
+    """
+    Run `call(cancel)`, and a duplicate of it when the first one takes longer than `hedge_delay`.
+
+    `may_hedge()` has the last word on firing the duplicate.
+    Returns what the first call to succeed returned,
+    and whether the duplicate was fired.
+    The call that lost sees its `cancel` event set.
+    If both fail, the error of the last one to fail is raised.
+    """
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='llm-hedge')
+    cancel_events = []
+
+    def start():
+        cancel = threading.Event()
+        cancel_events.append(cancel)
+        return executor.submit(call, cancel)
+
+    try:
+        pending = {start()}
+        done, _ = wait(pending, timeout=hedge_delay.total_seconds())
+        hedged = False
+        if not done and may_hedge():
+            logger.info('LLM call slower than %s, hedging', hedge_delay)
+            pending.add(start())
+            hedged = True
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result(), hedged
+                error = future.exception()
+        raise error
+    finally:
+        for cancel in cancel_events:
+            cancel.set()
+        executor.shutdown(wait=False)
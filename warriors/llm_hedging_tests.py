@@ -0,0 +1,146 @@
+import datetime
+import threading
+import uuid
+
+import pytest
+from django.utils import timezone
+
+from .llm_hedging import (
+    BUDGET_WINDOW, MIN_SAMPLE_SIZE, LLMHedgeBudget, call_hedged,
+    get_hedge_delay, has_hedge_budget, take_hedge,
+)
+from .llms.exceptions import CallCancelled, TransientLLMError
+from .llms.rate_limit import close_connection, own_transaction
+from .tests.factories import BattleFactory, WarriorFactory, game_of
+
+
+HEDGE_DELAY = datetime.timedelta(milliseconds=50)
+
+
+def create_game(llm, **fields):
+    warrior_1, warrior_2 = sorted(WarriorFactory.create_batch(2), key=lambda w: w.id)
+    game = game_of(BattleFactory.create(llm=llm, warrior_1=warrior_1, warrior_2=warrior_2), '1_2')
+    for field, value in fields.items():
+        setattr(game, field, value)
+    game.save()
+    return game
+
+
+def test_call_hedged_fast_call():
+    may_hedge_calls = []
+
+    result, hedged = call_hedged(
+        lambda cancel: 'first',
+        HEDGE_DELAY,
+        lambda: may_hedge_calls.append(True) or True,
+    )
+
+    assert result == 'first'
+    assert not hedged
+    assert not may_hedge_calls
+
+
+def test_call_hedged_slow_call():
+    first_call_started = threading.Event()
+    first_call_cancelled = threading.Event()
+
+    def call(cancel):
+        if not first_call_started.is_set():
+            first_call_started.set()
+            cancel.wait(timeout=5)
+            first_call_cancelled.set()
+            raise CallCancelled()
+        return 'duplicate'
+
+    result, hedged = call_hedged(call, HEDGE_DELAY, lambda: True)
+
+    assert result == 'duplicate'
+    assert hedged
+    assert first_call_cancelled.wait(timeout=5)
+
+
+def test_call_hedged_no_hedge_allowed():
+    calls = []
+
+    def call(cancel):
+        calls.append(cancel)
+        cancel.wait(timeout=0.2)
+        return 'first'
+
+    result, hedged = call_hedged(call, HEDGE_DELAY, lambda: False)
+
+    assert result == 'first'
+    assert not hedged
+    assert len(calls) == 1
+
+
+def test_call_hedged_first_fails():
+    first_call_started = threading.Event()
+
+    def call(cancel):
+        if not first_call_started.is_set():
+            first_call_started.set()
+            cancel.wait(timeout=0.2)
+            raise TransientLLMError()
+        return 'duplicate'
+
+    assert call_hedged(call, HEDGE_DELAY, lambda: True) == ('duplicate', True)
+
+
+def test_call_hedged_both_fail():
+    def call(cancel):
+        cancel.wait(timeout=0.2)
+        raise TransientLLMError()
+
+    with pytest.raises(TransientLLMError):
+        call_hedged(call, HEDGE_DELAY, lambda: True)
+
+
+@pytest.mark.django_db
+def test_get_hedge_delay(arena):
+    assert get_hedge_delay(arena.llm) is None
+    for latency in range(MIN_SAMPLE_SIZE * 10):
+        create_game(arena.llm, latency=latency / 10)
+    assert get_hedge_delay(arena.llm) == datetime.timedelta(seconds=MIN_SAMPLE_SIZE * 0.9)
+
+
+@pytest.fixture
+def llm(settings):
+    """A budget of its own: it is taken on its own connection, past the test transaction."""
+    llm = f'test-{uuid.uuid4().hex[:12]}'
+    settings.LLM_HEDGES_PER_DAY = {llm: 2}
+    yield llm
+    with own_transaction() as cursor:
+        cursor.execute(
+            f'DELETE FROM {LLMHedgeBudget._meta.db_table} WHERE llm = %s',
+            [llm],
+        )
+    close_connection()
+
+
+@pytest.mark.django_db
+def test_hedge_budget(llm):
+    now = timezone.now()
+    assert has_hedge_budget(llm, now)
+    assert take_hedge(llm)
+    assert has_hedge_budget(llm, now)
+    assert take_hedge(llm)
+    assert not has_hedge_budget(llm, now)
+    assert not take_hedge(llm)
+
+    # a new window, a new budget
+    with own_transaction() as cursor:
+        cursor.execute(
+            f'UPDATE {LLMHedgeBudget._meta.db_table} SET window_started_at = now() - %s WHERE llm = %s',
+            [BUDGET_WINDOW, llm],
+        )
+    assert has_hedge_budget(llm, timezone.now())
+    assert take_hedge(llm)
+    assert LLMHedgeBudget.objects.get(llm=llm).hedges == 1
+
+
+@pytest.mark.django_db
+def test_no_hedge_budget(llm, settings):
+    settings.LLM_HEDGES_PER_DAY = {}
+    assert not has_hedge_budget(llm, timezone.now())
+    assert not take_hedge(llm)
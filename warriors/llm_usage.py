@@ -0,0 +1,64 @@
+"""
+What LLM calls cost and how long they take, from the usage recorded on games.
+"""
+import datetime
+
+from django.db import models
+from django.utils import timezone
+
+from .battles import DBGame
+from .stats import PercentileDisc
+
+
+REPORT_PERIOD = datetime.timedelta(days=7)
+
+
+def llm_usage_report(since=None):
+    """
+    One row per LLM, model and arena, over games resolved since `since`.
+
+    Latency percentiles and tokens cover only games that made a synchronous call,
+    other games have none recorded.
+    Both add up every attempt of a game, retries, rate limited and failed calls included,
+    tokens only of the attempts that reported usage.
+    An openai call hung up on at the character limit reports none,
+    its tokens are estimated from the text, without the reasoning.
+    `budget_error_share` is the share of errors caused by reasoning eating the output budget:
+    an error outcome with reasoning tokens spent. None without errors.
+    """
+    if since is None:
+        since = timezone.now() - REPORT_PERIOD
+    rows = DBGame.objects.filter(
+        resolved_at__gte=since,
+    ).annotate(
+        # openai versions end in a backend fingerprint, which would split every model in dozens
+        model=models.Func(
+            models.F('llm_version'), models.Value('/'), models.Value(1),
+            function='split_part',
+            output_field=models.CharField(),
+        ),
+        arena_name=models.F('battle__arena__name'),
+    ).values(
+        'llm', 'model', 'arena_name',
+    ).annotate(
+        games=models.Count('id'),
+        latency_percentiles=PercentileDisc('total_latency', [0.5, 0.95]),
+        avg_input_tokens=models.Avg('input_tokens'),
+        avg_output_tokens=models.Avg('output_tokens'),
+        avg_reasoning_tokens=models.Avg('reasoning_tokens'),
+        errors=models.Count('id', filter=models.Q(finish_reason='error')),
+        budget_errors=models.Count('id', filter=models.Q(finish_reason='error', reasoning_tokens__gt=0)),
+    ).order_by(
+        'llm', 'model', 'arena_name',
+    )
+    report = []
+    for row in rows:
+        latency_p50, latency_p95 = row.pop('latency_percentiles') or (None, None)
+        report.append({
+            **row,
+            'latency_p50': latency_p50,
+            'latency_p95': latency_p95,
+            'error_share': row['errors'] / row['games'],
+            'budget_error_share': row['budget_errors'] / row['errors'] if row['errors'] else None,
+        })
+    return report
@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+from django.utils import timezone
+
+from .llm_usage import llm_usage_report
+from .tests.factories import BattleFactory, WarriorFactory, game_of
+
+
+def resolve_game(game, resolved_at, finish_reason, llm_version, **usage):
+    game.resolved_at = resolved_at
+    game.finish_reason = finish_reason
+    game.llm_version = llm_version
+    for field, value in usage.items():
+        setattr(game, field, value)
+    game.save()
+
+
+@pytest.mark.django_db
+def test_llm_usage_report(arena, battle):
+    now = timezone.now()
+    battle.arena = arena
+    battle.save(update_fields=['arena'])
+    resolve_game(
+        game_of(battle, '1_2'), now, 'stop', 'gpt-4o-mini/fp_1234',
+        latency=2.0, total_latency=2.0, input_tokens=100, output_tokens=50, reasoning_tokens=0,
+    )
+    # a different backend fingerprint is the same model, and the calls before the last one count
+    resolve_game(
+        game_of(battle, '2_1'), now, 'error', 'gpt-4o-mini/fp_5678',
+        latency=1.0, total_latency=6.0, input_tokens=100, output_tokens=350, reasoning_tokens=300,
+    )
+
+    # too old to be reported
+    warrior_1, warrior_2 = sorted(WarriorFactory.create_batch(2), key=lambda w: w.id)
+    old_battle = BattleFactory.create(arena=arena, llm=arena.llm, warrior_1=warrior_1, warrior_2=warrior_2)
+    resolve_game(
+        game_of(old_battle, '1_2'), now - datetime.timedelta(days=30), 'stop', 'gpt-4o-mini/fp_1234',
+    )
+
+    assert llm_usage_report() == [{
+        'llm': arena.llm,
+        'model': 'gpt-4o-mini',
+        'arena_name': arena.name,
+        'games': 2,
+        'latency_p50': 2.0,
+        'latency_p95': 6.0,
+        'avg_input_tokens': 100,
+        'avg_output_tokens': 200,
+        'avg_reasoning_tokens': 150,
+        'errors': 1,
+        'budget_errors': 1,
+        'error_share': 0.5,
+        'budget_error_share': 1.0,
+    }]
+
+
+@pytest.mark.django_db
+def test_llm_usage_report_empty():
+    assert llm_usage_report() == []
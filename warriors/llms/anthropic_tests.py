@@ -1,40 +1,134 @@
-from unittest import mock
+import json
 
-import anthropic
 import pytest
+import respx
 
 from ..models import LLM
 from ..tasks import resolve_battle
+from ..warriors import MAX_WARRIOR_LENGTH
+from . import anthropic
+from .usage import Usage
 
 
-@pytest.fixture
-def anthropic_messages_create_mock(monkeypatch):
-    create_mock = mock.Mock()
-    create_mock.return_value = anthropic.types.Message(
-        id='asdf-1234',
-        content=[
-            anthropic.types.TextBlock(
-                type='text',
-                text='battlefield after the battle, littered with the bodies of the fallen',
-            ),
-        ],
-        role='assistant',
-        type='message',
-        stop_reason='end_turn',
-        model='claude-3-haiku-20240307',
-        usage=anthropic.types.Usage(
-            input_tokens=123,
-            output_tokens=234,
-        ),
-    )
-    monkeypatch.setattr('warriors.llms.anthropic.client.messages.create', create_mock)
+messages_endpoint = str(anthropic.client.base_url).rstrip('/') + '/v1/messages'
+
+
+def message_sse(text, stop_reason='end_turn', model='claude-3-haiku-20240307', chunk_size=100):
+    """The event stream of a streamed message, `chunk_size` characters per text delta."""
+    events = [
+        ('message_start', {'type': 'message_start', 'message': {
+            'id': 'asdf-1234', 'type': 'message', 'role': 'assistant', 'content': [],
+            'model': model, 'stop_reason': None, 'stop_sequence': None,
+            'usage': {'input_tokens': 23, 'cache_read_input_tokens': 100, 'output_tokens': 1},
+        }}),
+        ('content_block_start', {
+            'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''},
+        }),
+    ]
+    for i in range(0, len(text), chunk_size):
+        events.append(('content_block_delta', {
+            'type': 'content_block_delta', 'index': 0,
+            'delta': {'type': 'text_delta', 'text': text[i:i + chunk_size]},
+        }))
+    events += [
+        ('content_block_stop', {'type': 'content_block_stop', 'index': 0}),
+        ('message_delta', {
+            'type': 'message_delta',
+            'delta': {'stop_reason': stop_reason, 'stop_sequence': None},
+            'usage': {'output_tokens': 234},
+        }),
+        ('message_stop', {'type': 'message_stop'}),
+    ]
+    return ''.join(f'event: {event}\ndata: {json.dumps(data)}\n\n' for event, data in events)
 
 
 @pytest.mark.django_db
 @pytest.mark.parametrize('arena', [{'llm': LLM.CLAUDE_3_HAIKU}], indirect=True)
-def test_resolve_battle(battle, anthropic_messages_create_mock):
+@respx.mock
+def test_resolve_battle(battle):
+    respx.post(messages_endpoint).respond(200, text=message_sse(
+        'battlefield after the battle, littered with the bodies of the fallen',
+    ))
     resolve_battle(None, battle.id, '1_2')
     game = battle.games.get(warrior_1=battle.warrior_1)
     assert game.text_unit.content == 'battlefield after the battle, littered with the bodies of the fallen'
     assert game.llm_version == 'claude-3-haiku-20240307'
     assert game.finish_reason == 'end_turn'
+
+
+@respx.mock
+def test_character_limit():
+    """Once the result is longer than a warrior can be, the rest is not waited for."""
+    respx.post(messages_endpoint).respond(200, text=message_sse('a' * MAX_WARRIOR_LENGTH * 3, 'max_tokens'))
+    text, stop_reason, model, usage = anthropic.resolve_battle('prompt a', 'prompt b')
+    assert MAX_WARRIOR_LENGTH < len(text) < MAX_WARRIOR_LENGTH * 3
+    assert stop_reason == 'character_limit'
+    assert model == 'claude-3-haiku-20240307'
+
+
+@respx.mock
+def test_usage():
+    """Anthropic counts cache reads apart from the other input tokens."""
+    respx.post(messages_endpoint).respond(200, text=message_sse('battle result'))
+    text, stop_reason, model, usage = anthropic.resolve_battle('prompt a', 'prompt b')
+    assert usage == Usage(input_tokens=123, output_tokens=234, cached_input_tokens=100)
+
+
+batches_endpoint = str(anthropic.client.base_url).rstrip('/') + '/v1/messages/batches'
+
+
+def message_batch(processing_status, results_url=None):
+    return {
+        'id': 'msgbatch_1',
+        'type': 'message_batch',
+        'processing_status': processing_status,
+        'request_counts': {'processing': 0, 'succeeded': 1, 'errored': 1, 'canceled': 0, 'expired': 0},
+        'created_at': '2026-10-19T08:00:00Z',
+        'expires_at': '2026-10-20T08:00:00Z',
+        'ended_at': None,
+        'cancel_initiated_at': None,
+        'archived_at': None,
+        'results_url': results_url,
+    }
+
+
+@respx.mock
+def test_batch():
+    create_route = respx.post(batches_endpoint).respond(
+        200, json=message_batch('in_progress'),
+    )
+    retrieve_route = respx.get(f'{batches_endpoint}/msgbatch_1')
+    retrieve_route.respond(200, json=message_batch('in_progress'))
+    results_url = f'{batches_endpoint}/msgbatch_1/results'
+    respx.get(results_url).respond(200, text='\n'.join(json.dumps(entry) for entry in [
+        {
+            'custom_id': 'game-1',
+            'result': {'type': 'succeeded', 'message': {
+                'id': 'msg_1', 'type': 'message', 'role': 'assistant',
+                'content': [{'type': 'text', 'text': 'battle result'}],
+                'model': 'claude-3-5-haiku-20241022', 'stop_reason': 'end_turn',
+                'usage': {'input_tokens': 10, 'output_tokens': 10},
+            }},
+        },
+        {
+            'custom_id': 'game-2',
+            'result': {'type': 'errored', 'error': {
+                'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'},
+            }},
+        },
+    ]))
+
+    batch_id = anthropic.submit_battle_batch({'game-1': 'prompt a', 'game-2': 'prompt b'})
+    assert batch_id == 'msgbatch_1'
+    requests = json.loads(create_route.calls.last.request.content)['requests']
+    assert [request['params']['messages'] for request in requests] == [
+        [{'role': 'user', 'content': 'prompt a'}],
+        [{'role': 'user', 'content': 'prompt b'}],
+    ]
+
+    assert anthropic.get_battle_batch_results(batch_id) is None
+
+    retrieve_route.respond(200, json=message_batch('ended', results_url))
+    assert anthropic.get_battle_batch_results(batch_id) == {
+        'game-1': ('battle result', 'end_turn', 'claude-3-5-haiku-20241022', Usage(10, 10)),
+    }
@@ -0,0 +1,200 @@
+"""
+Circuit breaker around each LLM provider.
+
+During an outage every pending game would call the provider on its own,
+fail, burn an attempt and back off on its own schedule,
+until it runs out of attempts and resolves as an error.
+Instead, when too many recent calls to an LLM fail, its circuit opens:
+games park without calling and without counting an attempt,
+and matchmaking stops creating new ones.
+After `OPEN_DURATION` a single call goes through as a probe —
+if it succeeds the circuit closes, if it fails it stays open for another round.
+
+The state lives in Postgres next to the rate limit buckets,
+written on a connection of our own for the same reasons
+(see `warriors/llms/rate_limit.py`).
+"""
+import datetime
+import logging
+import uuid
+
+from django.conf import settings
+from django.db import DatabaseError, models
+
+from .rate_limit import close_connection, own_transaction
+
+
+logger = logging.getLogger(__name__)
+
+
+# calls are counted in windows of this length
+WINDOW = datetime.timedelta(minutes=2)
+# the circuit trips when at least this many calls in a window
+# failed in at least this share
+MIN_CALLS = 10
+FAILURE_RATE = 0.5
+# how long an open circuit waits before letting a probe through
+OPEN_DURATION = datetime.timedelta(minutes=5)
+# how long a probe is waited for before another one is let through
+PROBE_TIMEOUT = datetime.timedelta(minutes=5)
+
+
+class CircuitState(models.TextChoices):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class LLMCircuit(models.Model):
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+    )
+    llm = models.CharField(
+        max_length=20,
+        unique=True,
+    )
+    state = models.CharField(
+        max_length=20,
+        choices=CircuitState.choices,
+        default=CircuitState.CLOSED,
+    )
+    calls = models.PositiveIntegerField(
+        default=0,
+    )
+    failures = models.PositiveIntegerField(
+        default=0,
+    )
+    window_started_at = models.DateTimeField()
+    # when an open circuit lets a probe through, or a half-open one another probe
+    retry_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+
+def check(llm):
+    """
+    Whether a call to `llm` may go ahead.
+
+    Returns None when it may, otherwise how long to wait before asking again.
+    The first call asking after an open circuit's wait becomes the probe.
+    Every call is let through while the database cannot be asked.
+    """
+    if not settings.LLM_CIRCUIT_BREAKER:
+        return None
+    try:
+        return _check(llm)
+    except DatabaseError:
+        logger.exception('Circuit for %s unavailable, letting the call through', llm)
+        close_connection()
+        return None
+
+
+def _check(llm):
+    with own_transaction() as cursor:
+        cursor.execute(
+            'SELECT state, EXTRACT(EPOCH FROM retry_at - now()) '
+            f'FROM {LLMCircuit._meta.db_table} '
+            'WHERE llm = %s FOR UPDATE',
+            [llm],
+        )
+        row = cursor.fetchone()
+        if row is None or row[0] == CircuitState.CLOSED:
+            return None
+        wait_seconds = row[1]
+        if wait_seconds > 0:
+            return datetime.timedelta(seconds=float(wait_seconds))
+        cursor.execute(
+            f'UPDATE {LLMCircuit._meta.db_table} '
+            'SET state = %s, retry_at = now() + %s '
+            'WHERE llm = %s',
+            [CircuitState.HALF_OPEN, PROBE_TIMEOUT, llm],
+        )
+    logger.info('Circuit for %s half-open, probing', llm)
+    return None
+
+
+def record(llm, failed):
+    """
+    Count a finished call to `llm`, `failed` when it hit a provider side error.
+
+    Rate limiting is not a failure here, the rate limiter deals with it.
+    """
+    if not settings.LLM_CIRCUIT_BREAKER:
+        return
+    try:
+        _record(llm, failed)
+    except DatabaseError:
+        logger.exception('Circuit for %s unavailable, not recording the call', llm)
+        close_connection()
+
+
+def _record(llm, failed):
+    with own_transaction() as cursor:
+        cursor.execute(
+            f'INSERT INTO {LLMCircuit._meta.db_table} '
+            '(id, llm, state, calls, failures, window_started_at) '
+            'VALUES (%s, %s, %s, 0, 0, now()) '
+            'ON CONFLICT (llm) DO NOTHING',
+            [uuid.uuid4(), llm, CircuitState.CLOSED],
+        )
+        cursor.execute(
+            'SELECT state, calls, failures, now() - window_started_at > %s '
+            f'FROM {LLMCircuit._meta.db_table} '
+            'WHERE llm = %s FOR UPDATE',
+            [WINDOW, llm],
+        )
+        state, calls, failures, window_passed = cursor.fetchone()
+
+        if state != CircuitState.CLOSED:
+            if failed:
+                if state == CircuitState.HALF_OPEN:
+                    logger.warning('Circuit for %s probe failed, staying open', llm)
+                _open(cursor, llm)
+            elif state == CircuitState.HALF_OPEN:
+                # a success while fully open is a call from before the trip, and proves nothing
+                logger.info('Circuit for %s closed', llm)
+                cursor.execute(
+                    f'UPDATE {LLMCircuit._meta.db_table} '
+                    'SET state = %s, calls = 0, failures = 0, window_started_at = now(), retry_at = NULL '
+                    'WHERE llm = %s',
+                    [CircuitState.CLOSED, llm],
+                )
+            return
+
+        if window_passed:
+            calls = failures = 0
+            cursor.execute(
+                f'UPDATE {LLMCircuit._meta.db_table} SET window_started_at = now() WHERE llm = %s',
+                [llm],
+            )
+        calls += 1
+        failures += failed
+        if calls >= MIN_CALLS and failures >= calls * FAILURE_RATE:
+            logger.warning('Circuit for %s open, %s of %s recent calls failed', llm, failures, calls)
+            _open(cursor, llm)
+            return
+        cursor.execute(
+            f'UPDATE {LLMCircuit._meta.db_table} SET calls = %s, failures = %s WHERE llm = %s',
+            [calls, failures, llm],
+        )
+
+
+def _open(cursor, llm):
+    cursor.execute(
+        f'UPDATE {LLMCircuit._meta.db_table} '
+        'SET state = %s, calls = 0, failures = 0, retry_at = now() + %s '
+        'WHERE llm = %s',
+        [CircuitState.OPEN, OPEN_DURATION, llm],
+    )
+
+
+def open_llms():
+    """LLMs whose circuit is not closed, which matchmaking leaves alone."""
+    if not settings.LLM_CIRCUIT_BREAKER:
+        return []
+    return list(LLMCircuit.objects.exclude(
+        state=CircuitState.CLOSED,
+    ).values_list('llm', flat=True))
@@ -0,0 +1,102 @@
+import datetime
+import uuid
+
+import pytest
+
+from . import circuit_breaker
+from .circuit_breaker import CircuitState, LLMCircuit
+from .rate_limit import close_connection, own_transaction
+
+
+@pytest.fixture
+def llm(settings):
+    """A circuit of its own: the breaker commits on its own connection, past the test transaction."""
+    settings.LLM_CIRCUIT_BREAKER = True
+    llm = f'test-{uuid.uuid4().hex[:12]}'
+    yield llm
+    with own_transaction() as cursor:
+        cursor.execute(
+            f'DELETE FROM {LLMCircuit._meta.db_table} WHERE llm = %s',
+            [llm],
+        )
+    close_connection()
+
+
+def trip(llm):
+    for _ in range(circuit_breaker.MIN_CALLS):
+        circuit_breaker.record(llm, failed=True)
+
+
+def expire_wait(llm):
+    with own_transaction() as cursor:
+        cursor.execute(
+            f'UPDATE {LLMCircuit._meta.db_table} SET retry_at = now() WHERE llm = %s',
+            [llm],
+        )
+
+
+@pytest.mark.django_db
+def test_closed(llm):
+    assert circuit_breaker.check(llm) is None
+    circuit_breaker.record(llm, failed=False)
+    assert circuit_breaker.check(llm) is None
+    assert llm not in circuit_breaker.open_llms()
+
+
+@pytest.mark.django_db
+def test_few_failures_dont_trip(llm):
+    for _ in range(circuit_breaker.MIN_CALLS):
+        circuit_breaker.record(llm, failed=False)
+    for _ in range(circuit_breaker.MIN_CALLS - 1):
+        circuit_breaker.record(llm, failed=True)
+    assert circuit_breaker.check(llm) is None
+
+
+@pytest.mark.django_db
+def test_trip(llm):
+    trip(llm)
+    wait = circuit_breaker.check(llm)
+    assert datetime.timedelta(minutes=4) < wait <= circuit_breaker.OPEN_DURATION
+    assert llm in circuit_breaker.open_llms()
+
+
+@pytest.mark.django_db
+def test_probe_succeeds(llm):
+    trip(llm)
+    expire_wait(llm)
+
+    # one probe goes through, the others keep waiting for it
+    assert circuit_breaker.check(llm) is None
+    assert LLMCircuit.objects.get(llm=llm).state == CircuitState.HALF_OPEN
+    assert circuit_breaker.check(llm) is not None
+    assert llm in circuit_breaker.open_llms()
+
+    circuit_breaker.record(llm, failed=False)
+    assert circuit_breaker.check(llm) is None
+    assert llm not in circuit_breaker.open_llms()
+
+
+@pytest.mark.django_db
+def test_probe_fails(llm):
+    trip(llm)
+    expire_wait(llm)
+    assert circuit_breaker.check(llm) is None
+
+    circuit_breaker.record(llm, failed=True)
+    assert LLMCircuit.objects.get(llm=llm).state == CircuitState.OPEN
+    assert circuit_breaker.check(llm) is not None
+
+
+@pytest.mark.django_db
+def test_success_while_open_proves_nothing(llm):
+    trip(llm)
+    circuit_breaker.record(llm, failed=False)
+    assert circuit_breaker.check(llm) is not None
+
+
+def test_disabled(settings):
+    settings.LLM_CIRCUIT_BREAKER = False
+    # no database access at all
+    assert circuit_breaker.check('any-llm') is None
+    circuit_breaker.record('any-llm', failed=True)
+    assert circuit_breaker.open_llms() == []
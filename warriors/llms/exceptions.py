@@ -5,3 +5,8 @@ class TransientLLMError(Exception):
 
 class RateLimitError(TransientLLMError):
     pass
+
+
+class CallCancelled(Exception):
+    """The result is no longer needed, a hedged duplicate delivered it first"""
+    pass
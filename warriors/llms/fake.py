@@ -0,0 +1,110 @@
+"""
+Stand-ins for the paid APIs, for running the whole battle pipeline offline.
+
+Selected with the `FAKE_BACKENDS` setting.
+Outputs are a pure function of the input,
+so two runs over the same warriors produce the same battles and ratings.
+Latency and failures are random, drawn per call from the `FAKE_BACKEND_*` settings:
+latency from a log-normal distribution given by its median and 95th percentile,
+failures as transient errors and 429s in the given shares.
+"""
+import hashlib
+import math
+import random
+import time
+
+import voyageai
+from django.conf import settings
+
+from ..warriors import MAX_WARRIOR_LENGTH
+from .exceptions import CallCancelled, RateLimitError, TransientLLMError
+from .usage import Usage
+
+
+FAKE_LLM_VERSION = 'fake/1'
+FAKE_MODERATION_MODEL = 'fake-moderation'
+# share of warriors the fake moderation flags
+FLAGGED_SHARE = 0.05
+# z-score of the 95th percentile of the normal distribution
+_Z_95 = 1.645
+
+
+def resolve_battle(prompt_a, prompt_b, system_prompt='', max_output_tokens=None, cancel=None):
+    """
+    A battle result echoing a stretch of one of the prompts.
+
+    Echoing some of what it was given is what a real LLM does in this game,
+    and it gives the scores something to measure.
+    """
+    _wait(settings.FAKE_BACKEND_LATENCY['llm'], cancel)
+    _raise_faults()
+    prompt = system_prompt + prompt_a + prompt_b
+    rng = _rng(prompt)
+    source = rng.choice([prompt_a, prompt_b])
+    length = rng.randint(len(source) // 2, len(source))
+    start = rng.randint(0, len(source) - length)
+    result = source[start:start + length][:MAX_WARRIOR_LENGTH]
+    usage = Usage(
+        input_tokens=len(prompt) // 4,
+        output_tokens=len(result) // 4,
+    )
+    return result, 'stop', FAKE_LLM_VERSION, usage
+
+
+def call_llm(examples, prompt, system_prompt=None, max_completion_tokens=None):
+    """A warrior name made of the prompt's hash, in the shape of `openai.call_llm`."""
+    _wait(settings.FAKE_BACKEND_LATENCY['llm'])
+    return f'Fake {_digest(prompt).hex()[:8]}', FAKE_LLM_VERSION
+
+
+def moderate(texts):
+    """Whether each of the texts is flagged, and by what model, in one call."""
+    _wait(settings.FAKE_BACKEND_LATENCY['moderation'])
+    flagged = [_rng(text).random() < FLAGGED_SHARE for text in texts]
+    return flagged, FAKE_MODERATION_MODEL
+
+
+def get_embedding(content):
+    """A unit vector in the shape of voyage-3 embeddings."""
+    _wait(settings.FAKE_BACKEND_LATENCY['embedding'])
+    if random.random() < settings.FAKE_BACKEND_RATE_LIMIT_RATE:
+        raise voyageai.error.RateLimitError('Fake rate limit')
+    rng = _rng(content)
+    vector = [rng.gauss(0, 1) for _ in range(1024)]
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector]
+
+
+def get_voyage_embedding(text):
+    """A bit string in the shape of voyage-4-large binary embeddings."""
+    _wait(settings.FAKE_BACKEND_LATENCY['embedding'])
+    rng = _rng(text)
+    return format(rng.getrandbits(2048), '02048b')
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def _rng(text):
+    return random.Random(_digest(text))
+
+
+def _wait(latency, cancel=None):
+    median, p95 = latency
+    if median <= 0:
+        return
+    sigma = math.log(p95 / median) / _Z_95 if p95 > median else 0
+    seconds = random.lognormvariate(math.log(median), sigma)
+    if cancel is None:
+        time.sleep(seconds)
+    elif cancel.wait(seconds):
+        raise CallCancelled()
+
+
+def _raise_faults():
+    draw = random.random()
+    if draw < settings.FAKE_BACKEND_RATE_LIMIT_RATE:
+        raise RateLimitError()
+    if draw < settings.FAKE_BACKEND_RATE_LIMIT_RATE + settings.FAKE_BACKEND_ERROR_RATE:
+        raise TransientLLMError('Fake transient error')
@@ -0,0 +1,75 @@
+import math
+import threading
+
+import pytest
+import voyageai
+
+from . import fake
+from .exceptions import CallCancelled, RateLimitError, TransientLLMError
+
+
+@pytest.fixture(autouse=True)
+def no_latency(settings):
+    settings.FAKE_BACKEND_LATENCY = {
+        'llm': [0, 0],
+        'moderation': [0, 0],
+        'embedding': [0, 0],
+    }
+    settings.FAKE_BACKEND_ERROR_RATE = 0
+    settings.FAKE_BACKEND_RATE_LIMIT_RATE = 0
+
+
+def test_resolve_battle_deterministic():
+    result, finish_reason, llm_version, usage = fake.resolve_battle('prompt a' * 50, 'prompt b' * 50)
+    assert (result, finish_reason, llm_version, usage) == fake.resolve_battle('prompt a' * 50, 'prompt b' * 50)
+    assert result
+    assert result in 'prompt a' * 50 or result in 'prompt b' * 50
+    assert finish_reason == 'stop'
+    assert llm_version == fake.FAKE_LLM_VERSION
+
+
+@pytest.mark.parametrize('error_rate, rate_limit_rate, exception', [
+    (1, 0, TransientLLMError),
+    (0, 1, RateLimitError),
+])
+def test_resolve_battle_faults(settings, error_rate, rate_limit_rate, exception):
+    settings.FAKE_BACKEND_ERROR_RATE = error_rate
+    settings.FAKE_BACKEND_RATE_LIMIT_RATE = rate_limit_rate
+    with pytest.raises(exception):
+        fake.resolve_battle('prompt a', 'prompt b')
+
+
+def test_resolve_battle_cancelled(settings):
+    settings.FAKE_BACKEND_LATENCY = {'llm': [10, 10]}
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(CallCancelled):
+        fake.resolve_battle('prompt a', 'prompt b', cancel=cancel)
+
+
+def test_get_embedding():
+    embedding = fake.get_embedding('some text')
+    assert embedding == fake.get_embedding('some text')
+    assert embedding != fake.get_embedding('other text')
+    assert len(embedding) == 1024
+    assert math.isclose(sum(x * x for x in embedding), 1)
+
+
+def test_get_embedding_rate_limit(settings):
+    settings.FAKE_BACKEND_RATE_LIMIT_RATE = 1
+    with pytest.raises(voyageai.error.RateLimitError):
+        fake.get_embedding('some text')
+
+
+def test_get_voyage_embedding():
+    embedding = fake.get_voyage_embedding('some text')
+    assert embedding == fake.get_voyage_embedding('some text')
+    assert len(embedding) == 2048
+    assert set(embedding) <= {'0', '1'}
+
+
+def test_moderate():
+    assert fake.moderate(['some text']) == fake.moderate(['some text'])
+    flagged, model = fake.moderate(['some text', 'other text'])
+    assert len(flagged) == 2
+    assert model == fake.FAKE_MODERATION_MODEL
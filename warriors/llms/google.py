@@ -1,15 +1,18 @@
 import logging
+from contextlib import closing
 
 import httpx
 from django.conf import settings
 from google import genai
 from google.genai.errors import ClientError, ServerError
 from google.genai.types import (
-    FinishReason, GenerateContentConfig, ThinkingConfig,
+    FinishReason, GenerateContentConfig, InlinedRequest, JobState,
+    ThinkingConfig,
 )
 
 from ..warriors import MAX_WARRIOR_LENGTH
-from .exceptions import RateLimitError, TransientLLMError
+from .exceptions import CallCancelled, RateLimitError, TransientLLMError
+from .usage import Usage
 
 
 logger = logging.getLogger(__name__)
@@ -18,27 +21,22 @@ client = genai.Client(
 )
 
 
-def resolve_battle_google(prompt_a, prompt_b, system_prompt=''):
+MODEL = 'gemini-flash-lite-latest'
+
+
+def resolve_battle_google(prompt_a, prompt_b, system_prompt='', max_output_tokens=None, cancel=None):
     assert not system_prompt
-    return call_gemini(prompt_a + prompt_b)
+    return call_gemini(prompt_a + prompt_b, max_output_tokens, cancel)
 
 
-def call_gemini(prompt):
+def call_gemini(prompt, max_output_tokens=None, cancel=None):
     try:
-        response = client.models.generate_content(
-            model='gemini-flash-lite-latest',
+        with closing(client.models.generate_content_stream(
+            model=MODEL,
             contents=prompt,
-            config=GenerateContentConfig(
-                temperature=0,
-                # arbitrary value to prevent looping in chain of thought
-                # we allow for 1x thinking tokens and 1x output tokens, additional 1x for margin
-                max_output_tokens=MAX_WARRIOR_LENGTH * 3,
-                thinking_config=ThinkingConfig(
-                    # a hint the model reasons past, not a cap - max_output_tokens is the cap
-                    thinking_budget=MAX_WARRIOR_LENGTH * 1,
-                ),
-            ),
-        )
+            config=_battle_config(max_output_tokens),
+        )) as stream:
+            return _battle_stream_result(stream, cancel)
     except ClientError as e:
         if e.code == 429:
             raise RateLimitError() from e
@@ -47,20 +45,155 @@ def call_gemini(prompt):
         # the SDK's httpx transport never retries, so its resets and timeouts land here raw too
         raise TransientLLMError() from e
 
-    # None whenever no candidate carries a text part - what reasoning eating the whole budget looks like
-    text = response.text or ''
+
+def _battle_stream_result(stream, cancel=None):
+    """
+    Read a streamed battle, hanging up once the result is longer than a warrior can be.
+
+    The rest would be cut off anyway,
+    but it would still be waited for and paid for.
+    Hangs up as well once the `cancel` event is set.
+    """
+    parts = []
+    length = 0
+    has_candidate = False
+    finish_reason = None
+    model_version = None
+    usage = None
+    for chunk in stream:
+        if cancel is not None and cancel.is_set():
+            raise CallCancelled()
+        model_version = chunk.model_version or model_version
+        if chunk.usage_metadata is not None:
+            # running totals, the last chunk has the final ones
+            usage = _usage(chunk.usage_metadata)
+        # None whenever the chunk carries no text part
+        if chunk.text:
+            parts.append(chunk.text)
+            length += len(chunk.text)
+        if chunk.candidates:
+            has_candidate = True
+            if chunk.candidates[0].finish_reason is not None:
+                finish_reason = chunk.candidates[0].finish_reason.value
+        if length > MAX_WARRIOR_LENGTH:
+            finish_reason = 'character_limit'
+            break
+    return _battle_finish(''.join(parts), has_candidate, finish_reason, model_version, usage)
+
+
+def _battle_config(max_output_tokens=None):
+    return GenerateContentConfig(
+        temperature=0,
+        # arbitrary value to prevent looping in chain of thought
+        # we allow for 1x thinking tokens and 1x output tokens, additional 1x for margin
+        max_output_tokens=max_output_tokens or MAX_WARRIOR_LENGTH * 3,
+        thinking_config=ThinkingConfig(
+            # a hint the model reasons past, not a cap - max_output_tokens is the cap
+            thinking_budget=MAX_WARRIOR_LENGTH * 1,
+        ),
+    )
+
+
+def _battle_result(response):
     candidate = response.candidates[0] if response.candidates else None
-    if candidate is None:
+    return _battle_finish(
+        # None whenever no candidate carries a text part - what reasoning eating the whole budget looks like
+        response.text or '',
+        candidate is not None,
+        candidate.finish_reason.value if candidate is not None and candidate.finish_reason is not None else None,
+        response.model_version,
+        _usage(response.usage_metadata) if response.usage_metadata is not None else None,
+    )
+
+
+def _usage(usage_metadata):
+    return Usage(
+        input_tokens=usage_metadata.prompt_token_count or 0,
+        output_tokens=(usage_metadata.candidates_token_count or 0) + (usage_metadata.thoughts_token_count or 0),
+        cached_input_tokens=usage_metadata.cached_content_token_count or 0,
+        reasoning_tokens=usage_metadata.thoughts_token_count or 0,
+    )
+
+
+def _battle_finish(text, has_candidate, finish_reason, model_version, usage):
+    if not has_candidate:
         finish_reason = 'error'
-    elif candidate.finish_reason is None:
+    elif finish_reason is None:
         raise TransientLLMError('Mode has not stoped generating tokens, whatever that means')
-    else:
-        finish_reason = candidate.finish_reason.value
-        if (
-            # battle is not valid if we exceed token limit and MAX_WARRIOR_LENGTH is not reached
-            # model propably used all the tokens for reasoning
-            finish_reason == FinishReason.MAX_TOKENS.value and
-            len(text) < MAX_WARRIOR_LENGTH
-        ):
-            finish_reason = 'error'
-    return text, finish_reason, response.model_version
+    elif (
+        # battle is not valid if we exceed token limit and MAX_WARRIOR_LENGTH is not reached
+        # model propably used all the tokens for reasoning
+        finish_reason == FinishReason.MAX_TOKENS.value and
+        len(text) < MAX_WARRIOR_LENGTH
+    ):
+        finish_reason = 'error'
+    return text, finish_reason, model_version, usage
+
+
+# batch states after which the responses won't change anymore
+BATCH_FINAL_STATES = (
+    JobState.JOB_STATE_SUCCEEDED,
+    JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+    JobState.JOB_STATE_FAILED,
+    JobState.JOB_STATE_CANCELLED,
+    JobState.JOB_STATE_EXPIRED,
+)
+
+
+def submit_battle_batch(prompts, max_output_tokens=None):
+    """
+    Submit battles to Gemini batch mode, at half the price of the synchronous endpoint.
+
+    `prompts` maps a custom id to the full prompt of one battle.
+    Returns the provider's batch job name.
+    """
+    try:
+        batch_job = client.batches.create(
+            model=MODEL,
+            src=[
+                InlinedRequest(
+                    contents=prompt,
+                    config=_battle_config(max_output_tokens),
+                    metadata={'custom_id': custom_id},
+                )
+                for custom_id, prompt in prompts.items()
+            ],
+        )
+    except ClientError as e:
+        if e.code == 429:
+            raise RateLimitError() from e
+        raise
+    except (ServerError, httpx.TransportError) as e:
+        raise TransientLLMError() from e
+    return batch_job.name
+
+
+def get_battle_batch_results(batch_name):
+    """
+    Results of a submitted batch, or None while it is still being processed.
+
+    Maps custom ids to what `resolve_battle_google` would have returned.
+    Requests that failed, or whose result says to retry, are left out.
+    """
+    try:
+        batch_job = client.batches.get(name=batch_name)
+    except ClientError as e:
+        if e.code == 429:
+            raise RateLimitError() from e
+        raise
+    except (ServerError, httpx.TransportError) as e:
+        raise TransientLLMError() from e
+    if batch_job.state not in BATCH_FINAL_STATES:
+        return None
+    results = {}
+    inlined_responses = batch_job.dest.inlined_responses if batch_job.dest else None
+    for inlined_response in inlined_responses or []:
+        custom_id = (inlined_response.metadata or {}).get('custom_id')
+        if inlined_response.response is None:
+            logger.warning('Batch %s request %s failed: %s', batch_name, custom_id, inlined_response.error)
+            continue
+        try:
+            results[custom_id] = _battle_result(inlined_response.response)
+        except TransientLLMError:
+            logger.warning('Batch %s request %s did not finish generating', batch_name, custom_id)
+    return results
@@ -1,13 +1,22 @@
+import json
+
 import httpx
 import pytest
 import respx
 
 from ..warriors import MAX_WARRIOR_LENGTH
 from .exceptions import RateLimitError, TransientLLMError
-from .google import call_gemini
+from .google import call_gemini, get_battle_batch_results, submit_battle_batch
+from .usage import Usage
+
 
+gemini_endpoint = (
+    'https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-lite-latest:streamGenerateContent'
+)
 
-gemini_endpoint = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-lite-latest:generateContent'
+
+def sse(*chunks):
+    return ''.join(f'data: {json.dumps(chunk)}\n\n' for chunk in chunks)
 
 
 @respx.mock
@@ -37,12 +46,12 @@ def test_google_no_candidates():
     """Nothing was generated at all - nothing to score, and nothing a retry would fix."""
     respx.post(gemini_endpoint).respond(
         200,
-        json={
+        text=sse({
             'modelVersion': 'v1',
             'usageMetadata': {'promptTokenCount': 1, 'totalTokenCount': 1},
-        }
+        }),
     )
-    text, finish_reason, llm_version = call_gemini('prompt')
+    text, finish_reason, llm_version, usage = call_gemini('prompt')
     assert text == ''
     assert finish_reason == 'error'
     assert llm_version == 'v1'
@@ -56,16 +65,18 @@ def test_google_token_limit_reasoning():
     """
     respx.post(gemini_endpoint).respond(
         200,
-        json={
+        text=sse({
             'candidates': [{'content': {}, 'finishReason': 'MAX_TOKENS', 'index': 0}],
             'usageMetadata': {'promptTokenCount': 52, 'thoughtsTokenCount': 29, 'totalTokenCount': 81},
             'modelVersion': 'gemini-3.5-flash-lite',
-        }
+        }),
     )
-    text, finish_reason, llm_version = call_gemini('prompt')
+    text, finish_reason, llm_version, usage = call_gemini('prompt')
     assert text == ''
     assert finish_reason == 'error'
     assert llm_version == 'gemini-3.5-flash-lite'
+    # reasoning tokens are billed as output
+    assert usage == Usage(input_tokens=52, output_tokens=29, reasoning_tokens=29)
 
 
 @respx.mock
@@ -83,7 +94,7 @@ def test_google_token_limit_response(generated_text_len, expected_finish_reason)
     """
     respx.post(gemini_endpoint).respond(
         200,
-        json={
+        text=sse({
             'candidates': [{
                 'content': {'parts': [
                     {'text': 'a' * generated_text_len},
@@ -93,9 +104,9 @@ def test_google_token_limit_response(generated_text_len, expected_finish_reason)
             }],
             'usageMetadata': {'promptTokenCount': 6, 'candidatesTokenCount': 45, 'totalTokenCount': 51},
             'modelVersion': 'gemini-2.0-flash-thinking-exp-01-21',
-        }
+        }),
     )
-    text, finish_reason, llm_version = call_gemini('prompt')
+    text, finish_reason, llm_version, usage = call_gemini('prompt')
     assert text == 'a' * generated_text_len
     assert finish_reason == expected_finish_reason
     assert llm_version == 'gemini-2.0-flash-thinking-exp-01-21'
@@ -107,7 +118,7 @@ def test_google_no_finish_reason():
     Lets treat that as transient error."""
     respx.post(gemini_endpoint).respond(
         200,
-        json={
+        text=sse({
             'candidates': [{
                 'content': {'parts': [
                     {'text': 'a' * 100},
@@ -116,7 +127,7 @@ def test_google_no_finish_reason():
             }],
             'usageMetadata': {'promptTokenCount': 6, 'candidatesTokenCount': 45, 'totalTokenCount': 51},
             'modelVersion': 'gemini-2.0-flash-thinking-exp-01-21',
-        }
+        }),
     )
     with pytest.raises(TransientLLMError):
         call_gemini('prompt')
@@ -127,21 +138,90 @@ def test_google_no_text():
     """A reason other than the token limit stands even when nothing was generated."""
     respx.post(gemini_endpoint).respond(
         200,
-        json={
+        text=sse({
             'candidates': [{'finishReason': 'RECITATION', 'index': 0}],
             'modelVersion': 'gemini-2.0-flash-thinking-exp-01-21',
             'usageMetadata': {'promptTokenCount': 10, 'totalTokenCount': 10},
-        }
+        }),
     )
-    text, finish_reason, llm_version = call_gemini('prompt')
+    text, finish_reason, llm_version, usage = call_gemini('prompt')
     assert text == ''
     assert finish_reason == 'RECITATION'
     assert llm_version == 'gemini-2.0-flash-thinking-exp-01-21'
 
 
+@respx.mock
+def test_google_character_limit():
+    """Once the result is longer than a warrior can be, the rest is not waited for."""
+    chunks = [
+        {
+            'candidates': [{'content': {'parts': [{'text': 'a' * 400}], 'role': 'model'}, 'index': 0}],
+            'modelVersion': 'gemini-3.5-flash-lite',
+        }
+        for _ in range(7)
+    ]
+    chunks[-1]['candidates'][0]['finishReason'] = 'STOP'
+    respx.post(gemini_endpoint).respond(200, text=sse(*chunks))
+    text, finish_reason, llm_version, usage = call_gemini('prompt')
+    assert text == 'a' * 1200
+    assert finish_reason == 'character_limit'
+    assert llm_version == 'gemini-3.5-flash-lite'
+
+
+def batch_operation(state, inlined_responses=None):
+    metadata = {
+        '@type': 'type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch',
+        'model': 'models/gemini-flash-lite-latest',
+        'state': state,
+    }
+    if inlined_responses is not None:
+        metadata['output'] = {'inlinedResponses': {'inlinedResponses': inlined_responses}}
+    return {'name': 'batches/123', 'metadata': metadata}
+
+
+@respx.mock
+def test_google_batch():
+    create_route = respx.post(
+        'https://generativelanguage.googleapis.com/v1beta/models/gemini-flash-lite-latest:batchGenerateContent',
+    ).respond(200, json=batch_operation('BATCH_STATE_PENDING'))
+    get_route = respx.get('https://generativelanguage.googleapis.com/v1beta/batches/123')
+    get_route.respond(200, json=batch_operation('BATCH_STATE_RUNNING'))
+
+    batch_name = submit_battle_batch({'game-1': 'prompt a', 'game-2': 'prompt b'})
+    assert batch_name == 'batches/123'
+    requests = json.loads(create_route.calls.last.request.content)['batch']['inputConfig']['requests']['requests']
+    assert [request['metadata'] for request in requests] == [
+        {'custom_id': 'game-1'},
+        {'custom_id': 'game-2'},
+    ]
+
+    assert get_battle_batch_results(batch_name) is None
+
+    get_route.respond(200, json=batch_operation('BATCH_STATE_SUCCEEDED', [
+        {
+            'metadata': {'custom_id': 'game-1'},
+            'response': {
+                'candidates': [{
+                    'content': {'parts': [{'text': 'battle result'}], 'role': 'model'},
+                    'finishReason': 'STOP',
+                    'index': 0,
+                }],
+                'modelVersion': 'gemini-flash-lite-latest',
+            },
+        },
+        {
+            'metadata': {'custom_id': 'game-2'},
+            'error': {'code': 13, 'message': 'Internal error'},
+        },
+    ]))
+    assert get_battle_batch_results(batch_name) == {
+        'game-1': ('battle result', 'STOP', 'gemini-flash-lite-latest', None),
+    }
+
+
 @pytest.mark.real_world
 def test_call_gemini_real_endpoint():
-    text, finish_reason, llm_version = call_gemini('Test text')
+    text, finish_reason, llm_version, usage = call_gemini('Test text')
     assert isinstance(text, str)
     assert isinstance(finish_reason, str)
     assert isinstance(llm_version, str)
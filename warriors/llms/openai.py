@@ -1,10 +1,15 @@
+import json
 import logging
 
+import httpx
 import openai
 from django.conf import settings
+from openai.types.chat import ChatCompletion
 
 from ..warriors import MAX_WARRIOR_LENGTH
-from .exceptions import RateLimitError, TransientLLMError
+from .exceptions import CallCancelled, RateLimitError, TransientLLMError
+from .rate_limit import estimate_text_tokens
+from .usage import Usage
 
 
 logger = logging.getLogger(__name__)
@@ -23,25 +28,159 @@ def _llm_version(response):
     return response.model + '/' + (response.system_fingerprint or '')
 
 
-def resolve_battle_openai(prompt_a, prompt_b, system_prompt=''):
+def resolve_battle_openai(prompt_a, prompt_b, system_prompt='', max_output_tokens=None, cancel=None):
+    try:
+        stream = openai_client.chat.completions.create(
+            **_battle_request(prompt_a + prompt_b, system_prompt, max_output_tokens),
+            stream=True,
+            # usage comes in an extra chunk after the last one
+            stream_options={'include_usage': True},
+        )
+        with stream:
+            result, finish_reason, llm_version, usage = _battle_stream_result(stream, cancel)
+        if usage is None:
+            # hanging up forgoes the usage chunk, which comes last,
+            # but the call is paid for all the same
+            usage = _estimated_usage(system_prompt + prompt_a + prompt_b, result)
+        return result, finish_reason, llm_version, usage
+    except openai.RateLimitError as e:
+        raise RateLimitError() from e
+    except openai.APIStatusError as e:
+        if e.response.status_code >= 500:
+            raise TransientLLMError() from e
+        raise
+    except (openai.APIConnectionError, httpx.TransportError) as e:
+        # a stream can break halfway, and the SDK leaves errors past the headers to httpx
+        raise TransientLLMError() from e
+
+
+def _battle_stream_result(stream, cancel=None):
+    """
+    Read a streamed battle, hanging up once the result is longer than a warrior can be.
+
+    The rest would be cut off anyway,
+    but it would still be waited for and paid for.
+    Hangs up as well once the `cancel` event is set.
+    """
+    parts = []
+    length = 0
+    finish_reason = None
+    last_chunk = None
+    usage = None
+    for chunk in stream:
+        if cancel is not None and cancel.is_set():
+            raise CallCancelled()
+        last_chunk = chunk
+        if chunk.usage is not None:
+            usage = _usage(chunk.usage)
+        for choice in chunk.choices:
+            if choice.delta.content:
+                parts.append(choice.delta.content)
+                length += len(choice.delta.content)
+            if choice.finish_reason is not None:
+                finish_reason = choice.finish_reason
+        if length > MAX_WARRIOR_LENGTH:
+            finish_reason = 'character_limit'
+            break
+    if finish_reason is None:
+        raise TransientLLMError('Stream ended without a finish reason')
+    result = ''.join(parts)
+    return result, _battle_finish_reason(finish_reason, result), _llm_version(last_chunk), usage
+
+
+def _battle_request(prompt, system_prompt='', max_output_tokens=None):
     messages = []
     if system_prompt:
         messages.append({'role': 'system', 'content': system_prompt})
     messages.append({
         'role': 'user',
-        'content': prompt_a + prompt_b,
+        'content': prompt,
     })
+    return {
+        'messages': messages,
+        'model': 'gpt-5-mini',
+        'reasoning_effort': 'low',
+        # Completion length limit is in tokens, so when measured in chars we will likely get more.
+        # Other way arund is I think possible also - exotic unicode symbols
+        # may be multiple LLM tokens, but a single char.
+        # But this is a marginal case, so lets forget it for now.
+        # 1x reasoning tokens, 1x output tokens, additional 1x for margin
+        'max_completion_tokens': max_output_tokens or MAX_WARRIOR_LENGTH * 3,
+    }
+
+
+def _battle_result(response):
+    (resp_choice,) = response.choices
+    # content is Optional in the response schema, hence the fallback
+    result = resp_choice.message.content or ''
+    return (
+        result,
+        _battle_finish_reason(resp_choice.finish_reason, result),
+        _llm_version(response),
+        _usage(response.usage) if response.usage is not None else None,
+    )
+
+
+def _usage(completion_usage):
+    prompt_details = completion_usage.prompt_tokens_details
+    completion_details = completion_usage.completion_tokens_details
+    return Usage(
+        input_tokens=completion_usage.prompt_tokens,
+        output_tokens=completion_usage.completion_tokens,
+        # prompts of 1024+ tokens are cached automatically
+        cached_input_tokens=(prompt_details.cached_tokens or 0) if prompt_details is not None else 0,
+        reasoning_tokens=(completion_details.reasoning_tokens or 0) if completion_details is not None else 0,
+    )
+
+
+def _estimated_usage(prompt, result):
+    return Usage(
+        input_tokens=estimate_text_tokens(prompt),
+        output_tokens=estimate_text_tokens(result),
+        estimated=True,
+    )
+
+
+def _battle_finish_reason(finish_reason, result):
+    if (
+        # battle is not valid if we exceed token limit and MAX_WARRIOR_LENGTH is not reached
+        # model propably used all the tokens for reasoning
+        finish_reason == 'length' and
+        len(result) < MAX_WARRIOR_LENGTH
+    ):
+        return 'error'
+    return finish_reason
+
+
+# batch statuses after which the output file won't change anymore
+BATCH_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def submit_battle_batch(prompts, max_output_tokens=None):
+    """
+    Submit battles to the Batch API, at half the price of the synchronous endpoint.
+
+    `prompts` maps a custom id to the full prompt of one battle.
+    Returns the provider's batch id.
+    """
+    lines = [
+        json.dumps({
+            'custom_id': custom_id,
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': _battle_request(prompt, max_output_tokens=max_output_tokens),
+        })
+        for custom_id, prompt in prompts.items()
+    ]
     try:
-        response = openai_client.chat.completions.create(
-            messages=messages,
-            model='gpt-5-mini',
-            reasoning_effort='low',
-            # Completion length limit is in tokens, so when measured in chars we will likely get more.
-            # Other way arund is I think possible also - exotic unicode symbols
-            # may be multiple LLM tokens, but a single char.
-            # But this is a marginal case, so lets forget it for now.
-            # 1x reasoning tokens, 1x output tokens, additional 1x for margin
-            max_completion_tokens=MAX_WARRIOR_LENGTH * 3,
+        input_file = openai_client.files.create(
+            file=('battles.jsonl', '\n'.join(lines).encode('utf-8')),
+            purpose='batch',
+        )
+        batch = openai_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h',
         )
     except openai.RateLimitError as e:
         raise RateLimitError() from e
@@ -49,19 +188,38 @@ def resolve_battle_openai(prompt_a, prompt_b, system_prompt=''):
         if e.response.status_code >= 500:
             raise TransientLLMError() from e
         raise
-    else:
-        (resp_choice,) = response.choices
-        finish_reason = resp_choice.finish_reason
-        # content is Optional in the response schema, hence the fallback
-        result = resp_choice.message.content or ''
-        if (
-            # battle is not valid if we exceed token limit and MAX_WARRIOR_LENGTH is not reached
-            # model propably used all the tokens for reasoning
-            finish_reason == 'length' and
-            len(result) < MAX_WARRIOR_LENGTH
-        ):
-            finish_reason = 'error'
-        return result, finish_reason, _llm_version(response)
+    return batch.id
+
+
+def get_battle_batch_results(batch_id):
+    """
+    Results of a submitted batch, or None while it is still being processed.
+
+    Maps custom ids to what `resolve_battle_openai` would have returned.
+    Requests that failed or expired are left out.
+    """
+    try:
+        batch = openai_client.batches.retrieve(batch_id)
+        if batch.status not in BATCH_FINAL_STATUSES:
+            return None
+        if batch.output_file_id is None:
+            return {}
+        output = openai_client.files.content(batch.output_file_id).text
+    except openai.APIStatusError as e:
+        if e.response.status_code == 429 or e.response.status_code >= 500:
+            raise TransientLLMError() from e
+        raise
+    results = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get('response')
+        if response is None or response['status_code'] != 200:
+            logger.warning('Batch %s request %s failed: %s', batch_id, record['custom_id'], record.get('error'))
+            continue
+        results[record['custom_id']] = _battle_result(ChatCompletion.model_validate(response['body']))
+    return results
 
 
 def call_llm(examples, prompt, system_prompt=None, max_completion_tokens=None):
@@ -1,9 +1,17 @@
+import json
+import threading
+
+import httpx
 import pytest
 import respx
 
+from ..tests.factories import chat_completion_sse
 from ..warriors import MAX_WARRIOR_LENGTH
-from .exceptions import RateLimitError, TransientLLMError
-from .openai import resolve_battle_openai
+from .exceptions import CallCancelled, RateLimitError, TransientLLMError
+from .openai import (
+    get_battle_batch_results, resolve_battle_openai, submit_battle_batch,
+)
+from .usage import Usage
 
 
 openai_endpoint = 'https://api.openai.com/v1/chat/completions'
@@ -38,6 +46,15 @@ def test_openai_503():
         resolve_battle_openai('prompt a', 'prompt b')
 
 
+@respx.mock
+def test_openai_cancelled():
+    respx.post(openai_endpoint).respond(200, text=chat_completion_sse('Some result'))
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(CallCancelled):
+        resolve_battle_openai('prompt a', 'prompt b', cancel=cancel)
+
+
 @respx.mock
 @pytest.mark.parametrize('content', ['', None])
 def test_openai_token_limit_reasoning(content):
@@ -45,8 +62,8 @@ def test_openai_token_limit_reasoning(content):
 
     The live endpoint sends an empty string, the schema permits null.
     """
-    respx.post(openai_endpoint).respond(200, json=chat_completion('length', content))
-    text, finish_reason, llm_version = resolve_battle_openai('prompt a', 'prompt b')
+    respx.post(openai_endpoint).respond(200, text=chat_completion_sse(content or '', 'length'))
+    text, finish_reason, llm_version, usage = resolve_battle_openai('prompt a', 'prompt b')
     assert text == ''
     assert finish_reason == 'error'
     assert llm_version == 'gpt-5-mini-2025-08-07/'
@@ -67,9 +84,9 @@ def test_openai_token_limit_response(generated_text_len, expected_finish_reason)
     """
     respx.post(openai_endpoint).respond(
         200,
-        json=chat_completion('length', 'a' * generated_text_len),
+        text=chat_completion_sse('a' * generated_text_len, 'length'),
     )
-    text, finish_reason, llm_version = resolve_battle_openai('prompt a', 'prompt b')
+    text, finish_reason, llm_version, usage = resolve_battle_openai('prompt a', 'prompt b')
     assert text == 'a' * generated_text_len
     assert finish_reason == expected_finish_reason
     assert llm_version == 'gpt-5-mini-2025-08-07/'
@@ -78,21 +95,130 @@ def test_openai_token_limit_response(generated_text_len, expected_finish_reason)
 @respx.mock
 def test_openai_stop():
     """A short answer is fine as long as the model chose to stop."""
-    respx.post(openai_endpoint).respond(200, json=chat_completion(
-        'stop', 'a' * 100, system_fingerprint='fp_deadbeef',
+    respx.post(openai_endpoint).respond(200, text=chat_completion_sse(
+        'a' * 100, 'stop', system_fingerprint='fp_deadbeef',
+        usage={
+            'prompt_tokens': 1100, 'completion_tokens': 300, 'total_tokens': 1400,
+            'prompt_tokens_details': {'cached_tokens': 1024},
+            'completion_tokens_details': {'reasoning_tokens': 200},
+        },
     ))
-    text, finish_reason, llm_version = resolve_battle_openai('prompt a', 'prompt b')
+    text, finish_reason, llm_version, usage = resolve_battle_openai('prompt a', 'prompt b')
     assert text == 'a' * 100
     assert finish_reason == 'stop'
     assert llm_version == 'gpt-5-mini-2025-08-07/fp_deadbeef'
+    assert usage == Usage(input_tokens=1100, output_tokens=300, cached_input_tokens=1024, reasoning_tokens=200)
+
+
+@respx.mock
+def test_openai_character_limit():
+    """Once the result is longer than a warrior can be, the rest is not waited for."""
+    respx.post(openai_endpoint).respond(200, text=chat_completion_sse('a' * MAX_WARRIOR_LENGTH * 3, 'stop'))
+    text, finish_reason, llm_version, usage = resolve_battle_openai('prompt a', 'prompt b')
+    assert MAX_WARRIOR_LENGTH < len(text) < MAX_WARRIOR_LENGTH * 3
+    assert finish_reason == 'character_limit'
+    # the usage chunk comes last, so it is estimated
+    assert usage == Usage(input_tokens=4, output_tokens=len(text) // 4, estimated=True)
+
+
+@respx.mock
+def test_openai_stream_broken():
+    """A stream that ends without saying why is no result, but a retry may get one."""
+    respx.post(openai_endpoint).respond(200, text=chat_completion_sse('a' * 500, finish_reason=None))
+    with pytest.raises(TransientLLMError):
+        resolve_battle_openai('prompt a', 'prompt b')
 
 
 @pytest.mark.real_world
 def test_resolve_battle_openai_real_endpoint():
-    text, finish_reason, llm_version = resolve_battle_openai(
+    text, finish_reason, llm_version, usage = resolve_battle_openai(
         'Test text',
         'Another test text',
     )
     assert isinstance(text, str)
     assert isinstance(finish_reason, str)
     assert isinstance(llm_version, str)
+
+
+class FakeBatchServer:
+    """
+    The Batch API endpoints, answering every request in a batch
+    with `content` once the batch was polled `polls_to_complete` times.
+    """
+    def __init__(self, content, polls_to_complete=1):
+        self.content = content
+        self.polls_to_complete = polls_to_complete
+        self.files = {}
+        self.batches = {}
+        respx.post('https://api.openai.com/v1/files').mock(side_effect=self.create_file)
+        respx.get(url__regex=r'https://api\.openai\.com/v1/files/(?P<file_id>[\w-]+)/content').mock(
+            side_effect=self.file_content,
+        )
+        respx.post('https://api.openai.com/v1/batches').mock(side_effect=self.create_batch)
+        respx.get(url__regex=r'https://api\.openai\.com/v1/batches/(?P<batch_id>[\w-]+)').mock(
+            side_effect=self.retrieve_batch,
+        )
+
+    def create_file(self, request):
+        # the only part of the multipart body we need is the jsonl file
+        body = request.read().decode('utf-8')
+        lines = [line for line in body.splitlines() if line.startswith('{')]
+        file_id = f'file-{len(self.files)}'
+        self.files[file_id] = '\n'.join(lines)
+        return httpx.Response(200, json={
+            'id': file_id, 'object': 'file', 'bytes': len(body), 'created_at': 1785345620,
+            'filename': 'battles.jsonl', 'purpose': 'batch',
+        })
+
+    def file_content(self, request, file_id):
+        return httpx.Response(200, text=self.files[file_id])
+
+    def create_batch(self, request):
+        body = json.loads(request.content)
+        batch_id = f'batch-{len(self.batches)}'
+        self.batches[batch_id] = {'input_file_id': body['input_file_id'], 'polls': 0}
+        return httpx.Response(200, json=self.batch_json(batch_id, 'validating'))
+
+    def retrieve_batch(self, request, batch_id):
+        batch = self.batches[batch_id]
+        batch['polls'] += 1
+        if batch['polls'] < self.polls_to_complete:
+            return httpx.Response(200, json=self.batch_json(batch_id, 'in_progress'))
+        output = []
+        for line in self.files[batch['input_file_id']].splitlines():
+            custom_id = json.loads(line)['custom_id']
+            output.append(json.dumps({
+                'id': f'response-{custom_id}',
+                'custom_id': custom_id,
+                'response': {'status_code': 200, 'body': chat_completion('stop', self.content)},
+                'error': None,
+            }))
+        output_file_id = f'file-{len(self.files)}'
+        self.files[output_file_id] = '\n'.join(output)
+        return httpx.Response(200, json=self.batch_json(batch_id, 'completed', output_file_id))
+
+    def batch_json(self, batch_id, status, output_file_id=None):
+        return {
+            'id': batch_id, 'object': 'batch', 'endpoint': '/v1/chat/completions',
+            'input_file_id': self.batches[batch_id]['input_file_id'],
+            'completion_window': '24h', 'status': status, 'created_at': 1785345620,
+            'output_file_id': output_file_id,
+        }
+
+
+@respx.mock
+def test_openai_batch():
+    server = FakeBatchServer('battle result', polls_to_complete=2)
+
+    batch_id = submit_battle_batch({'game-1': 'prompt a', 'game-2': 'prompt b'})
+    (input_file,) = server.files.values()
+    assert [json.loads(line)['body']['messages'] for line in input_file.splitlines()] == [
+        [{'role': 'user', 'content': 'prompt a'}],
+        [{'role': 'user', 'content': 'prompt b'}],
+    ]
+
+    assert get_battle_batch_results(batch_id) is None
+    assert get_battle_batch_results(batch_id) == {
+        'game-1': ('battle result', 'stop', 'gpt-5-mini-2025-08-07/', None),
+        'game-2': ('battle result', 'stop', 'gpt-5-mini-2025-08-07/', None),
+    }
@@ -0,0 +1,248 @@
+"""
+Client-side rate limiting of LLM calls.
+
+One token bucket per LLM, holding requests and tokens,
+refilled continuously up to the per-minute limits from settings.
+A call is admitted only when the bucket can pay for it,
+so a burst of due games waits for capacity
+instead of collecting 429s and the long backoff `_run_llm` gives them.
+
+The buckets live in Postgres so that every worker thread
+and every worker instance draws from the same one.
+"""
+import bisect
+import datetime
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, models
+
+from ..warriors import MAX_WARRIOR_LENGTH
+
+
+logger = logging.getLogger(__name__)
+
+
+class LLMRateLimit(models.Model):
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+    )
+    llm = models.CharField(
+        max_length=20,
+        unique=True,
+    )
+    requests = models.FloatField()
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+
+
+def estimate_tokens(prompt, max_output_tokens=None):
+    """
+    What a call is charged against the tokens-per-minute limit.
+
+    Providers count the requested output budget, not what gets generated,
+    so the estimate takes the budget the call asks for
+    (without one, the largest a connector defaults to)
+    on top of the prompt.
+    """
+    return estimate_text_tokens(prompt) + (max_output_tokens or MAX_WARRIOR_LENGTH * 3)
+
+
+def estimate_text_tokens(text):
+    """Tokens `text` makes, at roughly four characters per token."""
+    return len(text) // 4
+
+
+def acquire(llm, tokens):
+    """
+    Take one request and `tokens` tokens out of the LLM's bucket.
+
+    Returns None when the call is admitted,
+    otherwise how long to wait until the bucket can pay for it.
+    An LLM with no limits configured is always admitted,
+    and so is every call while the database cannot be asked.
+    """
+    requests_per_minute, tokens_per_minute = _get_limits(llm)
+    if not requests_per_minute and not tokens_per_minute:
+        return None
+    try:
+        return _acquire(llm, tokens, requests_per_minute, tokens_per_minute)
+    except DatabaseError:
+        logger.exception('Rate limit bucket for %s unavailable, admitting the call', llm)
+        close_connection()
+        return None
+
+
+def drain(llm):
+    """
+    Empty the LLM's bucket after the provider answered 429.
+
+    The provider knows better than our limits,
+    so every worker backs off until the bucket refills.
+    """
+    requests_per_minute, tokens_per_minute = _get_limits(llm)
+    if not requests_per_minute and not tokens_per_minute:
+        return
+    try:
+        with own_transaction() as cursor:
+            _ensure_bucket(cursor, llm, requests_per_minute, tokens_per_minute)
+            cursor.execute(
+                f'UPDATE {LLMRateLimit._meta.db_table} '
+                'SET requests = 0, tokens = 0, updated_at = now() '
+                'WHERE llm = %s',
+                [llm],
+            )
+    except DatabaseError:
+        logger.exception('Rate limit bucket for %s unavailable, not draining it', llm)
+        close_connection()
+
+
+def _get_limits(llm):
+    return (
+        settings.LLM_REQUESTS_PER_MINUTE.get(llm, 0),
+        settings.LLM_TOKENS_PER_MINUTE.get(llm, 0),
+    )
+
+
+def _acquire(llm, tokens, requests_per_minute, tokens_per_minute):
+    with own_transaction() as cursor:
+        _ensure_bucket(cursor, llm, requests_per_minute, tokens_per_minute)
+        cursor.execute(
+            'SELECT requests, tokens, EXTRACT(EPOCH FROM now() - updated_at) '
+            f'FROM {LLMRateLimit._meta.db_table} '
+            'WHERE llm = %s FOR UPDATE',
+            [llm],
+        )
+        available_requests, available_tokens, elapsed_seconds = cursor.fetchone()
+        elapsed_minutes = max(float(elapsed_seconds), 0) / 60
+
+        wait_minutes = 0
+        if requests_per_minute:
+            available_requests = min(
+                requests_per_minute,
+                available_requests + elapsed_minutes * requests_per_minute,
+            )
+            if available_requests < 1:
+                wait_minutes = (1 - available_requests) / requests_per_minute
+        if tokens_per_minute:
+            # a call bigger than the whole bucket would never fit, so it waits for a full one
+            tokens = min(tokens, tokens_per_minute)
+            available_tokens = min(
+                tokens_per_minute,
+                available_tokens + elapsed_minutes * tokens_per_minute,
+            )
+            if available_tokens < tokens:
+                wait_minutes = max(
+                    wait_minutes,
+                    (tokens - available_tokens) / tokens_per_minute,
+                )
+
+        if not wait_minutes:
+            if requests_per_minute:
+                available_requests -= 1
+            if tokens_per_minute:
+                available_tokens -= tokens
+        cursor.execute(
+            f'UPDATE {LLMRateLimit._meta.db_table} '
+            'SET requests = %s, tokens = %s, updated_at = now() '
+            'WHERE llm = %s',
+            [available_requests, available_tokens, llm],
+        )
+
+    if not wait_minutes:
+        return None
+    return datetime.timedelta(minutes=wait_minutes)
+
+
+def _ensure_bucket(cursor, llm, requests_per_minute, tokens_per_minute):
+    # a new bucket starts full
+    cursor.execute(
+        f'INSERT INTO {LLMRateLimit._meta.db_table} (id, llm, requests, tokens, updated_at) '
+        'VALUES (%s, %s, %s, %s, now()) '
+        'ON CONFLICT (llm) DO NOTHING',
+        [uuid.uuid4(), llm, requests_per_minute, tokens_per_minute],
+    )
+
+
+_local = threading.local()
+
+
+@contextmanager
+def own_transaction():
+    """
+    A transaction on a connection of our own.
+
+    The goal worker runs every handler inside its own transaction,
+    which would keep the bucket row locked, and its update invisible,
+    until the LLM call it just admitted has finished.
+    """
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = _local.connection = connections.create_connection(DEFAULT_DB_ALIAS)
+    connection.ensure_connection()
+    pg_connection = connection.connection
+    with pg_connection.transaction(), pg_connection.cursor() as cursor:
+        yield cursor
+
+
+def close_connection():
+    connection = getattr(_local, 'connection', None)
+    if connection is not None:
+        _local.connection = None
+        connection.close()
+
+
+class CallStats:
+    """
+    Latency, 429 share and prompt cache hits of recent calls, per LLM, in this process.
+
+    A summary is logged every `window` calls,
+    which is what tells whether the limits are set right:
+    429s mean they are too generous,
+    a growing tail means calls queue behind them.
+    The cache share is the part of input tokens
+    the provider served from its prompt cache, at a discount.
+    """
+    def __init__(self, window=100):
+        self.window = window
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.rate_limited = {}
+        self.input_tokens = {}
+        self.cached_input_tokens = {}
+
+    def record(self, llm, latency, rate_limited=False, usage=None):
+        with self.lock:
+            latencies = self.latencies.setdefault(llm, [])
+            bisect.insort(latencies, latency)
+            self.rate_limited[llm] = self.rate_limited.get(llm, 0) + rate_limited
+            if usage is not None:
+                self.input_tokens[llm] = self.input_tokens.get(llm, 0) + usage.input_tokens
+                self.cached_input_tokens[llm] = self.cached_input_tokens.get(llm, 0) + usage.cached_input_tokens
+            if len(latencies) < self.window:
+                return
+            rate_limited_count = self.rate_limited[llm]
+            input_tokens = self.input_tokens.pop(llm, 0)
+            cached_input_tokens = self.cached_input_tokens.pop(llm, 0)
+            self.latencies[llm] = []
+            self.rate_limited[llm] = 0
+        logger.info(
+            'LLM %s, last %s calls: %.0f%% rate limited, latency p50 %.1fs, p95 %.1fs, max %.1fs, '
+            '%.0f%% of %s input tokens from cache',
+            llm,
+            len(latencies),
+            100 * rate_limited_count / len(latencies),
+            latencies[len(latencies) // 2],
+            latencies[len(latencies) * 95 // 100],
+            latencies[-1],
+            100 * cached_input_tokens / input_tokens if input_tokens else 0,
+            input_tokens,
+        )
+
+
+call_stats = CallStats()
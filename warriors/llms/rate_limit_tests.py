@@ -0,0 +1,85 @@
+import datetime
+import uuid
+
+import pytest
+
+from . import rate_limit
+from .usage import Usage
+
+
+@pytest.fixture
+def llm(settings):
+    """A bucket of its own: the limiter commits on its own connection, past the test transaction."""
+    llm = f'test-{uuid.uuid4().hex[:12]}'
+    settings.LLM_REQUESTS_PER_MINUTE = {llm: 2}
+    settings.LLM_TOKENS_PER_MINUTE = {llm: 1000}
+    yield llm
+    with rate_limit.own_transaction() as cursor:
+        cursor.execute(
+            f'DELETE FROM {rate_limit.LLMRateLimit._meta.db_table} WHERE llm = %s',
+            [llm],
+        )
+    rate_limit.close_connection()
+
+
+@pytest.mark.django_db
+def test_unlimited_llm_is_admitted():
+    assert rate_limit.acquire('no-such-llm', 10 ** 9) is None
+
+
+@pytest.mark.django_db
+def test_requests_per_minute(llm):
+    assert rate_limit.acquire(llm, 1) is None
+    assert rate_limit.acquire(llm, 1) is None
+    wait = rate_limit.acquire(llm, 1)
+    # one request refills in half a minute
+    assert datetime.timedelta(seconds=25) < wait <= datetime.timedelta(seconds=30)
+
+
+@pytest.mark.django_db
+def test_tokens_per_minute(llm):
+    assert rate_limit.acquire(llm, 800) is None
+    wait = rate_limit.acquire(llm, 400)
+    assert datetime.timedelta(seconds=9) < wait <= datetime.timedelta(seconds=12)
+
+
+@pytest.mark.django_db
+def test_oversized_call_waits_for_full_bucket(llm):
+    """A call over the whole per-minute budget is admitted alone rather than never."""
+    assert rate_limit.acquire(llm, 5000) is None
+    assert rate_limit.acquire(llm, 1) is not None
+
+
+@pytest.mark.django_db
+def test_refill(llm):
+    rate_limit.acquire(llm, 1)
+    rate_limit.acquire(llm, 1)
+    with rate_limit.own_transaction() as cursor:
+        cursor.execute(
+            f'UPDATE {rate_limit.LLMRateLimit._meta.db_table} '
+            "SET updated_at = now() - interval '1 minute' WHERE llm = %s",
+            [llm],
+        )
+    assert rate_limit.acquire(llm, 1) is None
+    assert rate_limit.acquire(llm, 1) is None
+    assert rate_limit.acquire(llm, 1) is not None
+
+
+@pytest.mark.django_db
+def test_drain(llm):
+    rate_limit.drain(llm)
+    assert rate_limit.acquire(llm, 1) is not None
+
+
+def test_call_stats(caplog):
+    call_stats = rate_limit.CallStats(window=4)
+    for latency in [3.0, 1.0]:
+        call_stats.record('some-llm', latency, usage=Usage(input_tokens=500, output_tokens=10))
+    call_stats.record('some-llm', 2.0, usage=Usage(input_tokens=1000, output_tokens=10, cached_input_tokens=1000))
+    assert not caplog.records
+    call_stats.record('some-llm', 4.0, rate_limited=True)
+    (record,) = caplog.records
+    assert record.getMessage() == (
+        'LLM some-llm, last 4 calls: 25% rate limited, latency p50 3.0s, p95 4.0s, max 4.0s, '
+        '50% of 2000 input tokens from cache'
+    )
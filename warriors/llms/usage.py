@@ -0,0 +1,20 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Usage:
+    """
+    Tokens one call was billed for, as the provider reported them.
+
+    Output tokens include the reasoning ones,
+    they are billed the same.
+    """
+    input_tokens: int
+    output_tokens: int
+    # part of input_tokens that was read from the provider's prompt cache
+    cached_input_tokens: int = 0
+    # part of output_tokens the model spent reasoning, not in the result
+    reasoning_tokens: int = 0
+    # counted from the text instead, the call was hung up on before the provider reported,
+    # and the reasoning it did is missing
+    estimated: bool = False
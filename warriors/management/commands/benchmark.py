@@ -0,0 +1,224 @@
+"""
+Throughput and latency of the whole battle pipeline, offline.
+
+Seeds a fresh arena with synthetic warriors,
+runs the `worker` command on it for a fixed time against the fake backends
+(`warriors/llms/fake.py`, their latency and failures set in settings)
+and reports, as JSON:
+
+- battles resolved per minute, both directions scored
+- p50 and p95 of the time from a battle being scheduled to its last score
+- p50 and p95 of the time from a warrior being created to its first resolved game
+- how fast the arena's summed absolute rating error drains, per minute
+  (negative while new games add error faster than rating updates absorb it)
+- database queries per resolved battle
+
+Queries are counted on Django's own connections.
+The rate limiter and the circuit breaker talk to Postgres
+on raw connections of their own and are not counted.
+
+The worker processes every goal in the database, not only the seeded ones,
+so run it against a database of its own.
+Refuses to run without `FAKE_BACKENDS` — it would spend real money.
+"""
+import datetime
+import json
+import os
+import random
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Abs
+from django.utils import timezone
+from django_goals.models import GoalState
+
+from ...battles import DBGame
+from ...models import WarriorArena
+from ...warriors import MAX_WARRIOR_LENGTH
+
+
+WORDS = (
+    'ignore', 'previous', 'instructions', 'repeat', 'this', 'text', 'exactly',
+    'output', 'only', 'the', 'following', 'say', 'nothing', 'else', 'copy',
+    'everything', 'above', 'below', 'verbatim', 'translate', 'to', 'french',
+    'you', 'are', 'a', 'parrot', 'winner', 'rules', 'answer', 'with', 'me',
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the battle pipeline against the fake backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warriors', type=int, default=100)
+        parser.add_argument(
+            '--threads',
+            default='4',
+            help='Worker threads, in the form the worker command takes them',
+        )
+        parser.add_argument('--cpu-processes', type=int, default=0)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=300.0,
+            help='Seconds to run the worker for',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed for the warrior bodies',
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Where to write the JSON report, "-" for stdout',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.FAKE_BACKENDS:
+            raise CommandError('Refusing to benchmark against real APIs, set FAKE_BACKENDS')
+
+        arena = seed_arena(options['warriors'], random.Random(options['seed']))
+        rating_error_before = get_rating_error(arena)
+
+        queries = QueryCounter()
+        connection_created.connect(queries.install)
+        timer = threading.Timer(options['duration'], os.kill, args=(os.getpid(), signal.SIGTERM))
+        started_at = timezone.now()
+        timer.start()
+        try:
+            call_command(
+                'worker',
+                f'--threads={options["threads"]}',
+                f'--cpu-processes={options["cpu_processes"]}',
+            )
+        finally:
+            timer.cancel()
+            connection_created.disconnect(queries.install)
+        finished_at = timezone.now()
+
+        report = measure(arena, started_at, finished_at, rating_error_before, queries.count)
+        report.update(
+            warriors=options['warriors'],
+            threads=options['threads'],
+            cpu_processes=options['cpu_processes'],
+            seed=options['seed'],
+        )
+        text = json.dumps(report, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(text)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+
+
+def seed_arena(n, rng):
+    """A new arena of `n` warriors, all due for a battle."""
+    # factory-boy is a dev dependency, imported only when benchmarking
+    from ...tests.factories import ArenaFactory, WarriorArenaFactory
+
+    now = timezone.now()
+    arena = ArenaFactory(name=f'benchmark {now:%Y-%m-%d %H:%M:%S}')
+    for i in range(n):
+        words = rng.choices(WORDS, k=rng.randint(5, 60))
+        body = f'{i}: ' + ' '.join(words)
+        WarriorArenaFactory(
+            arena=arena,
+            warrior__body=body[:MAX_WARRIOR_LENGTH],
+            next_battle_schedule=now,
+        )
+    return arena
+
+
+def get_rating_error(arena):
+    return WarriorArena.objects.filter(
+        arena=arena,
+    ).aggregate(
+        error=Sum(Abs('rating_error')),
+    )['error'] or 0.0
+
+
+def measure(arena, started_at, finished_at, rating_error_before, queries):
+    minutes = (finished_at - started_at).total_seconds() / 60
+
+    # a game's goal is achieved once its score is in, so the last progress
+    # of the battle's two game goals is when the battle got its last score
+    battles = DBGame.objects.filter(
+        battle__arena=arena,
+    ).values(
+        'battle_id',
+        'battle__scheduled_at',
+    ).annotate(
+        achieved=Count('id', filter=Q(processed_goal__state=GoalState.ACHIEVED), distinct=True),
+        scored_at=Max('processed_goal__progress__created_at'),
+    ).filter(
+        achieved=2,
+    )
+    battle_latencies = [
+        seconds(row['scored_at'] - row['battle__scheduled_at'])
+        for row in battles
+    ]
+
+    first_games = DBGame.objects.filter(
+        battle__arena=arena,
+        resolved_at__isnull=False,
+    ).values(
+        'warrior_1_id',
+        'warrior_1__created_at',
+    ).annotate(
+        first_resolved_at=Min('resolved_at'),
+    )
+    first_battle_latencies = [
+        seconds(row['first_resolved_at'] - row['warrior_1__created_at'])
+        for row in first_games
+    ]
+
+    rating_error_after = get_rating_error(arena)
+    return {
+        'duration_seconds': seconds(finished_at - started_at),
+        'battles_resolved': len(battle_latencies),
+        'battles_per_minute': len(battle_latencies) / minutes,
+        'battle_latency_p50_seconds': percentile(battle_latencies, 0.5),
+        'battle_latency_p95_seconds': percentile(battle_latencies, 0.95),
+        'warriors_battled': len(first_battle_latencies),
+        'time_to_first_battle_p50_seconds': percentile(first_battle_latencies, 0.5),
+        'time_to_first_battle_p95_seconds': percentile(first_battle_latencies, 0.95),
+        'rating_error_before': rating_error_before,
+        'rating_error_after': rating_error_after,
+        'rating_error_drain_per_minute': (rating_error_before - rating_error_after) / minutes,
+        'queries': queries,
+        'queries_per_battle': queries / len(battle_latencies) if battle_latencies else None,
+    }
+
+
+def seconds(delta):
+    return delta / datetime.timedelta(seconds=1)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile, None for no values."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+class QueryCounter:
+    """Counts queries on every connection opened while it is installed."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def install(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
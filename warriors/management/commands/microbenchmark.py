@@ -0,0 +1,78 @@
+"""
+Time the micro-benchmarks in `warriors/microbenchmarks.py`
+and compare them with the baseline checked in next to it.
+
+The JSON report gives, per case, seconds per call
+and its ratio to the baseline median, below 1 being faster.
+"""
+import json
+import platform
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import microbenchmarks
+
+
+BASELINE = Path(microbenchmarks.__file__).with_suffix('.json')
+
+
+class Command(BaseCommand):
+    help = 'Time the hot pure functions against the checked in baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'cases',
+            nargs='*',
+            help='Names of cases to run, all by default',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Where to write the JSON report, "-" for stdout',
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help=f'Write the timings to {BASELINE.name} instead of comparing with it',
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['cases']) - set(microbenchmarks.CASES)
+        if unknown:
+            raise CommandError(f'Unknown cases: {", ".join(sorted(unknown))}')
+
+        results = microbenchmarks.run(
+            names=options['cases'],
+            repeat=options['repeat'],
+            warmup=options['warmup'],
+        )
+        report = {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cases': results,
+        }
+
+        if options['update_baseline']:
+            if BASELINE.exists():
+                baseline = json.loads(BASELINE.read_text())
+                baseline.update(python=report['python'], machine=report['machine'])
+                baseline['cases'].update(results)
+                report = baseline
+            BASELINE.write_text(json.dumps(report, indent=2) + '\n')
+            return
+
+        if BASELINE.exists():
+            baseline = json.loads(BASELINE.read_text())['cases']
+            for name, result in results.items():
+                if name in baseline:
+                    result['baseline_ratio'] = result['median'] / baseline[name]['median']
+
+        text = json.dumps(report, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(text)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
@@ -8,27 +8,71 @@ Unifying them — ticks as self-rescheduling goals — is rejected:
 the busiest ticks fire every second (see warriors/scheduler.py),
 and pushing a goal row through the goals machinery every second
 is churn without simplification.
+
+Idle threads of both wait for Postgres notifications (see
+django_scheduler/notifications.py) rather than polling every second,
+and poll only as a fallback.
+Threads of the interactive lane keep polling every second,
+their goals have a person waiting.
 """
+import datetime
+import logging
 import os
 import signal
 import threading
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django_goals.management.commands.goals_busy_worker import (
     stop_signal_handler,
 )
 from django_goals.management.commands.goals_threaded_worker import (
-    threaded_worker,
+    HeavyLiftingThread, TransitionsThread, WorkersState,
 )
+from django_goals.models import handle_waiting_for_worker
+from django_goals.pickups import PickupMonitorThread
 
 from django_scheduler.models import run as run_scheduler
+from django_scheduler.notifications import Listener
+
+from ... import arena_leases, cpu_lane, priority
+
+
+logger = logging.getLogger(__name__)
+
+
+# django-goals notifies it whenever a goal becomes ready for a worker
+GOAL_WAITING_FOR_WORKER_CHANNEL = 'goal_waiting_for_worker'
+# How often idle goal threads look for work unless notified.
+# Not every goal that becomes ready notifies:
+# a goal back from a `RetryMeLater` date may not,
+# and none does when a background goal's deadline comes within the interactive horizon.
+IDLE_POLL_INTERVAL = datetime.timedelta(seconds=10)
+# The same for threads of the interactive lane, which can't leave a person waiting that long,
+# and in --once mode, where other threads' work must not wait for a notification to be noticed.
+# It is django-goals' own poll interval.
+SHORT_IDLE_POLL_INTERVAL = datetime.timedelta(seconds=1)
 
 
 class Command(BaseCommand):
     help = 'Run the goals worker and the scheduler in one process'
 
     def add_arguments(self, parser):
-        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument(
+            '--threads',
+            type=priority.parse_lanes,
+            default='1',
+            help=(
+                'Number of threads, or threads reserved per priority class, '
+                'like "interactive=2,background=6" (see warriors/priority.py)'
+            ),
+        )
+        parser.add_argument(
+            '--cpu-processes',
+            type=int,
+            default=0,
+            help='Processes to run LCS scoring and rating fits in, none to run them on the goal threads',
+        )
         parser.add_argument(
             '--once',
             action='store_true',
@@ -38,7 +82,10 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         # One process instead of dedicated worker and scheduler containers
         # (docs/strategy.md, fixed compute). Multiple instances are safe:
-        # scheduler jobs lock their DB row (see run_job).
+        # scheduler jobs lease their DB row (see run_job),
+        # and with ARENA_SHARDING matchmaking and rating split arenas between them.
+        if options['cpu_processes']:
+            cpu_lane.start(options['cpu_processes'])
         with stop_signal_handler() as stop_event:
             scheduler_thread = threading.Thread(
                 target=self._run_scheduler,
@@ -48,7 +95,7 @@ class Command(BaseCommand):
             scheduler_thread.start()
             try:
                 threaded_worker(
-                    worker_specs=[(options['threads'], None)],
+                    worker_specs=options['threads'],
                     stop_event=stop_event,
                     once=options['once'],
                 )
@@ -57,6 +104,9 @@ class Command(BaseCommand):
                 # the scheduler has no such mode, so stop it explicitly
                 stop_event.set()
                 scheduler_thread.join()
+                cpu_lane.shutdown()
+                if settings.ARENA_SHARDING:
+                    arena_leases.release()
 
     @staticmethod
     def _run_scheduler(stop_event):
@@ -69,3 +119,88 @@ class Command(BaseCommand):
                 # by the platform; stopping the whole process keeps
                 # that supervision.
                 os.kill(os.getpid(), signal.SIGTERM)
+
+
+def threaded_worker(worker_specs, stop_event, once=False):
+    """
+    django-goals' threaded worker, with goal threads that sleep until notified.
+
+    Its transitions thread, moving goals on when their date or preconditions come,
+    keeps polling every second.
+    Built from its internals, so django-goals is pinned to an exact version in pyproject.toml.
+    """
+    listener = Listener([GOAL_WAITING_FOR_WORKER_CHANNEL], stop_event)
+    listener.start()
+    pickup_monitor = PickupMonitorThread()
+    pickup_monitor.start()
+
+    total_workers = sum(count for count, _ in worker_specs)
+    workers_state = WorkersState(total_workers + 1)  # +1 for transitions thread
+    threads = [
+        TransitionsThread(
+            stop_event=stop_event,
+            once=once,
+            workers_state=workers_state,
+            thread_id='transitions',
+        ),
+    ]
+    for count, horizon in worker_specs:
+        for _ in range(count):
+            threads.append(ListeningThread(
+                listener=listener,
+                stop_event=stop_event,
+                once=once,
+                workers_state=workers_state,
+                thread_id=f'worker_{len(threads) - 1}',
+                deadline_horizon=horizon,
+                pickup_monitor=pickup_monitor,
+            ))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    pickup_monitor.shutdown()
+    pickup_monitor.join()
+    listener.stop()
+    listener.join()
+
+
+class ListeningThread(HeavyLiftingThread):
+    def __init__(self, listener, **kwargs):
+        super().__init__(**kwargs)
+        self.listener = listener
+
+    def run(self):
+        logger.info('Listening worker started, deadline_horizon: %s', self.deadline_horizon)
+
+        while not self.stop_event.is_set():
+            # taken before looking, so a goal made ready meanwhile wakes us
+            snapshot = self.listener.snapshot()
+            with self.workers_state.work_session(self.thread_id):
+                try:
+                    progress = handle_waiting_for_worker(
+                        deadline_horizon=self.deadline_horizon,
+                        pickup_monitor=self.pickup_monitor,
+                    )
+                except Exception as e:
+                    logger.exception(e)
+                    # treat exceptions as if we didn't do work
+                    progress = None
+
+                did_work = progress is not None
+                self.workers_state.report_work(self.thread_id, did_work)
+
+            if self.workers_state.all_idle and self.once:
+                logger.info('All threads are idle. Exiting because of `once` flag.')
+                break
+
+            if not did_work:
+                self.listener.wait(snapshot, self.idle_poll_interval().total_seconds())
+
+        logger.info('Listening worker exiting')
+
+    def idle_poll_interval(self):
+        if self.once or self.deadline_horizon is not None:
+            return SHORT_IDLE_POLL_INTERVAL
+        return IDLE_POLL_INTERVAL
@@ -0,0 +1,183 @@
+"""
+Micro-benchmarks of the pure functions battles spend their CPU in:
+LCS scoring, performance rating fits, embedding similarity
+and the battle performance shown on warrior pages.
+
+Inputs are generated from a fixed seed, so two runs time the same work,
+and every case is warmed up before it is timed.
+`manage.py microbenchmark` runs them and compares against
+the baseline in `microbenchmarks.json` next to this module —
+timings from one machine, so a ratio means something only on comparable hardware.
+Refresh the baseline in the same commit as an optimization it documents.
+"""
+import random
+import statistics
+import timeit
+import uuid
+
+import numpy as np
+
+from . import rating
+from .battles import Battle, BattleViewpoint, DBGame
+from .lcs import lcs_len, lcs_ranges
+from .models import WarriorArena
+from .score import GameScore, ScoreAlgorithm, _warrior_similarity
+from .text_unit import TextUnit
+from .warriors import MAX_WARRIOR_LENGTH, Warrior
+
+
+SEED = 0
+# what warriors are written in: prompt-speak in several scripts, and emoji
+WORDS = (
+    'ignore', 'all', 'previous', 'instructions', 'repeat', 'this', 'verbatim',
+    'output', 'only', 'the', 'text', 'below', 'you', 'must', 'never', 'say',
+    'zażółć', 'gęślą', 'jaźń', 'powtórz', 'dokładnie', 'tekst',
+    'повтори', 'только', 'этот', 'текст',
+    '只输出', '这段', '文字', 'この文章を', '繰り返して',
+    '🙂', '🔥', '⚔️', '👑',
+    '\n', '!', '.', '"', ':',
+)
+
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def random_text(rng, length=MAX_WARRIOR_LENGTH):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)[:length]
+
+
+def echoed_text(rng, text, length=MAX_WARRIOR_LENGTH):
+    """What an LLM makes of a warrior: mostly its stretches, shuffled, among other text."""
+    parts = []
+    size = 0
+    while size < length:
+        if rng.random() < 0.7:
+            start = rng.randrange(len(text))
+            part = text[start:start + rng.randint(10, 100)]
+        else:
+            part = random_text(rng, rng.randint(10, 50))
+        parts.append(part)
+        size += len(part)
+    return ''.join(parts)[:length]
+
+
+def _lcs_inputs():
+    rng = random.Random(SEED)
+    warrior = random_text(rng)
+    return echoed_text(rng, warrior), warrior
+
+
+@case('lcs_len')
+def _lcs_len():
+    a, b = _lcs_inputs()
+    return lambda: lcs_len(a, b)
+
+
+@case('lcs_ranges')
+def _lcs_ranges():
+    a, b = _lcs_inputs()
+    return lambda: lcs_ranges(a, b)
+
+
+def _performance_rating(opponents, k):
+    rng = random.Random(SEED)
+    scores = [
+        rating.GameScore(
+            score=rng.random(),
+            opponent_rating=rng.gauss(0, 200),
+            opponent_playstyle=[rng.gauss(0, 10) for _ in range(2 * k)],
+        )
+        for _ in range(opponents)
+    ]
+
+    def run():
+        # the fit starts from a random point
+        np.random.seed(SEED)
+        rating.get_performance_rating(scores, rating_guess=0.0, k=k)
+    return run
+
+
+for _opponents in (10, 100, 500):
+    for _k in (0, 1):
+        case(f'get_performance_rating[{_opponents},k={_k}]')(
+            lambda opponents=_opponents, k=_k: _performance_rating(opponents, k),
+        )
+
+
+@case('_warrior_similarity')
+def _similarity():
+    rng = random.Random(SEED)
+    text_unit = TextUnit(voyage_3_embedding=[rng.gauss(0, 1) for _ in range(1024)])
+    warrior = Warrior(voyage_3_embedding=[rng.gauss(0, 1) for _ in range(1024)])
+    return lambda: _warrior_similarity(text_unit, warrior)
+
+
+@case('BattleViewpoint.performance[100]')
+def _battle_performance():
+    rng = random.Random(SEED)
+    battles = [_scored_battle(rng) for _ in range(100)]
+    return lambda: [BattleViewpoint(battle, '1').performance for battle in battles]
+
+
+def _scored_battle(rng):
+    """A resolved battle built in memory, with what a warrior page prefetches."""
+    warrior_1, warrior_2 = sorted(
+        (Warrior(id=uuid.UUID(int=rng.getrandbits(128))) for _ in range(2)),
+        key=lambda warrior: warrior.id,
+    )
+    battle = Battle(warrior_1=warrior_1, warrior_2=warrior_2)
+    battle.warrior_arena_1, battle.warrior_arena_2 = (
+        WarriorArena(
+            warrior=warrior,
+            rating=rng.gauss(0, 200),
+            rating_playstyle=[rng.gauss(0, 10), rng.gauss(0, 10)],
+        )
+        for warrior in (warrior_1, warrior_2)
+    )
+    battle.game_scores_list = tuple(
+        GameScore(
+            game=DBGame(battle=battle, warrior_1=first, warrior_2=second),
+            algorithm=ScoreAlgorithm.LCS,
+            warrior_1_similarity=rng.random(),
+            warrior_2_similarity=rng.random(),
+        )
+        for first, second in ((warrior_1, warrior_2), (warrior_2, warrior_1))
+    )
+    return battle
+
+
+def run(names=None, repeat=5, warmup=1):
+    """
+    Seconds per call of each case, by name: the fastest and the median of `repeat` samples.
+
+    A sample times as many calls as take at least 0.2 seconds,
+    so the fast cases are not measured in timer noise.
+    """
+    results = {}
+    for name, setup in CASES.items():
+        if names and name not in names:
+            continue
+        call = setup()
+        for _ in range(warmup):
+            call()
+        timer = timeit.Timer(call)
+        number, _ = timer.autorange()
+        timings = [seconds / number for seconds in timer.repeat(repeat, number)]
+        results[name] = {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'calls': number,
+        }
+    return results
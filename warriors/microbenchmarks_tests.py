@@ -0,0 +1,27 @@
+import json
+
+from .management.commands.microbenchmark import BASELINE
+from .microbenchmarks import CASES, _battle_performance, _lcs_inputs
+
+
+def test_cases_run():
+    for setup in CASES.values():
+        setup()()
+
+
+def test_lcs_inputs_are_realistic():
+    a, b = _lcs_inputs()
+    assert len(a) == len(b) == 1000
+    assert not a.isascii()
+    assert a != b
+
+
+def test_battle_performance_needs_no_database():
+    performances = _battle_performance()()
+    assert len(performances) == 100
+    assert None not in performances
+
+
+def test_baseline_covers_every_case():
+    baseline = json.loads(BASELINE.read_text())
+    assert set(baseline['cases']) == set(CASES)
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:26
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0061_gamescore_game_not_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMRateLimit',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('llm', models.CharField(max_length=20, unique=True)),
+                ('requests', models.FloatField()),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0062_llmratelimit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arena',
+            name='reuse_results_max_age',
+            field=models.DurationField(blank=True, help_text='Resolve a game by copying a game with identical input resolved this recently, instead of calling the LLM again. Empty disables reuse.', null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:40
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_goals', '0011_goalpickup'),
+        ('warriors', '0063_arena_reuse_results_max_age'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbgame',
+            name='resolve_in_batch',
+            field=models.BooleanField(default=False, help_text='Nobody waits for this game, so it goes through the cheaper provider batch API.'),
+        ),
+        migrations.CreateModel(
+            name='LLMBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('llm', models.CharField(choices=[('openai-gpt', 'OpenAI GPT'), ('claude-3-haiku', 'Anthropic Claude'), ('google-gemini', 'Google Gemini')], max_length=20)),
+                ('provider_batch_id', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_goal', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='django_goals.goal')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='dbgame',
+            name='llm_batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='games', to='warriors.llmbatch'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0064_llm_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbgame',
+            name='cached_input_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dbgame',
+            name='input_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dbgame',
+            name='latency',
+            field=models.FloatField(blank=True, help_text='Seconds the synchronous LLM call took.', null=True),
+        ),
+        migrations.AddField(
+            model_name='dbgame',
+            name='output_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Including reasoning tokens.', null=True),
+        ),
+        migrations.AddField(
+            model_name='dbgame',
+            name='reasoning_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0065_dbgame_usage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbgame',
+            name='max_output_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Output token budget of the LLM call, raised when a call ran out of it.', null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:05
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0066_dbgame_max_output_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCircuit',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('llm', models.CharField(max_length=20, unique=True)),
+                ('state', models.CharField(choices=[('closed', 'Closed'), ('open', 'Open'), ('half_open', 'Half Open')], default='closed', max_length=20)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('window_started_at', models.DateTimeField()),
+                ('retry_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
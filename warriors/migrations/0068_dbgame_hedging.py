@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0067_llmcircuit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbgame',
+            name='hedged',
+            field=models.BooleanField(default=False, help_text='The LLM call was slow and got a duplicate.'),
+        ),
+        migrations.AddField(
+            model_name='dbgame',
+            name='latency_critical',
+            field=models.BooleanField(default=False, help_text="A fresh warrior's player waits for this game, so a slow LLM call gets a duplicate."),
+        ),
+    ]
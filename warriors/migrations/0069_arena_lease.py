@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0068_dbgame_hedging'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='arena',
+            name='lease_owner',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='arena',
+            name='lease_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:38
+
+import django.contrib.postgres.fields
+import pgvector.django.vector
+from django.db import migrations, models
+from pgvector.django import VectorExtension
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0069_arena_lease'),
+    ]
+
+    operations = [
+        VectorExtension(),
+        migrations.AlterModelOptions(
+            name='textunit',
+            options={'base_manager_name': 'objects', 'ordering': ('id',)},
+        ),
+        migrations.AlterModelOptions(
+            name='warrior',
+            options={'base_manager_name': 'objects', 'ordering': ('id',)},
+        ),
+        # A missing embedding was an empty array, a vector can't be empty, so it becomes NULL.
+        migrations.AlterField(
+            model_name='textunit',
+            name='voyage_3_embedding',
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.FloatField(), blank=True, null=True, size=1024,
+            ),
+        ),
+        migrations.AlterField(
+            model_name='warrior',
+            name='voyage_3_embedding',
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.FloatField(), blank=True, null=True, size=1024,
+            ),
+        ),
+        migrations.RunSQL(
+            sql='UPDATE warriors_textunit SET voyage_3_embedding = NULL WHERE cardinality(voyage_3_embedding) = 0',
+            reverse_sql="UPDATE warriors_textunit SET voyage_3_embedding = '{}' WHERE voyage_3_embedding IS NULL",
+        ),
+        migrations.RunSQL(
+            sql='UPDATE warriors_warrior SET voyage_3_embedding = NULL WHERE cardinality(voyage_3_embedding) = 0',
+            reverse_sql="UPDATE warriors_warrior SET voyage_3_embedding = '{}' WHERE voyage_3_embedding IS NULL",
+        ),
+        migrations.AlterField(
+            model_name='textunit',
+            name='voyage_3_embedding',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=1024, null=True),
+        ),
+        migrations.AlterField(
+            model_name='warrior',
+            name='voyage_3_embedding',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=1024, null=True),
+        ),
+    ]
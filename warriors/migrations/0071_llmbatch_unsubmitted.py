@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0070_embedding_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='llmbatch',
+            name='provider_batch_id',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:00
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0071_llmbatch_unsubmitted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMHedgeBudget',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('llm', models.CharField(max_length=20, unique=True)),
+                ('hedges', models.PositiveIntegerField(default=0)),
+                ('window_started_at', models.DateTimeField()),
+            ],
+        ),
+    ]
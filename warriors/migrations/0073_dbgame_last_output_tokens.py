@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0072_llmhedgebudget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbgame',
+            name='last_output_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Output tokens of the call that resolved the game alone, what it needed in the end.', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0073_dbgame_last_output_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dbgame',
+            name='total_latency',
+            field=models.FloatField(blank=True, help_text='Seconds every synchronous LLM call for the game took, failed and retried ones included.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='dbgame',
+            name='latency',
+            field=models.FloatField(blank=True, help_text='Seconds the synchronous LLM call that resolved the game took.', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('warriors', '0074_dbgame_total_latency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='warrior',
+            name='first_result_at',
+            field=models.DateTimeField(blank=True, help_text='When the first game of the warrior resolved, the end of its onboarding.', null=True),
+        ),
+    ]
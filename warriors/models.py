@@ -5,8 +5,15 @@ from django.contrib.sites.models import Site
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from django_scheduler.notifications import notify
 
 from .battles import LLM
+from .llm_batches import LLMBatch
+from .llm_hedging import LLMHedgeBudget
+from .llms.circuit_breaker import LLMCircuit
+from .llms.rate_limit import LLMRateLimit
 from .rating_models import RatingMixin
 from .score import GameScore, ScoreAlgorithm
 from .stats import ArenaStats
@@ -16,10 +23,14 @@ from .warriors import Warrior
 
 __all__ = [
     'ArenaStats', 'Warrior', 'TextUnit',
-    'GameScore',
+    'GameScore', 'LLMBatch', 'LLMCircuit', 'LLMHedgeBudget', 'LLMRateLimit',
 ]
 
 
+# NOTIFY channel of WarriorArenas becoming due for a battle ahead of matchmaking's polling
+WARRIOR_DUE_CHANNEL = 'warrior_arena_due'
+
+
 class Arena(models.Model):
     id = models.UUIDField(
         primary_key=True,
@@ -54,6 +65,25 @@ class Arena(models.Model):
     description = models.TextField(
         blank=True,
     )
+    reuse_results_max_age = models.DurationField(
+        null=True,
+        blank=True,
+        help_text=_(
+            'Resolve a game by copying a game with identical input resolved this recently, '
+            'instead of calling the LLM again. Empty disables reuse.'
+        ),
+    )
+    # the worker instance matchmaking and rating the arena (see arena_leases.py)
+    lease_owner = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+    )
+    lease_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('name',)
@@ -179,6 +209,8 @@ def get_or_create_warrior_arenas(arena, warrior_ids):
         )
     }
     missing_warrior_arenas = warrior_ids - set(warrior_arenas.keys())
+    if not missing_warrior_arenas:
+        return warrior_arenas
     WarriorArena.objects.bulk_create([
         WarriorArena(
             arena=arena,
@@ -186,6 +218,8 @@ def get_or_create_warrior_arenas(arena, warrior_ids):
         )
         for warrior_id in missing_warrior_arenas
     ])
+    # new ones are due right away
+    notify(WARRIOR_DUE_CHANNEL)
     warrior_arenas.update({
         w.warrior_id: w
         for w in WarriorArena.objects.filter(
@@ -0,0 +1,64 @@
+"""
+Onboarding of a new warrior, from its submission to its first battle result.
+
+Time from submission to the first battle result is what keeps a new player
+(see docs/strategy.md), so everything a new warrior needs
+is scheduled at submission, as goals running in parallel where they can:
+
+    submission ─┬─ moderation ─┬─ matchmaking ── battles ── first result
+                │              └─ naming
+                └─ embedding
+
+Battles and naming send the body to LLMs, so they wait for moderation.
+Matchmaking hears of a passed moderation through `WARRIOR_DUE_CHANNEL`,
+naming is a goal with moderation as its precondition,
+so neither waits for the other.
+The embedding is only ever compared with other embeddings,
+and embedding-scored battles wait for it, so it starts right away.
+Everything is interactive (see priority.py), the author is waiting.
+
+Each stage logs how long after the submission it finished.
+"""
+import logging
+
+from django.utils import timezone
+from django_goals.models import schedule
+
+from . import priority
+
+
+logger = logging.getLogger(__name__)
+
+
+MODERATED = 'moderated'
+EMBEDDED = 'embedded'
+NAMED = 'named'
+FIRST_RESULT = 'first result'
+
+
+def start(warrior):
+    from .tasks import do_moderation
+    from .warriors import ensure_name_generated
+
+    deadline = priority.get_deadline(interactive=True)
+    moderation = schedule(
+        do_moderation,
+        args=[str(warrior.id)],
+        deadline=deadline,
+    )
+    schedule(
+        ensure_name_generated,
+        args=[str(warrior.id)],
+        precondition_goals=[moderation],
+        deadline=deadline,
+    )
+    warrior.schedule_voyage_3_embedding(deadline=deadline)
+
+
+def log_stage(warrior, stage, now=None):
+    if now is None:
+        now = timezone.now()
+    logger.info(
+        'Onboarding: warrior %s %s %.1fs after submission',
+        warrior.id, stage, (now - warrior.created_at).total_seconds(),
+    )
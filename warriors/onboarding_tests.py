@@ -0,0 +1,54 @@
+import logging
+
+import pytest
+from django.utils import timezone
+from django_goals.models import Goal, GoalState
+
+from . import onboarding
+from .battles import Game
+from .tasks import _log_first_results, _save_resolution
+
+
+@pytest.mark.django_db
+def test_start(warrior):
+    now = timezone.now()
+
+    onboarding.start(warrior)
+
+    moderation = Goal.objects.get(handler='warriors.tasks.do_moderation')
+    naming = Goal.objects.get(handler='warriors.warriors.ensure_name_generated')
+    # embedding doesn't wait for moderation, naming does
+    assert warrior.voyage_3_embedding_goal.state == GoalState.WAITING_FOR_WORKER
+    assert moderation.state == GoalState.WAITING_FOR_WORKER
+    assert list(naming.precondition_goals.all()) == [moderation]
+    for goal in [moderation, naming, warrior.voyage_3_embedding_goal]:
+        assert goal.instructions is None or goal.instructions['args'] == [str(warrior.id)]
+        assert goal.deadline <= now + onboarding.priority.INTERACTIVE_HORIZON
+
+
+@pytest.mark.django_db
+def test_first_result_is_logged_once(battle, caplog):
+    now = timezone.now()
+
+    with caplog.at_level(logging.INFO, logger='warriors.onboarding'):
+        for direction, warrior_1 in [('1_2', battle.warrior_1), ('2_1', battle.warrior_2)]:
+            game = battle.games.get(warrior_1=warrior_1)
+            _save_resolution(game, now, Game(battle, direction))
+
+    first_results = [r for r in caplog.records if onboarding.FIRST_RESULT in r.getMessage()]
+    assert len(first_results) == 2  # one for each warrior
+
+
+@pytest.mark.django_db
+def test_first_result_is_recorded(battle, django_assert_num_queries):
+    now = timezone.now()
+    game = battle.games.get(warrior_1=battle.warrior_1)
+
+    _save_resolution(game, now, Game(battle, '1_2'))
+
+    for warrior in (battle.warrior_1, battle.warrior_2):
+        warrior.refresh_from_db()
+        assert warrior.first_result_at == now
+    # later games of the warriors don't look for it again
+    with django_assert_num_queries(0):
+        _log_first_results(game, now)
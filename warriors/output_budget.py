@@ -0,0 +1,119 @@
+"""
+Output token budgets for the reasoning LLMs, learned from recent games.
+
+A reasoning model spends part of its output budget thinking,
+and when the thinking eats all of it the game ends with nothing to show —
+the `'error'` finish reason.
+Too generous a budget costs nothing extra per call,
+but it is what the rate limiter charges a call against,
+and it lets a model that got stuck in a loop run on for longer.
+
+So the budget is the smallest one under which few enough recent games
+would have run out of tokens,
+and a game that does run out gets one more call with `RETRY_BUDGET`.
+"""
+import datetime
+import threading
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .battles import LLM, DBGame, llm_version_family
+from .warriors import MAX_WARRIOR_LENGTH
+
+
+# what the connectors ask for when not told otherwise
+DEFAULT_BUDGET = MAX_WARRIOR_LENGTH * 3
+# candidate budgets, smallest first
+BUDGETS = tuple(MAX_WARRIOR_LENGTH * n for n in (1, 2, 3, 4, 6))
+# the budget a game that ran out of tokens is called again with
+RETRY_BUDGET = BUDGETS[-1]
+# share of games allowed to run out of tokens at the chosen budget
+TARGET_ERROR_RATE = 0.02
+# recent games the budget is learned from, and how few are too few to learn from
+SAMPLE_SIZE = 200
+MIN_SAMPLE_SIZE = 50
+
+# how long a learned budget is used before it is learned again
+BUDGET_MAX_AGE = datetime.timedelta(minutes=1)
+
+# LLMs that reason before answering, the others have a fixed budget
+ADAPTIVE_LLMS = (
+    LLM.OPENAI_GPT,
+    LLM.GOOGLE_GEMINI,
+)
+
+
+def choose_output_budget(llm):
+    """
+    The output token budget for the next call to `llm`, None to leave it to the connector.
+
+    Learned from recent games of the model family the LLM currently answers with,
+    so that a new model starts over from the default.
+    A game that ran out of tokens counts as needing more than any budget,
+    a game that finished as needing what it spent.
+    The retry keeps the first kind rare in the sample:
+    a retried game is learned from by what its last call needed,
+    not by the tokens of both calls it was billed for.
+    Each LLM call asks, so a learned budget is reused for `BUDGET_MAX_AGE` in this process.
+    """
+    if llm not in ADAPTIVE_LLMS:
+        return None
+    now = timezone.now()
+    with _budgets_lock:
+        cached = _budgets.get(llm)
+    if cached is not None and now - cached[1] < BUDGET_MAX_AGE:
+        return cached[0]
+    budget = _learn_output_budget(llm)
+    with _budgets_lock:
+        _budgets[llm] = (budget, now)
+    return budget
+
+
+_budgets_lock = threading.Lock()
+_budgets = {}  # llm -> (budget, learned at)
+
+
+def clear_budgets():
+    with _budgets_lock:
+        _budgets.clear()
+
+
+def _learn_output_budget(llm):
+    rows = DBGame.objects.filter(
+        llm=llm,
+        max_output_tokens__isnull=False,
+    ).filter(
+        # games cut off by a hang-up may only have an estimate, without the reasoning, and tell nothing
+        Q(last_output_tokens__isnull=False) | Q(finish_reason='error'),
+    ).order_by(
+        '-scheduled_at',
+    ).values_list(
+        'llm_version', 'finish_reason', 'last_output_tokens',
+    )[:SAMPLE_SIZE]
+    rows = list(rows)
+    if not rows:
+        return DEFAULT_BUDGET
+    current_family = llm_version_family(rows[0][0])
+    needed_tokens = [
+        None if finish_reason == 'error' else output_tokens
+        for llm_version, finish_reason, output_tokens in rows
+        if llm_version_family(llm_version) == current_family
+    ]
+    if len(needed_tokens) < MIN_SAMPLE_SIZE:
+        return DEFAULT_BUDGET
+    for budget in BUDGETS:
+        # a game that needed exactly the budget was cut off at it
+        running_out = sum(1 for tokens in needed_tokens if tokens is None or tokens >= budget)
+        if running_out <= TARGET_ERROR_RATE * len(needed_tokens):
+            return budget
+    return BUDGETS[-1]
+
+
+def should_retry(finish_reason, max_output_tokens):
+    """Whether a call that ended with `finish_reason` deserves another one with `RETRY_BUDGET`."""
+    return (
+        finish_reason == 'error' and
+        max_output_tokens is not None and
+        max_output_tokens < RETRY_BUDGET
+    )
@@ -0,0 +1,99 @@
+import pytest
+
+from .battles import LLM, DBGame
+from .output_budget import (
+    BUDGETS, DEFAULT_BUDGET, MIN_SAMPLE_SIZE, RETRY_BUDGET,
+    choose_output_budget, should_retry,
+)
+from .tests.factories import BattleFactory, WarriorFactory, game_of
+
+
+def create_resolved_games(llm, rows):
+    for llm_version, finish_reason, output_tokens in rows:
+        warrior_1, warrior_2 = sorted(WarriorFactory.create_batch(2), key=lambda w: w.id)
+        game = game_of(BattleFactory.create(llm=llm, warrior_1=warrior_1, warrior_2=warrior_2), '1_2')
+        game.llm_version = llm_version
+        game.finish_reason = finish_reason
+        game.output_tokens = output_tokens
+        game.last_output_tokens = output_tokens
+        game.max_output_tokens = DEFAULT_BUDGET
+        game.save()
+
+
+@pytest.mark.django_db
+def test_choose_output_budget_no_games():
+    assert choose_output_budget(LLM.OPENAI_GPT) == DEFAULT_BUDGET
+
+
+def test_choose_output_budget_not_adaptive():
+    assert choose_output_budget(LLM.CLAUDE_3_HAIKU) is None
+
+
+@pytest.mark.django_db
+def test_choose_output_budget_too_few_games():
+    create_resolved_games(LLM.OPENAI_GPT, [('gpt-5-mini/fp', 'stop', 100)] * (MIN_SAMPLE_SIZE - 1))
+    assert choose_output_budget(LLM.OPENAI_GPT) == DEFAULT_BUDGET
+
+
+@pytest.mark.django_db
+def test_choose_output_budget_smallest():
+    create_resolved_games(LLM.OPENAI_GPT, [('gpt-5-mini/fp', 'stop', 100)] * MIN_SAMPLE_SIZE)
+    assert choose_output_budget(LLM.OPENAI_GPT) == BUDGETS[0]
+
+
+@pytest.mark.django_db
+def test_choose_output_budget_covers_heavy_reasoning():
+    create_resolved_games(
+        LLM.OPENAI_GPT,
+        [('gpt-5-mini/fp', 'stop', 500)] * 40 + [('gpt-5-mini/fp', 'stop', BUDGETS[1] + 500)] * 10,
+    )
+    assert choose_output_budget(LLM.OPENAI_GPT) == BUDGETS[2]
+
+
+@pytest.mark.django_db
+def test_choose_output_budget_errors():
+    create_resolved_games(
+        LLM.GOOGLE_GEMINI,
+        [('gemini-flash/1', 'STOP', 500)] * 40 + [('gemini-flash/1', 'error', 3000)] * 10,
+    )
+    assert choose_output_budget(LLM.GOOGLE_GEMINI) == BUDGETS[-1]
+
+
+@pytest.mark.django_db
+def test_choose_output_budget_retried_games():
+    create_resolved_games(
+        LLM.OPENAI_GPT,
+        [('gpt-5-mini/fp', 'stop', 500)] * 45 + [('gpt-5-mini/fp', 'stop', 1500)] * 5,
+    )
+    # ran out of the first budget, then needed 1500 tokens with the retry one
+    DBGame.objects.filter(last_output_tokens=1500).update(
+        max_output_tokens=RETRY_BUDGET,
+        output_tokens=BUDGETS[0] + 1500,
+    )
+    assert choose_output_budget(LLM.OPENAI_GPT) == BUDGETS[1]
+
+
+@pytest.mark.django_db
+def test_choose_output_budget_new_model_starts_over():
+    create_resolved_games(LLM.OPENAI_GPT, [('gpt-5-mini/fp', 'stop', 100)] * MIN_SAMPLE_SIZE)
+    create_resolved_games(LLM.OPENAI_GPT, [('gpt-6-mini/fp', 'stop', 100)])
+    assert choose_output_budget(LLM.OPENAI_GPT) == DEFAULT_BUDGET
+
+
+@pytest.mark.parametrize('finish_reason, max_output_tokens, expected', [
+    ('error', DEFAULT_BUDGET, True),
+    ('error', RETRY_BUDGET, False),
+    ('error', None, False),
+    ('stop', DEFAULT_BUDGET, False),
+])
+def test_should_retry(finish_reason, max_output_tokens, expected):
+    assert should_retry(finish_reason, max_output_tokens) == expected
+
+
+@pytest.mark.django_db
+def test_choose_output_budget_is_cached(django_assert_num_queries):
+    assert choose_output_budget(LLM.OPENAI_GPT) == DEFAULT_BUDGET
+    create_resolved_games(LLM.OPENAI_GPT, [('gpt-5-mini/fp', 'stop', 100)] * MIN_SAMPLE_SIZE)
+
+    with django_assert_num_queries(0):
+        assert choose_output_budget(LLM.OPENAI_GPT) == DEFAULT_BUDGET
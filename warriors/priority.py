@@ -0,0 +1,71 @@
+"""
+Priority classes of goals, and the worker lanes that serve them.
+
+django-goals pursues goals in deadline order,
+and a worker thread can be limited to goals due within a horizon,
+so a priority class is a deadline.
+Interactive goals, whose result a person is waiting to see —
+a challenge, a new warrior's moderation, a fresh warrior's first battles —
+are due now.
+Background goals keep the default deadline, days away.
+What an interactive goal schedules or waits on inherits its deadline,
+so the scores and embeddings of an interactive battle are interactive too.
+
+`manage.py worker --threads interactive=2,background=6`
+reserves two threads that take only interactive goals,
+so no background backlog can occupy every thread.
+Background threads take any goal, interactive ones first.
+A background goal left waiting for as long as the default deadline
+becomes due and reaches the interactive threads too.
+"""
+import argparse
+import datetime
+
+from django.utils import timezone
+
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+# interactive threads take goals due within this long
+INTERACTIVE_HORIZON = datetime.timedelta(hours=1)
+LANE_HORIZONS = {
+    INTERACTIVE: INTERACTIVE_HORIZON,
+    BACKGROUND: None,
+}
+
+
+def get_deadline(interactive, now=None):
+    """The deadline to schedule a goal with, None for the default."""
+    if not interactive:
+        return None
+    if now is None:
+        now = timezone.now()
+    return now
+
+
+def parse_lanes(value):
+    """
+    Worker thread specs from `--threads`.
+
+    Either a number of threads taking any goal,
+    or comma separated `class=count` pairs.
+    """
+    try:
+        if '=' not in value:
+            return [(_parse_count(value), LANE_HORIZONS[BACKGROUND])]
+        specs = []
+        for lane in value.split(','):
+            name, count = lane.split('=')
+            specs.append((_parse_count(count), LANE_HORIZONS[name.strip()]))
+        return specs
+    except (KeyError, ValueError) as e:
+        raise argparse.ArgumentTypeError(
+            f'Expected a thread count or lanes like "{INTERACTIVE}=2,{BACKGROUND}=6", got "{value}"',
+        ) from e
+
+
+def _parse_count(value):
+    count = int(value)
+    if count <= 0:
+        raise ValueError('Thread count must be positive')
+    return count
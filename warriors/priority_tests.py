@@ -0,0 +1,60 @@
+import argparse
+import datetime
+
+import pytest
+from django.utils import timezone
+from django_goals.models import Goal, handle_waiting_for_worker
+
+from .battles import Battle
+from .priority import INTERACTIVE_HORIZON, parse_lanes
+from .random_matchmaking import create_battle
+
+
+@pytest.mark.parametrize(('value', 'specs'), [
+    ('4', [(4, None)]),
+    ('interactive=2,background=6', [(2, INTERACTIVE_HORIZON), (6, None)]),
+    ('background=1', [(1, None)]),
+])
+def test_parse_lanes(value, specs):
+    assert parse_lanes(value) == specs
+
+
+@pytest.mark.parametrize('value', ['0', 'x', 'urgent=2', 'interactive=', 'interactive=-1'])
+def test_parse_lanes_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_lanes(value)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('interactive', [True, False])
+def test_battle_deadline(warrior_arena, other_warrior_arena, interactive):
+    now = timezone.now()
+
+    battle, game_1_2, game_2_1 = Battle.create_from_warriors(
+        warrior_arena, other_warrior_arena,
+        interactive=interactive,
+    )
+
+    goals = [game_1_2.processed_goal, game_2_1.processed_goal]
+    goals.append(Goal.objects.get(handler='warriors.tasks.transfer_rating', instructions__args=[str(battle.id)]))
+    for goal in goals:
+        assert (goal.deadline < now + datetime.timedelta(minutes=1)) == interactive
+
+
+@pytest.mark.django_db
+def test_interactive_lane_skips_background_goals(warrior_arena, other_warrior_arena):
+    Battle.create_from_warriors(warrior_arena, other_warrior_arena)
+
+    assert handle_waiting_for_worker(deadline_horizon=INTERACTIVE_HORIZON) is None
+    assert Goal.objects.filter(progress__isnull=False).count() == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(('games_played', 'interactive'), [(0, True), (10, False)])
+def test_fresh_warriors_battle_interactively(warrior_arena, other_warrior_arena, games_played, interactive):
+    warrior_arena.games_played = games_played
+    other_warrior_arena.games_played = games_played
+
+    _, game_1_2, _ = create_battle(warrior_arena, other_warrior_arena)
+
+    assert (game_1_2.processed_goal.deadline < timezone.now()) == interactive
@@ -4,11 +4,21 @@ import random
 from django.db import transaction
 from django.utils import timezone
 
+from django_scheduler.models import RunAgain
+
+from . import arena_leases
 from .battles import Battle
-from .models import WarriorArena
+from .llm_batches import should_resolve_in_batch
+from .llm_hedging import is_fast_lane, should_hedge
+from .llms import circuit_breaker
+from .models import Arena, WarriorArena
 
 
 MATCHMAKING_MAX_RATING_DIFF = 100  # rating diff of 100 means expected score is 64%
+# longest matchmaking rests when no warrior is due for a battle
+IDLE_BACKOFF = datetime.timedelta(seconds=10)
+# and shortest, when the due ones are all locked by other passes
+BUSY_BACKOFF = datetime.timedelta(seconds=1)
 
 
 def schedule_battles(n=10, now=None):
@@ -18,24 +28,47 @@ def schedule_battles(n=10, now=None):
 
 @transaction.atomic
 def schedule_battle(now=None):
+    """
+    Give the warrior longest due for a battle its battle.
+
+    Asks to run again right away after creating one, as more may be due,
+    and rests until the next warrior is due while no warrior is,
+    or briefly while every due one is taken by another pass.
+    """
     if now is None:
         now = timezone.now()
-    warrior = WarriorArena.objects.battleworthy().filter(
+    warriors = WarriorArena.objects.battleworthy()
+    if (arena_ids := arena_leases.owned_arena_ids()) is not None:
+        warriors = warriors.filter(arena_id__in=arena_ids)
+    if open_llms := circuit_breaker.open_llms():
+        # a provider outage pauses its arenas, their warriors keep their turn
+        warriors = warriors.exclude(
+            arena_id__in=Arena.objects.filter(llm__in=open_llms).values('id'),
+        )
+    warrior = warriors.filter(
         next_battle_schedule__lte=now,
     ).order_by('next_battle_schedule').select_for_update(
         no_key=True,
         skip_locked=True,
     ).first()
     if warrior is None:
-        return
+        # rest until the next warrior is due, new ones notify WARRIOR_DUE_CHANNEL
+        next_due = warriors.order_by('next_battle_schedule').values_list(
+            'next_battle_schedule',
+            flat=True,
+        ).first()
+        if next_due is None:
+            return RunAgain(after=IDLE_BACKOFF)
+        return RunAgain(after=min(max(next_due - now, BUSY_BACKOFF), IDLE_BACKOFF))
     if (
         not warrior.arena.enabled or
         (opponent := find_opponent(warrior)) is None
     ):
         warrior.next_battle_schedule = now + get_next_battle_delay(warrior) + datetime.timedelta(minutes=1)
         warrior.save(update_fields=['next_battle_schedule'])
-        return
+        return None
     create_battle(warrior, opponent, now=now)
+    return RunAgain()
 
 
 def create_battle(warrior, opponent, now=None):
@@ -46,7 +79,12 @@ def create_battle(warrior, opponent, now=None):
     if now is None:
         now = timezone.now()
 
-    battle, db_game_1_2, db_game_2_1 = Battle.create_from_warriors(warrior, opponent)
+    battle, db_game_1_2, db_game_2_1 = Battle.create_from_warriors(
+        warrior, opponent,
+        resolve_in_batch=should_resolve_in_batch(warrior.arena.llm, warrior, opponent),
+        latency_critical=should_hedge(warrior.arena.llm, warrior, opponent),
+        interactive=is_fast_lane(warrior, opponent),
+    )
 
     # Update warrior1 statistics
     warrior.games_played = Battle.objects.with_warrior_arena(warrior).count()
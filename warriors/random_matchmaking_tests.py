@@ -1,13 +1,17 @@
 import datetime
 
 import pytest
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.utils import timezone
 
+from django_scheduler.models import RunAgain
+
 from .battles import Battle
+from .llms.circuit_breaker import CircuitState, LLMCircuit
 from .models import WarriorArena
 from .random_matchmaking import (
-    create_battle, find_opponents, get_next_battle_delay, schedule_battle,
-    schedule_battles,
+    BUSY_BACKOFF, IDLE_BACKOFF, create_battle, find_opponents,
+    get_next_battle_delay, schedule_battle, schedule_battles,
 )
 from .tests.factories import BattleFactory, WarriorArenaFactory
 
@@ -51,7 +55,8 @@ def test_schedule_battle(arena, warrior_arena, other_warrior_arena):
     assert warrior_arena.next_battle_schedule is not None
     assert other_warrior_arena.next_battle_schedule is not None
 
-    schedule_battle(now=now)
+    # another warrior may be due too
+    assert schedule_battle(now=now) == RunAgain()
 
     battle = Battle.objects.get()
     assert battle.arena == arena
@@ -63,6 +68,30 @@ def test_schedule_battle(arena, warrior_arena, other_warrior_arena):
     assert warrior_arena.next_battle_schedule > now
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize('warrior_arena', [{
+    'next_battle_schedule': datetime.datetime(2022, 1, 1, 0, 0, 0, tzinfo=datetime.timezone.utc),
+}], indirect=True)
+@pytest.mark.parametrize('other_warrior_arena', [{
+    'next_battle_schedule': datetime.datetime(2022, 1, 1, 0, 0, 0, tzinfo=datetime.timezone.utc),
+}], indirect=True)
+def test_schedule_battle_circuit_open(arena, warrior_arena, other_warrior_arena, settings):
+    settings.LLM_CIRCUIT_BREAKER = True
+    now = datetime.datetime(2022, 1, 1, 0, 0, 0, tzinfo=datetime.timezone.utc)
+    LLMCircuit.objects.create(
+        llm=arena.llm,
+        state=CircuitState.OPEN,
+        window_started_at=now,
+    )
+
+    schedule_battle(now=now)
+
+    assert not Battle.objects.exists()
+    # the warrior keeps its turn for when the circuit closes
+    warrior_arena.refresh_from_db()
+    assert warrior_arena.next_battle_schedule == now
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize('warrior_arena', [{
     'next_battle_schedule': datetime.datetime(2022, 1, 1, 0, 0, 0, tzinfo=datetime.timezone.utc),
@@ -78,6 +107,35 @@ def test_schedule_battle_no_warriors(warrior_arena):
     assert warrior_arena.next_battle_schedule > now
 
 
+@pytest.mark.django_db
+def test_schedule_battle_idle_backs_off():
+    assert schedule_battle() == RunAgain(after=IDLE_BACKOFF)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('warrior_arena', [{
+    'next_battle_schedule': datetime.datetime(2022, 1, 1, 0, 0, 3, tzinfo=datetime.timezone.utc),
+}], indirect=True)
+def test_schedule_battle_rests_until_next_due(warrior_arena):
+    now = datetime.datetime(2022, 1, 1, 0, 0, 0, tzinfo=datetime.timezone.utc)
+    assert schedule_battle(now) == RunAgain(after=datetime.timedelta(seconds=3))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_schedule_battle_backs_off_while_due_warriors_are_locked(warrior_arena):
+    other_pass = connections.create_connection(DEFAULT_DB_ALIAS)
+    try:
+        other_pass.ensure_connection()
+        with other_pass.connection.transaction(), other_pass.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT 1 FROM {WarriorArena._meta.db_table} WHERE id = %s FOR UPDATE',
+                [warrior_arena.id],
+            )
+            assert schedule_battle() == RunAgain(after=BUSY_BACKOFF)
+    finally:
+        other_pass.close()
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize('warrior_arena', [{'rating': 0.0}], indirect=True)
 @pytest.mark.parametrize(('other_warrior_arena', 'matched'), [
@@ -132,6 +190,48 @@ def test_create_battle_lots_of_games_played(warrior_arena, battle, other_warrior
     assert other_warrior_arena.games_played == 102
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize('batch_enabled, other_games_played, resolve_in_batch', [
+    (True, 20, True),
+    (True, 2, False),
+    (False, 20, False),
+])
+@pytest.mark.parametrize('warrior_arena', [{'games_played': 20}], indirect=True)
+def test_create_battle_resolve_in_batch(
+    settings, warrior_arena, other_warrior_arena,
+    batch_enabled, other_games_played, resolve_in_batch,
+):
+    settings.LLM_BATCH = {warrior_arena.arena.llm: batch_enabled}
+    other_warrior_arena.games_played = other_games_played
+    other_warrior_arena.save(update_fields=['games_played'])
+
+    battle, db_game_1_2, db_game_2_1 = create_battle(warrior_arena, other_warrior_arena)
+
+    assert db_game_1_2.resolve_in_batch is resolve_in_batch
+    assert db_game_2_1.resolve_in_batch is resolve_in_batch
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('hedges_per_day, other_games_played, latency_critical', [
+    (10, 2, True),
+    (10, 20, False),
+    (0, 2, False),
+])
+@pytest.mark.parametrize('warrior_arena', [{'games_played': 20}], indirect=True)
+def test_create_battle_latency_critical(
+    settings, warrior_arena, other_warrior_arena,
+    hedges_per_day, other_games_played, latency_critical,
+):
+    settings.LLM_HEDGES_PER_DAY = {warrior_arena.arena.llm: hedges_per_day}
+    other_warrior_arena.games_played = other_games_played
+    other_warrior_arena.save(update_fields=['games_played'])
+
+    battle, db_game_1_2, db_game_2_1 = create_battle(warrior_arena, other_warrior_arena)
+
+    assert db_game_1_2.latency_critical is latency_critical
+    assert db_game_2_1.latency_critical is latency_critical
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     ('warrior_arena', 'min_delay_minutes', 'max_delay_minutes'),
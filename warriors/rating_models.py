@@ -1,3 +1,4 @@
+import datetime
 import logging
 import random
 
@@ -7,6 +8,9 @@ from django.db.models import F
 from django.db.models.functions import Abs
 from django.utils import timezone
 
+from django_scheduler.models import RunAgain
+
+from . import cpu_lane
 from .rating import GameScore, get_performance_rating
 
 
@@ -14,6 +18,10 @@ logger = logging.getLogger(__name__)
 M_ELO_K = 1
 MAX_ALLOWED_RATING_PER_GAME = 100
 MAX_OLD_BATTLES = 100
+# ratings are settled when a refit moves one by less than this,
+# and then refitting rests for a while
+SETTLED_RATING_ERROR = 1.0
+SETTLED_BACKOFF = datetime.timedelta(seconds=10)
 
 
 class RatingMixin(models.Model):
@@ -96,7 +104,8 @@ class RatingMixin(models.Model):
         # we limit rating range for warriors with few games played
         max_allowed_rating = MAX_ALLOWED_RATING_PER_GAME * len(scores)
         normalize_playstyle_len(self.rating_playstyle, k)
-        new_rating, new_playstyle, self.rating_fit_loss = get_performance_rating(
+        new_rating, new_playstyle, self.rating_fit_loss = cpu_lane.run(
+            get_performance_rating,
             list(scores.values()),
             rating_guess=self.rating,
             playstyle_guess=self.rating_playstyle,
@@ -155,14 +164,26 @@ def normalize_playstyle_len(playstyle, k=M_ELO_K):
 
 
 def update_rating(n=1, now=None):
+    """
+    Refit the ratings furthest off.
+
+    Asks to run again right away while the fits move ratings noticeably,
+    and backs off once they settle.
+    """
+    from .arena_leases import owned_arena_ids
     from .models import WarriorArena
+    warriors = WarriorArena.objects.all()
+    if (arena_ids := owned_arena_ids()) is not None:
+        warriors = warriors.filter(arena_id__in=arena_ids)
     errors = []
     for _ in range(n):
-        warrior = WarriorArena.objects.order_by(Abs('rating_error').desc()).first()
+        warrior = warriors.order_by(Abs('rating_error').desc()).first()
         if warrior is None:
-            return
+            return RunAgain(after=SETTLED_BACKOFF)
         error = warrior.update_rating()
         errors.append(error)
     max_error = max(abs(e) for e in errors) if errors else 0
     logger.info('Updated ratings. Max error: %s', max_error)
-    return max_error
+    if max_error >= SETTLED_RATING_ERROR:
+        return RunAgain()
+    return RunAgain(after=SETTLED_BACKOFF)
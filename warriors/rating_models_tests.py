@@ -4,8 +4,10 @@ import random
 import pytest
 from django.utils import timezone
 
+from django_scheduler.models import RunAgain
+
 from .models import WarriorArena
-from .rating_models import update_rating
+from .rating_models import SETTLED_BACKOFF, update_rating
 from .tests.factories import (
     ArenaFactory, BattleFactory, WarriorArenaFactory, WarriorFactory,
     batch_create_battles,
@@ -120,7 +122,8 @@ def test_update_rating(warrior_arena, other_warrior_arena, battle):
     assert warrior_arena.rating == 0.0
     assert other_warrior_arena.rating == 0.0
 
-    update_rating(n=2)
+    # the fits moved ratings, more may need refitting
+    assert update_rating(n=2) == RunAgain()
 
     warrior_arena.refresh_from_db()
     other_warrior_arena.refresh_from_db()
@@ -130,6 +133,9 @@ def test_update_rating(warrior_arena, other_warrior_arena, battle):
     assert other_warrior_arena.rating_error == pytest.approx(0.0, abs=0.02)
     assert warrior_arena.rating + other_warrior_arena.rating == pytest.approx(0.0, abs=0.02)
 
+    # ratings settled, refitting rests
+    assert update_rating(n=2) == RunAgain(after=SETTLED_BACKOFF)
+
 
 @pytest.mark.django_db
 def test_update_rating_creates_missing_warrior_arena(arena, warrior_arena, other_warrior, resolved_battle):
@@ -1,14 +1,25 @@
 from datetime import timedelta
 
+from django.conf import settings
+
 from django_scheduler.models import register_job
 
+from .llm_batches import SUBMIT_INTERVAL
+from .models import WARRIOR_DUE_CHANNEL
 from .random_matchmaking import schedule_battle
 from .rating_models import update_rating
 from .stats import create_arena_stats
-from .tasks import schedule_battles_top
+from .tasks import schedule_battles_top, submit_llm_batches
 
 
-register_job(schedule_battle, timedelta(seconds=1))
+# sharded by arena, these run in every instance (see arena_leases.py)
+register_job(
+    schedule_battle,
+    timedelta(seconds=1),
+    wake_on=WARRIOR_DUE_CHANNEL,
+    per_instance=settings.ARENA_SHARDING,
+)
 register_job(schedule_battles_top, timedelta(minutes=10))
-register_job(update_rating, timedelta(seconds=1))
+register_job(update_rating, timedelta(seconds=1), per_instance=settings.ARENA_SHARDING)
 register_job(create_arena_stats, timedelta(hours=1))
+register_job(submit_llm_batches, SUBMIT_INTERVAL)
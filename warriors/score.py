@@ -1,11 +1,17 @@
+import logging
 import uuid
 
-from django.db import models
+import numpy as np
+from django.db import IntegrityError, models, transaction
 from django.utils.translation import gettext_lazy as _
 from django_goals.models import AllDone, RetryMeLater, schedule
 from django_goals.utils import GoalRelatedMixin, is_goal_completed
 
-from .lcs import lcs_len
+from . import cpu_lane
+from .lcs import lcs_similarity
+
+
+logger = logging.getLogger(__name__)
 
 
 class ScoreAlgorithm(models.TextChoices):
@@ -135,24 +141,52 @@ class GameScore(GoalRelatedMixin, models.Model):
 
 def get_or_create_game_score(game, direction, algorithm):
     """
-    The score of one game under one algorithm.
+    The score of one game under one algorithm, computed on the spot when it can be.
+
+    Scoring is CPU work on rows already at hand,
+    so a score gets a goal of its own only when it has to wait,
+    for embeddings that are not there yet.
+    The LCS score never waits, and costs no goal at all.
 
     Keyed on (game, algorithm), the uniqueness the schema guards,
     so a racing second call loses its insert and reads the row instead.
     `battle` and `direction` are written and never looked up;
     they drop once nothing reads them (docs/game-migration.md).
     """
-    game_score, _ = GameScore.objects.get_or_create(
+    game_score = GameScore.objects.filter(game=game, algorithm=algorithm).first()
+    if game_score is not None:
+        return game_score
+    game_score = _new_game_score(game, direction, algorithm)
+    try:
+        with transaction.atomic():
+            result = _ensure_score(game_score, save=False)
+    except Exception:
+        # The caller's transaction holds a paid LLM result,
+        # a failed score mustn't roll it back, it's retried in a goal of its own.
+        logger.exception('Scoring game %s with %s failed', game.id, algorithm)
+        game_score = _new_game_score(game, direction, algorithm)
+        result = RetryMeLater(message='Scoring failed')
+    try:
+        with transaction.atomic():
+            if isinstance(result, RetryMeLater):
+                game_score.processed_goal = schedule(
+                    ensure_score,
+                    precondition_date=result.precondition_date,
+                    precondition_goals=result.precondition_goals,
+                )
+            game_score.save(force_insert=True)
+    except IntegrityError:
+        return GameScore.objects.get(game=game, algorithm=algorithm)
+    return game_score
+
+
+def _new_game_score(game, direction, algorithm):
+    return GameScore(
         game=game,
+        battle_id=game.battle_id,
+        direction=direction,
         algorithm=algorithm,
-        defaults={
-            'battle_id': game.battle_id,
-            'direction': direction,
-            # a callable, so a hit leaves no orphan goal behind
-            'processed_goal': lambda: schedule(ensure_score),
-        },
     )
-    return game_score
 
 
 def ensure_score(goal):
@@ -176,39 +210,54 @@ def _ensure_score(game_score, save=True):
 
 
 def ensure_lcs_score(game_score, game, save=True):
+    warrior_1_similarity, warrior_2_similarity, warriors_similarity = cpu_lane.starmap(lcs_similarity, [
+        (game.warrior_1.body, game.result),
+        (game.warrior_2.body, game.result),
+        (game.warrior_1.body, game.warrior_2.body),
+    ])
     _set_similarity(
         game_score,
-        _lcs_similarity(game.warrior_1.body, game.result),
-        _lcs_similarity(game.warrior_2.body, game.result),
-        warriors_similarity=_lcs_similarity(
-            game.warrior_1.body,
-            game.warrior_2.body,
-        ),
+        warrior_1_similarity,
+        warrior_2_similarity,
+        warriors_similarity=warriors_similarity,
         save=save,
     )
     return AllDone()
 
 
-def _lcs_similarity(warrior, result):
-    if result is None:
-        return None
-    return lcs_len(warrior, result) / max(len(warrior), len(result))
+def ensure_embeddings_score(game_score, game, save=True):
+    from .battles import DBGame
 
+    # The one path that reads embeddings, the manager defers them everywhere else.
+    # select_related bypasses it and loads all three in one query.
+    game = DBGame.objects.select_related(
+        'text_unit',
+        'warrior_1',
+        'warrior_2',
+    ).get(id=game.id)
 
-def ensure_embeddings_score(game_score, game, save=True):
-    if not is_goal_completed(game.text_unit.voyage_3_embedding_goal):
+    if (
+        game.text_unit.voyage_3_embedding is None and
+        not is_goal_completed(game.text_unit.voyage_3_embedding_goal)
+    ):
         return RetryMeLater(
             message='Need to wait for result text embedding',
             precondition_goals=[game.text_unit.voyage_3_embedding_goal],
         )
 
-    if not is_goal_completed(game.warrior_1.voyage_3_embedding_goal):
+    if (
+        game.warrior_1.voyage_3_embedding is None and
+        not is_goal_completed(game.warrior_1.voyage_3_embedding_goal)
+    ):
         return RetryMeLater(
             message='Need to wait for warrior 1 embedding',
             precondition_goals=[game.warrior_1.voyage_3_embedding_goal],
         )
 
-    if not is_goal_completed(game.warrior_2.voyage_3_embedding_goal):
+    if (
+        game.warrior_2.voyage_3_embedding is None and
+        not is_goal_completed(game.warrior_2.voyage_3_embedding_goal)
+    ):
         return RetryMeLater(
             message='Need to wait for warrior 2 embedding',
             precondition_goals=[game.warrior_2.voyage_3_embedding_goal],
@@ -227,14 +276,14 @@ def ensure_embeddings_score(game_score, game, save=True):
 def _warrior_similarity(text_unit, warrior):
     if (
         not text_unit or
-        not text_unit.voyage_3_embedding or
-        not warrior.voyage_3_embedding
+        text_unit.voyage_3_embedding is None or
+        warrior.voyage_3_embedding is None
     ):
         return None
     a = text_unit.voyage_3_embedding
     b = warrior.voyage_3_embedding
     assert len(a) == len(b)
-    return sum(aa * bb for aa, bb in zip(a, b))
+    return float(np.dot(a, b))
 
 
 def _set_similarity(
@@ -1,45 +1,90 @@
 from hashlib import sha256
+from unittest.mock import Mock
 
 import numpy as np
 import pytest
 from django_goals.busy_worker import worker
 from django_goals.models import Goal
 
-from .score import ScoreAlgorithm, get_or_create_game_score
-from .tests.factories import TextUnitFactory, game_of
+from . import cpu_lane, embeddings
+from .score import (
+    GameScore, ScoreAlgorithm, ensure_embeddings_score,
+    get_or_create_game_score,
+)
+from .tests.factories import TextUnitFactory, embedding, game_of
+from .text_unit import TextUnit
 
 
 @pytest.mark.django_db
 def test_second_score_lookup_schedules_no_goal(battle):
     """
     `resolve_battle` asks for the same score on every retry,
-    so the goal in `defaults` has to stay a callable:
-    scheduling one eagerly leaks a goal per call,
-    which nothing downstream notices.
+    so finding the row has to schedule nothing:
+    a leaked goal per call is something nothing downstream notices.
     """
     game = game_of(battle, '1_2')
-    first = get_or_create_game_score(game, '1_2', ScoreAlgorithm.LCS)
+    game.text_unit = TextUnit.get_or_create_by_content('result')
+    game.save(update_fields=['text_unit'])
+    first = get_or_create_game_score(game, '1_2', ScoreAlgorithm.EMBEDDINGS)
+    assert first.is_processing
     goals = Goal.objects.count()
 
-    again = get_or_create_game_score(game, '1_2', ScoreAlgorithm.LCS)
+    again = get_or_create_game_score(game, '1_2', ScoreAlgorithm.EMBEDDINGS)
 
     assert again == first
     assert Goal.objects.count() == goals
 
 
+@pytest.mark.django_db
+def test_failed_scoring_falls_back_to_goal(battle, monkeypatch):
+    game = game_of(battle, '1_2')
+    game.text_unit = TextUnit.get_or_create_by_content('result')
+    game.save(update_fields=['text_unit'])
+    monkeypatch.setattr(cpu_lane, 'starmap', Mock(side_effect=RuntimeError('pool broken')))
+
+    game_score = get_or_create_game_score(game, '1_2', ScoreAlgorithm.LCS)
+
+    assert game_score.is_processing
+    assert game_score.warrior_1_similarity is None
+    game.refresh_from_db()
+    assert game.text_unit is not None
+
+
+@pytest.mark.django_db
+def test_embeddings_score_waits_for_embeddings(battle, monkeypatch):
+    """Only a score that has to wait gets a goal, and it waits on what is missing"""
+    monkeypatch.setattr(embeddings, 'get_embedding', Mock(return_value=embedding(1.0, 0.0)))
+    game = game_of(battle, '1_2')
+    game.text_unit = TextUnit.get_or_create_by_content('result')
+    game.save(update_fields=['text_unit'])
+    for warrior in (battle.warrior_1, battle.warrior_2):
+        warrior.voyage_3_embedding = embedding(1.0, 0.0)
+        warrior.save(update_fields=['voyage_3_embedding'])
+
+    game_score = get_or_create_game_score(game, '1_2', ScoreAlgorithm.EMBEDDINGS)
+
+    assert game_score.is_processing
+    assert list(game_score.processed_goal.precondition_goals.all()) == [
+        game.text_unit.voyage_3_embedding_goal,
+    ]
+
+    worker(once=True)
+
+    game_score.refresh_from_db()
+    assert game_score.is_completed
+    assert game_score.score == 0.5
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize('direction', ['1_2', '2_1'])
 def test_gamescore_embeddings_integration(battle, direction):
     """
-    Test the full integration flow for Embeddings algorithm:
-    1. Create a GameScore
-    2. Process it with django-goals worker
-    3. Verify results match expected embedding calculations
+    With every embedding in place, the score is computed on the spot, without a goal.
     """
     # Set up embeddings for our test
-    result_embedding = [0.7, 0.3, 0.2]  # More similar to warrior_1
-    warrior_1_embedding = [0.8, 0.2, 0.1]
-    warrior_2_embedding = [0.1, 0.3, 0.9]
+    result_embedding = embedding(0.7, 0.3, 0.2)  # More similar to warrior_1
+    warrior_1_embedding = embedding(0.8, 0.2, 0.1)
+    warrior_2_embedding = embedding(0.1, 0.3, 0.9)
 
     # Set up text unit and warrior embeddings
     game = game_of(battle, direction)
@@ -59,16 +104,8 @@ def test_gamescore_embeddings_integration(battle, direction):
         algorithm=ScoreAlgorithm.EMBEDDINGS,
     )
 
-    # Verify initial state - before processing
-    assert game_score.is_processing
-    assert game_score.warrior_1_similarity is None
-    assert game_score.warrior_2_similarity is None
-    assert game_score.warriors_similarity is None
-
-    worker(once=True)
-
-    # Verify final state - after processing
     game_score.refresh_from_db()
+    assert game_score.processed_goal is None
     assert game_score.is_completed
 
     # Verify the similarities were set correctly (with small float tolerance)
@@ -86,6 +123,23 @@ def test_gamescore_embeddings_integration(battle, direction):
     assert game_score.score_rev == 0.0
 
 
+@pytest.mark.django_db
+def test_embeddings_score_loads_embeddings_in_one_query(battle, django_assert_num_queries):
+    game = game_of(battle, '1_2')
+    game.text_unit = TextUnitFactory(voyage_3_embedding=embedding(1.0))
+    game.save(update_fields=['text_unit'])
+    for warrior in (battle.warrior_1, battle.warrior_2):
+        warrior.voyage_3_embedding = embedding(1.0)
+        warrior.save(update_fields=['voyage_3_embedding'])
+    game = game_of(battle, '1_2')
+    game_score = GameScore(game=game, algorithm=ScoreAlgorithm.EMBEDDINGS)
+
+    with django_assert_num_queries(1):
+        ensure_embeddings_score(game_score, game, save=False)
+
+    assert game_score.warrior_1_similarity == 1.0
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize('direction', ['1_2', '2_1'])
 def test_gamescore_lcs(battle, direction):
@@ -107,23 +161,15 @@ def test_gamescore_lcs(battle, direction):
     battle.warrior_2.body_sha_256 = sha256(battle.warrior_2.body.encode()).digest()
     battle.warrior_2.save(update_fields=['body', 'body_sha_256'])
 
-    # Create a game score with LCS algorithm
+    # Create a game score with LCS algorithm, computed right away
     game_score = get_or_create_game_score(
         game=game,
         direction=direction,
         algorithm=ScoreAlgorithm.LCS,
     )
 
-    # Verify initial state - before processing
-    assert game_score.is_processing
-    assert game_score.warrior_1_similarity is None
-    assert game_score.warrior_2_similarity is None
-    assert game_score.warriors_similarity is None
-
-    worker(once=True)
-
-    # Verify final state - after processing
     game_score.refresh_from_db()
+    assert game_score.processed_goal is None
     assert game_score.is_completed
 
     # Verify the similarities were set correctly
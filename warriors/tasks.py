@@ -1,56 +1,130 @@
 import datetime
 import logging
 import random
+import threading
+import time
 from hashlib import sha256
 
+import openai
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
-from django_goals.models import AllDone, RetryMeLater, schedule
+from django_goals.models import WAITING_STATES, AllDone, RetryMeLater, schedule
 
-from .battles import LLM, MATCHMAKING_COOLDOWN, Battle, Game, mirror_to_battle
-from .llms import anthropic
-from .llms.exceptions import TransientLLMError
+from django_scheduler.notifications import notify
+
+from . import llm_batches, llm_hedging, onboarding, output_budget
+from .battles import (
+    LLM, MATCHMAKING_COOLDOWN, Battle, DBGame, Game, llm_version_family,
+    mirror_to_battle,
+)
+from .llms import anthropic, circuit_breaker, fake, rate_limit
+from .llms.exceptions import RateLimitError, TransientLLMError
 from .llms.google import resolve_battle_google
 from .llms.openai import openai_client, resolve_battle_openai
-from .models import Arena, WarriorArena, get_or_create_warrior_arenas
+from .models import (
+    WARRIOR_DUE_CHANNEL, Arena, WarriorArena, get_or_create_warrior_arenas,
+)
 from .random_matchmaking import create_battle
 from .score import ScoreAlgorithm, get_or_create_game_score
 from .text_unit import TextUnit
-from .warriors import MAX_WARRIOR_LENGTH, Warrior, ensure_name_generated
+from .warriors import MAX_WARRIOR_LENGTH, Warrior
 
 
 logger = logging.getLogger(__name__)
 
 
+# the most warriors moderated in one call
+MODERATION_BATCH_SIZE = 32
+# how soon a goal whose warrior is being moderated in another goal's batch checks back
+MODERATION_LOCKED_RETRY = datetime.timedelta(seconds=1)
+
+
 def do_moderation(goal, warrior_id):
+    """
+    Moderate the warrior, together with others waiting for their moderation.
+
+    During a rush of submissions warriors pile up while a moderation call is out,
+    and the next goal to run takes them all in one call.
+    Nobody waits for a batch to fill, a lone warrior goes alone.
+    The goals of the warriors taken along find them moderated and are done.
+    """
     now = timezone.now()
-    warrior = Warrior.objects.get(id=warrior_id)
-    assert warrior.moderation_date is None
+    warrior = Warrior.objects.filter(id=warrior_id).select_for_update(
+        no_key=True,
+        skip_locked=True,
+    ).first()
+    if warrior is None:
+        # a batch that took this warrior along holds its row until it's moderated,
+        # waiting on the lock would idle a worker thread for the whole call
+        return RetryMeLater(
+            precondition_date=now + MODERATION_LOCKED_RETRY,
+            message='Being moderated in another batch',
+        )
+    if warrior.moderation_date is not None:
+        return AllDone()
+    batch = [warrior] + list(Warrior.objects.filter(
+        moderation_passed=None,
+        moderation_date=None,
+    ).exclude(
+        id=warrior.id,
+    ).order_by('created_at').select_for_update(
+        no_key=True,
+        skip_locked=True,
+    )[:MODERATION_BATCH_SIZE - 1])
+    try:
+        flagged, moderation_model = _moderate([_moderation_text(w) for w in batch])
+    except openai.OpenAIError:
+        if len(batch) == 1:
+            raise
+        # one bad input fails the whole call, the others' own goals try them alone
+        logger.warning('Moderating %s warriors together failed, moderating %s alone', len(batch), warrior.id)
+        batch = [warrior]
+        flagged, moderation_model = _moderate([_moderation_text(warrior)])
+
+    for w, w_flagged in zip(batch, flagged, strict=True):
+        w.moderation_passed = not w_flagged
+        w.moderation_model = moderation_model
+        w.moderation_date = now
+        w.save(update_fields=[
+            'moderation_passed',
+            'moderation_model',
+            'moderation_date',
+        ])
+        onboarding.log_stage(w, onboarding.MODERATED, now)
+    if len(batch) > 1:
+        logger.info('Moderated %s warriors in one call', len(batch))
+    if not all(flagged):
+        # their first battles needn't wait for matchmaking's next look
+        notify(WARRIOR_DUE_CHANNEL)
+    return AllDone()
+
+
+def _moderation_text(warrior):
+    return '\n'.join([
+        warrior.name,
+        warrior.author_name,
+        warrior.body,
+    ])
+
+
+def _moderate(texts):
+    """Whether each of the texts is flagged, and by what model."""
+    if settings.FAKE_BACKENDS:
+        return fake.moderate(texts)
     moderation_results = openai_client.moderations.create(
         model="omni-moderation-latest",
-        input='\n'.join([
-            warrior.name,
-            warrior.author_name,
-            warrior.body,
-        ]),
+        input=texts,
     )
-    (result,) = moderation_results.results
-    warrior.moderation_passed = not result.flagged
-    warrior.moderation_model = moderation_results.model
-    warrior.moderation_date = now
-    warrior.save(update_fields=[
-        'moderation_passed',
-        'moderation_model',
-        'moderation_date',
-    ])
-    schedule(ensure_name_generated, args=[str(warrior_id)])
-    warrior.schedule_voyage_3_embedding()
-    return AllDone()
+    return [result.flagged for result in moderation_results.results], moderation_results.model
 
 
 def schedule_battles_top(now=None):
     for arena in Arena.objects.filter(
         enabled=True,
+    ).exclude(
+        llm__in=circuit_breaker.open_llms(),
     ):
         schedule_battle_top_arena(arena.id)
 
@@ -119,6 +193,9 @@ def resolve_battle(goal, battle_id, direction):
     game = battle.games.select_related(
         'warrior_1',
         'warrior_2',
+    ).defer(
+        'warrior_1__voyage_3_embedding',
+        'warrior_2__voyage_3_embedding',
     ).get(warrior_1_id=battle_mirror.warrior_1_id)
     assert game.llm == battle.llm
     assert game.warrior_2_id == battle_mirror.warrior_2_id
@@ -128,10 +205,9 @@ def resolve_battle(goal, battle_id, direction):
         r = _run_llm(game, now, battle_mirror)
         if isinstance(r, RetryMeLater):
             return r
-        else:
-            assert r is None
-            assert game.resolved_at is not None
-            return RetryMeLater(message='Ran LLM')
+        assert r is None
+        assert game.resolved_at is not None
+        # and scored in the same pass, with the game rows at hand
 
     score_lcs = get_or_create_game_score(game, direction, ScoreAlgorithm.LCS)
     score_embedings = get_or_create_game_score(game, direction, ScoreAlgorithm.EMBEDDINGS)
@@ -155,30 +231,109 @@ RESOLUTION_FIELDS = (
     'llm_version',
     'resolved_at',
 )
+TOKEN_FIELDS = (
+    'input_tokens',
+    'cached_input_tokens',
+    'output_tokens',
+    'reasoning_tokens',
+)
+# written with the resolution, but only to the game row
+USAGE_FIELDS = (
+    'max_output_tokens',
+    'hedged',
+    *TOKEN_FIELDS,
+    'last_output_tokens',
+    'latency',
+    'total_latency',
+)
+
+
+# how often a game waiting on an identical one in flight checks back
+IDENTICAL_GAME_POLL_INTERVAL = datetime.timedelta(minutes=1)
 
 
 def _run_llm(game, now, battle_mirror):
+    game.input_sha256 = _input_sha256(game)
+
+    arena = game.battle.arena
+    if arena is not None and arena.reuse_results_max_age is not None:
+        if _identical_game_in_flight(game):
+            return RetryMeLater(
+                precondition_date=now + IDENTICAL_GAME_POLL_INTERVAL,
+                message='Waiting for an identical game in flight',
+            )
+        reusable_game = _find_reusable_game(game, now - arena.reuse_results_max_age)
+        if reusable_game is not None:
+            logger.info('Game %s reuses the result of identical game %s', game.id, reusable_game.id)
+            game.text_unit = reusable_game.text_unit
+            game.finish_reason = reusable_game.finish_reason
+            game.llm_version = reusable_game.llm_version
+            _save_resolution(game, now, battle_mirror)
+            return None
+
+    if game.resolve_in_batch:
+        if game.llm_batch is None:
+            return RetryMeLater(
+                precondition_date=now + llm_batches.SUBMIT_INTERVAL,
+                message='Waiting to be submitted in a batch',
+            )
+        if game.llm_batch.completed_at is None:
+            return RetryMeLater(
+                precondition_goals=[game.llm_batch.processed_goal],
+                message='Waiting for the batch to complete',
+            )
+        # the batch came back without this game, so the synchronous call it is
+
     resolve_battle_function = {
         LLM.OPENAI_GPT: resolve_battle_openai,
         LLM.CLAUDE_3_HAIKU: anthropic.resolve_battle,
         LLM.GOOGLE_GEMINI: resolve_battle_google,
     }[game.llm]
+    if settings.FAKE_BACKENDS:
+        resolve_battle_function = fake.resolve_battle
+
+    # set ahead of the call only when the game is to be retried with a raised budget,
+    # or was submitted in a batch with it
+    max_output_tokens = game.max_output_tokens or output_budget.choose_output_budget(game.llm)
+
+    # waiting out an outage is not an attempt either, the call was never made
+    wait = circuit_breaker.check(game.llm)
+    if wait is not None:
+        return RetryMeLater(
+            precondition_date=now + wait,
+            message='Waiting for the LLM circuit to close',
+        )
+
+    # waiting for capacity is not an attempt, the call was never made
+    estimated_tokens = rate_limit.estimate_tokens(game.warrior_1.body + game.warrior_2.body, max_output_tokens)
+    wait = rate_limit.acquire(game.llm, estimated_tokens)
+    if wait is not None:
+        return RetryMeLater(
+            precondition_date=now + wait,
+            message='Waiting for LLM rate limit capacity',
+        )
 
+    started = time.monotonic()
     try:
         (
             result,
             finish_reason,
             llm_version,
-        ) = resolve_battle_function(
-            game.warrior_1.body,
-            game.warrior_2.body,
-        )
-
-    except TransientLLMError:
+            usage,
+        ) = _call_llm(game, now, resolve_battle_function, max_output_tokens, estimated_tokens)
+
+    except TransientLLMError as e:
+        rate_limited = isinstance(e, RateLimitError)
+        latency = time.monotonic() - started
+        rate_limit.call_stats.record(game.llm, latency, rate_limited=rate_limited)
+        circuit_breaker.record(game.llm, failed=not rate_limited)
+        if rate_limited:
+            rate_limit.drain(game.llm)
         logger.exception('Transient LLM error, battle %s game %s', game.battle_id, game.id)
         attempts = game.attempts
         game.attempts += 1
-        game.save(update_fields=['attempts'])
+        _add_latency(game, latency)
+        game.save(update_fields=['attempts', 'total_latency'])
         mirror_to_battle(game, battle_mirror, ('attempts',))
 
         if attempts < 6:
@@ -193,20 +348,352 @@ def _run_llm(game, now, battle_mirror):
             result = ''
             finish_reason = 'error'
             llm_version = ''
+            usage = None
+            # no call went through, so none resolved the game, and no budget was tried
+            latency = None
+            max_output_tokens = None
+
+    else:
+        latency = time.monotonic() - started
+        rate_limit.call_stats.record(game.llm, latency, usage=usage)
+        circuit_breaker.record(game.llm, failed=False)
+        if output_budget.should_retry(finish_reason, max_output_tokens):
+            _raise_output_budget(game, max_output_tokens, usage, latency)
+            return RetryMeLater(
+                precondition_date=now,
+                message=f'Ran out of {max_output_tokens} output tokens',
+            )
 
-    game.input_sha256 = sha256(
-        (game.warrior_1.body + game.warrior_2.body).encode('utf-8')
-    ).digest()
-    game.text_unit = TextUnit.get_or_create_by_content(result[:MAX_WARRIOR_LENGTH], now=now)
+    game.max_output_tokens = max_output_tokens
+    _store_result(game, now, battle_mirror, result, finish_reason, llm_version, usage, latency)
+
+
+def _call_llm(game, now, resolve_battle_function, max_output_tokens, estimated_tokens):
+    def call(cancel=None):
+        return resolve_battle_function(
+            game.warrior_1.body,
+            game.warrior_2.body,
+            max_output_tokens=max_output_tokens,
+            cancel=cancel,
+        )
+
+    hedge_delay = None
+    if game.latency_critical and llm_hedging.has_hedge_budget(game.llm, now):
+        hedge_delay = llm_hedging.get_hedge_delay(game.llm)
+    if hedge_delay is None:
+        return call()
+
+    def may_hedge():
+        # the duplicate is a call like any other, it doesn't jump the queue
+        return (
+            rate_limit.acquire(game.llm, estimated_tokens) is None and
+            llm_hedging.take_hedge(game.llm)
+        )
+
+    call_result, game.hedged = llm_hedging.call_hedged(call, hedge_delay, may_hedge)
+    return call_result
+
+
+def _raise_output_budget(game, max_output_tokens, usage, latency=None):
+    logger.info(
+        'Game %s ran out of %s output tokens, retrying with %s',
+        game.id, max_output_tokens, output_budget.RETRY_BUDGET,
+    )
+    game.max_output_tokens = output_budget.RETRY_BUDGET
+    # the call that ran out is billed and timed all the same
+    _add_usage(game, usage)
+    _add_latency(game, latency)
+    game.save(update_fields=['max_output_tokens', *TOKEN_FIELDS, 'total_latency'])
+
+
+def _add_usage(game, usage):
+    if usage is None:
+        return
+    for field in TOKEN_FIELDS:
+        setattr(game, field, (getattr(game, field) or 0) + getattr(usage, field))
+
+
+def _add_latency(game, latency):
+    if latency is None:
+        return
+    game.total_latency = (game.total_latency or 0) + latency
+
+
+def _store_result(game, now, battle_mirror, result, finish_reason, llm_version, usage, latency=None, text_unit=None):
+    if text_unit is None:
+        text_unit = TextUnit.get_or_create_by_content(result[:MAX_WARRIOR_LENGTH], now=now)
+    game.text_unit = text_unit
     game.finish_reason = finish_reason
     # but the API finish reason doesn't matter if we cut the response
     if len(result) > MAX_WARRIOR_LENGTH:
         game.finish_reason = 'character_limit'
     game.llm_version = llm_version
+    _add_usage(game, usage)
+    # an estimate misses the reasoning, and would tell the budget learner the game needed little
+    game.last_output_tokens = usage.output_tokens if usage is not None and not usage.estimated else None
+    game.latency = latency
+    _add_latency(game, latency)
+    _save_resolution(game, now, battle_mirror, USAGE_FIELDS)
+
+
+def _input_sha256(game):
+    return sha256(
+        (game.warrior_1.body + game.warrior_2.body).encode('utf-8')
+    ).digest()
+
 
+def _save_resolution(game, now, battle_mirror, extra_fields=()):
     game.resolved_at = now
-    game.save(update_fields=RESOLUTION_FIELDS)
+    game.save(update_fields=RESOLUTION_FIELDS + extra_fields)
     mirror_to_battle(game, battle_mirror, RESOLUTION_FIELDS)
+    _log_first_results(game, now)
+
+
+# warriors older than this are past their first result, and aren't checked for it
+FIRST_RESULT_CHECK_AGE = datetime.timedelta(days=1)
+
+
+def _log_first_results(game, now):
+    for warrior in (game.warrior_1, game.warrior_2):
+        # the warriors are loaded already, so most games are past this without a query
+        if warrior.first_result_at is not None or now - warrior.created_at > FIRST_RESULT_CHECK_AGE:
+            continue
+        # conditional, so that of concurrently resolving games only one logs it
+        if Warrior.objects.filter(id=warrior.id, first_result_at=None).update(first_result_at=now):
+            warrior.first_result_at = now
+            onboarding.log_stage(warrior, onboarding.FIRST_RESULT, now)
+
+
+def _identical_games(game):
+    """
+    Other games of the same LLM on the same input.
+
+    The input is the two bodies in prompt order,
+    and a body belongs to exactly one warrior,
+    so the ordered warrior pair names the input as well as `input_sha256` does —
+    and unlike the sha, it is there before the game resolves
+    and is covered by the warrior foreign key index.
+    """
+    return DBGame.objects.filter(
+        llm=game.llm,
+        warrior_1_id=game.warrior_1_id,
+        warrior_2_id=game.warrior_2_id,
+    ).exclude(
+        id=game.id,
+    )
+
+
+def _identical_game_in_flight(game):
+    """
+    Whether an identical game is still to resolve and will do so on its own.
+
+    Of a set of identical games only the one scheduled first calls the LLM
+    (ties broken by id), the rest wait and reuse its result.
+    A game whose goal has failed is not waited for.
+    """
+    return _identical_games(game).filter(
+        Q(scheduled_at__lt=game.scheduled_at) |
+        Q(scheduled_at=game.scheduled_at, id__lt=game.id),
+        resolved_at=None,
+        processed_goal__state__in=WAITING_STATES,
+    ).exists()
+
+
+def _find_reusable_game(game, resolved_after):
+    """
+    The most recent identical game resolved after `resolved_after`.
+
+    Only a result from the model family the LLM currently answers with
+    is reused, as seen in its latest resolved game.
+    Errors are never reused, they are what a new call might fix.
+    """
+    candidates = list(_identical_games(game).filter(
+        input_sha256=game.input_sha256,
+        resolved_at__gte=resolved_after,
+        text_unit__isnull=False,
+    ).exclude(
+        finish_reason='error',
+    ).select_related('text_unit').defer('text_unit__voyage_3_embedding').order_by('-resolved_at'))
+    if not candidates:
+        return None
+    latest_llm_version = _get_latest_llm_version(game.llm)
+    if latest_llm_version is None:
+        return None
+    for candidate in candidates:
+        if llm_version_family(candidate.llm_version) == llm_version_family(latest_llm_version):
+            return candidate
+    return None
+
+
+# how long the latest llm_version seen is trusted, a model change shows up this late
+LATEST_LLM_VERSION_MAX_AGE = datetime.timedelta(minutes=1)
+_latest_llm_versions_lock = threading.Lock()
+_latest_llm_versions = {}  # llm -> (llm_version, looked up at)
+
+
+def _get_latest_llm_version(llm):
+    now = timezone.now()
+    with _latest_llm_versions_lock:
+        cached = _latest_llm_versions.get(llm)
+    if cached is not None and now - cached[1] < LATEST_LLM_VERSION_MAX_AGE:
+        return cached[0]
+    latest_llm_version = DBGame.objects.filter(
+        llm=llm,
+    ).exclude(
+        llm_version='',
+    ).order_by('-scheduled_at').values_list('llm_version', flat=True).first()
+    with _latest_llm_versions_lock:
+        _latest_llm_versions[llm] = (latest_llm_version, now)
+    return latest_llm_version
+
+
+def clear_latest_llm_versions():
+    with _latest_llm_versions_lock:
+        _latest_llm_versions.clear()
+
+
+def submit_llm_batches(now=None):
+    """
+    Collect the games waiting for a batch and submit them, one batch per LLM.
+    """
+    if now is None:
+        now = timezone.now()
+    for llm in LLM:
+        if llm_batches.is_batch_enabled(llm):
+            _submit_llm_batch(llm, now)
+
+
+def _submit_llm_batch(llm, now):
+    """
+    Claim the waiting games in a batch row, then upload them.
+
+    The upload happens outside any transaction,
+    so no game row stays locked through it
+    and a failed commit can't lose a batch the provider already bills.
+    """
+    llm_batch, games = _claim_llm_batch(llm, now)
+    if llm_batch is None:
+        return None
+    try:
+        provider_batch_id = llm_batches.submit_battle_batch(llm, {
+            str(game.id): game.warrior_1.body + game.warrior_2.body
+            for game in games
+        }, games[0].max_output_tokens)
+    except Exception:
+        _release_llm_batch(llm_batch, now)
+        raise
+    llm_batch.provider_batch_id = provider_batch_id
+    llm_batch.save(update_fields=['provider_batch_id'])
+    logger.info('Submitted %s games of %s in batch %s', len(games), llm, provider_batch_id)
+    return llm_batch
+
+
+@transaction.atomic
+def _claim_llm_batch(llm, now):
+    games = list(DBGame.objects.filter(
+        llm=llm,
+        resolve_in_batch=True,
+        llm_batch=None,
+        resolved_at=None,
+    ).select_related(
+        'warrior_1',
+        'warrior_2',
+    ).defer(
+        'warrior_1__voyage_3_embedding',
+        'warrior_2__voyage_3_embedding',
+    ).order_by('scheduled_at').select_for_update(
+        of=('self',),
+        no_key=True,
+        skip_locked=True,
+    )[:llm_batches.MAX_BATCH_SIZE])
+    if not games:
+        return None, []
+    max_output_tokens = output_budget.choose_output_budget(llm)
+    llm_batch = llm_batches.LLMBatch.objects.create(
+        llm=llm,
+        created_at=now,
+        processed_goal=schedule(
+            poll_llm_batch,
+            precondition_date=now + llm_batches.POLL_INTERVAL,
+        ),
+    )
+    DBGame.objects.filter(
+        id__in=[game.id for game in games],
+    ).update(
+        llm_batch=llm_batch,
+        max_output_tokens=max_output_tokens,
+    )
+    for game in games:
+        game.max_output_tokens = max_output_tokens
+    return llm_batch, games
+
+
+def _release_llm_batch(llm_batch, now):
+    """Give the games of a batch that never reached the provider back to the next one."""
+    logger.warning('Batch %s never reached the provider, releasing its games', llm_batch.id)
+    with transaction.atomic():
+        llm_batch.games.filter(resolved_at=None).update(llm_batch=None)
+        llm_batch.completed_at = now
+        llm_batch.save(update_fields=['completed_at'])
+
+
+def poll_llm_batch(goal):
+    now = timezone.now()
+    llm_batch = llm_batches.LLMBatch.objects.get(processed_goal=goal)
+    if not llm_batch.provider_batch_id:
+        if now - llm_batch.created_at < llm_batches.SUBMIT_TIMEOUT:
+            return RetryMeLater(
+                precondition_date=now + llm_batches.POLL_INTERVAL,
+                message='Batch still being submitted',
+            )
+        # whoever submitted it died on the way
+        _release_llm_batch(llm_batch, now)
+        return AllDone()
+    try:
+        results = llm_batches.get_battle_batch_results(llm_batch.llm, llm_batch.provider_batch_id)
+    except TransientLLMError:
+        logger.exception('Transient LLM error, polling batch %s', llm_batch.id)
+        results = None
+    if results is None:
+        return RetryMeLater(
+            precondition_date=now + llm_batches.POLL_INTERVAL,
+            message='Batch still in progress',
+        )
+
+    games = []
+    for game in llm_batch.games.filter(
+        resolved_at=None,
+    ).select_related(
+        'battle',
+        'warrior_1',
+        'warrior_2',
+    ).defer(
+        'warrior_1__voyage_3_embedding',
+        'warrior_2__voyage_3_embedding',
+    ):
+        if str(game.id) not in results:
+            # the game goal falls back to a synchronous call
+            logger.warning('Game %s missing from batch %s', game.id, llm_batch.id)
+            continue
+        _, finish_reason, _, usage = results[str(game.id)]
+        if output_budget.should_retry(finish_reason, game.max_output_tokens):
+            # and so does a game that ran out of tokens, with more of them
+            _raise_output_budget(game, game.max_output_tokens, usage)
+            continue
+        games.append(game)
+
+    text_units = TextUnit.bulk_get_or_create_by_content(
+        [results[str(game.id)][0][:MAX_WARRIOR_LENGTH] for game in games],
+        now=now,
+    )
+    for game, text_unit in zip(games, text_units):
+        game.input_sha256 = _input_sha256(game)
+        direction = '1_2' if game.warrior_1_id == game.battle.warrior_1_id else '2_1'
+        _store_result(game, now, Game(game.battle, direction), *results[str(game.id)], text_unit=text_unit)
+
+    llm_batch.completed_at = now
+    llm_batch.save(update_fields=['completed_at'])
+    return AllDone()
 
 
 def transfer_rating(goal, battle_id):
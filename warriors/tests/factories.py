@@ -1,11 +1,16 @@
 import hashlib
+import json
 
 import factory
+import httpx
+import openai
 from django.utils import timezone
+from openai.types.chat import ChatCompletionChunk
 
 from users.tests.factories import UserFactory
 
 from ..battles import Battle, DBGame, mirrored_game_fields
+from ..llms.openai import openai_client
 from ..models import LLM, Arena, WarriorArena, WarriorUserPermission
 from ..score import GameScore
 from ..text_unit import TextUnit
@@ -121,3 +126,61 @@ class GameScoreFactory(factory.django.DjangoModelFactory):
     # what get_or_create_game_score writes: the pair and the game row it
     # names, so a test row is shaped like a production one
     game = factory.LazyAttribute(lambda score: game_of(score.battle, score.direction))
+
+
+def chat_completion_sse(
+    content, finish_reason='stop',
+    model='gpt-5-mini-2025-08-07', system_fingerprint=None,
+    chunk_size=100, usage=None,
+):
+    """
+    The event stream of a streamed chat completion, `chunk_size` characters per chunk.
+
+    With `usage`, it ends with the extra chunk `include_usage` asks for.
+    """
+    pieces = [{'content': content[i:i + chunk_size]} for i in range(0, len(content), chunk_size)]
+    deltas = [{'role': 'assistant', 'content': ''}] + pieces
+    chunks = [
+        {
+            'id': 'chatcmpl-1',
+            'object': 'chat.completion.chunk',
+            'created': 1785345620,
+            'model': model,
+            'system_fingerprint': system_fingerprint,
+            'choices': [{
+                'index': 0,
+                'delta': delta,
+                'finish_reason': finish_reason if i == len(deltas) - 1 else None,
+            }],
+        }
+        for i, delta in enumerate(deltas)
+    ]
+    if usage is not None:
+        chunks.append({
+            'id': 'chatcmpl-1',
+            'object': 'chat.completion.chunk',
+            'created': 1785345620,
+            'model': model,
+            'system_fingerprint': system_fingerprint,
+            'choices': [],
+            'usage': usage,
+        })
+    return ''.join(f'data: {json.dumps(chunk)}\n\n' for chunk in chunks) + 'data: [DONE]\n\n'
+
+
+def chat_completion_stream(content, **kwargs):
+    """What `chat.completions.create(stream=True)` returns, for mocking it out."""
+    return openai.Stream(
+        cast_to=ChatCompletionChunk,
+        response=httpx.Response(
+            200,
+            text=chat_completion_sse(content, **kwargs),
+            request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'),
+        ),
+        client=openai_client,
+    )
+
+
+def embedding(*values):
+    """A voyage-3 shaped embedding starting with `values`, zeros after them."""
+    return [*values] + [0.0] * (1024 - len(values))
@@ -1,13 +1,37 @@
 import pytest
 from django.utils import timezone
 
+from ..output_budget import clear_budgets
 from ..score import ScoreAlgorithm
+from ..tasks import clear_latest_llm_versions
 from .factories import (
     ArenaFactory, BattleFactory, GameScoreFactory, WarriorArenaFactory,
     WarriorFactory, WarriorUserPermissionFactory,
 )
 
 
+@pytest.fixture(autouse=True)
+def no_circuit_breaker(settings):
+    """
+    The breaker commits on its own connection, past the test transaction,
+    so it would carry failures over from test to test.
+    Its own tests turn it back on for LLMs of their own.
+    """
+    settings.LLM_CIRCUIT_BREAKER = False
+
+
+@pytest.fixture(autouse=True)
+def no_latest_llm_versions():
+    """Cached per process, it would outlive the games of the test that looked it up."""
+    clear_latest_llm_versions()
+
+
+@pytest.fixture(autouse=True)
+def no_output_budgets():
+    """Learned budgets are cached per process, past the games of the test that learned them."""
+    clear_budgets()
+
+
 @pytest.fixture
 def arena(request):
     return ArenaFactory(
@@ -7,3 +7,13 @@ def test_warrior_list(admin_client, warrior_arena):
     response = admin_client.get(reverse('admin:warriors_warriorarena_changelist'))
     assert response.status_code == 200
     assert str(warrior_arena.id) in response.content.decode('utf-8')
+
+
+@pytest.mark.django_db
+def test_game_list(admin_client, battle):
+    game = battle.games.first()
+    response = admin_client.get(reverse('admin:warriors_dbgame_changelist'))
+    assert response.status_code == 200
+    content = response.content.decode('utf-8')
+    assert str(game.id) in content
+    assert 'LLM usage, last 7 days' in content
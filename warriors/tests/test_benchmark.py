@@ -0,0 +1,46 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from django_scheduler import models as scheduler_models
+
+from ..management.commands.benchmark import percentile
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    assert percentile([3, 1, 2], 0.5) == 2
+    assert percentile(list(range(100)), 0.95) == 95
+    assert percentile([1, 2], 1.0) == 2
+
+
+@pytest.mark.django_db
+def test_benchmark_needs_fake_backends(settings):
+    settings.FAKE_BACKENDS = False
+    with pytest.raises(CommandError):
+        call_command('benchmark', warriors=2, duration=0)
+
+
+@pytest.mark.benchmark
+@pytest.mark.django_db(transaction=True)
+def test_benchmark(settings, tmp_path, monkeypatch):
+    # the scheduler consumes its job registry when it starts
+    monkeypatch.setattr(scheduler_models, '_local_jobs', scheduler_models._local_jobs.copy())
+    settings.FAKE_BACKENDS = True
+    settings.FAKE_BACKEND_LATENCY = {
+        'llm': [0, 0],
+        'moderation': [0, 0],
+        'embedding': [0, 0],
+    }
+    output = tmp_path / 'benchmark.json'
+
+    call_command('benchmark', warriors=6, threads='interactive=1,background=1', cpu_processes=1, duration=10, output=str(output))
+
+    report = json.loads(output.read_text())
+    assert report['warriors'] == 6
+    assert report['battles_resolved'] > 0
+    assert report['battle_latency_p50_seconds'] <= report['battle_latency_p95_seconds']
+    assert report['warriors_battled'] > 0
+    assert report['queries_per_battle'] > 0
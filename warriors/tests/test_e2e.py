@@ -11,6 +11,7 @@ from ..battles import Battle
 from ..llms.exceptions import RateLimitError
 from ..models import WarriorArena
 from ..tasks import openai_client, resolve_battle_1_2
+from .factories import chat_completion_stream
 
 
 @pytest.mark.django_db
@@ -39,7 +40,7 @@ def test_submit_warrior_e2e(client, mocked_recaptcha, monkeypatch, default_arena
     worker_turn(timezone.now())  # run async tasks
     warrior.refresh_from_db()
     assert warrior.moderation_date is not None
-    assert warrior.warrior.voyage_3_embedding
+    assert warrior.warrior.voyage_3_embedding is not None
 
 
 @pytest.mark.django_db
@@ -51,14 +52,9 @@ def test_battle_from_warriors_e2e(monkeypatch, warrior_arena, other_warrior_aren
 
     monkeypatch.setattr(embeddings, 'get_embedding', mock.MagicMock(return_value=[0.0] * 1024))
 
-    completion_mock = mock.MagicMock()
-    completion_mock.message.content = 'Some result'
-    completion_mock.finish_reason = 'stop'
-    completions_mock = mock.MagicMock()
-    completions_mock.choices = [completion_mock]
-    completions_mock.model = 'gpt-3.5'
-    completions_mock.system_fingerprint = '1234'
-    create_mock = mock.Mock(return_value=completions_mock)
+    create_mock = mock.Mock(side_effect=lambda **kwargs: chat_completion_stream(
+        'Some result', model='gpt-3.5', system_fingerprint='1234',
+    ))
     monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
 
     battle, db_game_1_2, db_game_2_1 = Battle.create_from_warriors(warrior_arena, other_warrior_arena)
@@ -108,6 +104,25 @@ def test_battle_from_warriors_e2e(monkeypatch, warrior_arena, other_warrior_aren
     assert db_game_2_1.scores.count() == 2
 
 
+@pytest.mark.django_db
+def test_battle_with_fake_backends(settings, warrior_arena, other_warrior_arena):
+    settings.FAKE_BACKENDS = True
+    settings.FAKE_BACKEND_LATENCY = {
+        'llm': [0, 0],
+        'moderation': [0, 0],
+        'embedding': [0, 0],
+    }
+
+    battle, db_game_1_2, db_game_2_1 = Battle.create_from_warriors(warrior_arena, other_warrior_arena)
+    worker(once=True)  # run async tasks
+
+    for db_game in (db_game_1_2, db_game_2_1):
+        db_game.refresh_from_db()
+        assert db_game.resolved_at is not None
+        assert db_game.llm_version == 'fake/1'
+        assert db_game.scores.count() == 2
+
+
 @pytest.mark.django_db
 def test_battle_retry(battle, monkeypatch):
     now = timezone.now()
@@ -125,7 +140,7 @@ def test_battle_retry(battle, monkeypatch):
     # the task will be executed 10 minutes later
     monkeypatch.setattr(
         'warriors.tasks.resolve_battle_openai',
-        mock.MagicMock(return_value=('Some result', 'stop', 'gpt-3.5/1234')),
+        mock.MagicMock(return_value=('Some result', 'stop', 'gpt-3.5/1234', None)),
     )
     worker_turn(now + timezone.timedelta(minutes=10))
 
@@ -1,4 +1,4 @@
-from warriors.lcs import lcs_len, lcs_ranges
+from warriors.lcs import lcs_len, lcs_ranges, lcs_similarity
 
 
 def test_lcs_len():
@@ -19,6 +19,14 @@ def test_lcs_len():
     assert lcs_len('abc', 'aabbcc') == 3
 
 
+def test_lcs_similarity():
+    assert lcs_similarity('abcd', 'abcd') == 1.0
+    assert lcs_similarity('abcd', 'xbcx') == 0.5
+    assert lcs_similarity('abcd', '') == 0.0
+    assert lcs_similarity('', '') == 0.0
+    assert lcs_similarity('abcd', None) is None
+
+
 def test_emoiji():
     # "A" and "pen" look different, but both are in fact two characters long and the second one common.
     # This second char is a "variation selector": b'\xef\xb8\x8f'.
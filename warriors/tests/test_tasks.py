@@ -1,21 +1,29 @@
+import datetime
+import hashlib
 from unittest import mock
 
 import httpx
 import openai
 import pytest
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
 from django.utils import timezone
-from django_goals.models import AllDone, RetryMeLater
+from django_goals.models import AllDone, Goal, GoalState, RetryMeLater
 from openai.types import Moderation, ModerationCreateResponse
-from openai.types.chat.chat_completion import (
-    ChatCompletion, ChatCompletionMessage, Choice,
-)
-from openai.types.completion_usage import CompletionUsage
 
+from .. import llm_batches, output_budget
+from ..llm_batches import LLMBatch
+from ..llms.exceptions import CallCancelled, TransientLLMError
+from ..score import ScoreAlgorithm
 from ..tasks import (
-    do_moderation, openai_client, resolve_battle, schedule_battle_top_arena,
-    transfer_rating,
+    MODERATION_LOCKED_RETRY, _get_latest_llm_version, do_moderation,
+    openai_client, poll_llm_batch, resolve_battle, schedule_battle_top_arena,
+    submit_llm_batches, transfer_rating,
+)
+from ..warriors import MAX_WARRIOR_LENGTH, Warrior
+from .factories import (
+    BattleFactory, TextUnitFactory, WarriorFactory, chat_completion_stream,
+    game_of,
 )
-from ..warriors import MAX_WARRIOR_LENGTH
 
 
 @pytest.mark.django_db
@@ -91,6 +99,78 @@ def test_do_moderation(warrior, monkeypatch, moderation_flagged):
     assert warrior.moderation_model == 'moderation-asdf'
 
 
+def fake_moderations(**kwargs):
+    return mock.Mock(
+        results=[mock.Mock(flagged='flag me' in text) for text in kwargs['input']],
+        model='moderation-asdf',
+    )
+
+
+@pytest.mark.django_db
+def test_do_moderation_takes_waiting_warriors_along(monkeypatch):
+    warrior, waiting, flagged = [
+        WarriorFactory(moderation_passed=None, body=body)
+        for body in ['hello', 'waiting', 'flag me']
+    ]
+    WarriorFactory()  # moderated already
+    moderation_mock = mock.Mock(side_effect=fake_moderations)
+    monkeypatch.setattr(openai_client.moderations, 'create', moderation_mock)
+
+    do_moderation(None, warrior.id)
+
+    moderation_mock.assert_called_once()
+    assert len(moderation_mock.call_args.kwargs['input']) == 3
+    for w, passed in [(warrior, True), (waiting, True), (flagged, False)]:
+        w.refresh_from_db()
+        assert w.moderation_passed is passed
+        assert w.moderation_date is not None
+
+    # the goals of the warriors taken along have nothing left to do
+    assert isinstance(do_moderation(None, waiting.id), AllDone)
+    moderation_mock.assert_called_once()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_do_moderation_skips_warrior_locked_by_another_batch(monkeypatch):
+    warrior = WarriorFactory(moderation_passed=None)
+    moderation_mock = mock.Mock(side_effect=fake_moderations)
+    monkeypatch.setattr(openai_client.moderations, 'create', moderation_mock)
+    other_batch = connections.create_connection(DEFAULT_DB_ALIAS)
+    try:
+        other_batch.ensure_connection()
+        with other_batch.connection.transaction(), other_batch.connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT 1 FROM {Warrior._meta.db_table} WHERE id = %s FOR NO KEY UPDATE',
+                [warrior.id],
+            )
+            with transaction.atomic():
+                ret = do_moderation(None, warrior.id)
+    finally:
+        other_batch.close()
+    assert isinstance(ret, RetryMeLater)
+    assert ret.precondition_date - timezone.now() <= MODERATION_LOCKED_RETRY
+    moderation_mock.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_do_moderation_batch_falls_back_to_one(monkeypatch):
+    warrior, waiting = WarriorFactory.create_batch(2, moderation_passed=None)
+
+    def moderations(**kwargs):
+        if len(kwargs['input']) > 1:
+            raise openai.OpenAIError('one of the inputs is invalid')
+        return fake_moderations(**kwargs)
+    monkeypatch.setattr(openai_client.moderations, 'create', moderations)
+
+    do_moderation(None, warrior.id)
+
+    warrior.refresh_from_db()
+    waiting.refresh_from_db()
+    assert warrior.moderation_passed is True
+    # left for its own goal
+    assert waiting.moderation_date is None
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize('warrior_arena', [{'rating': 100}], indirect=True)
 @pytest.mark.parametrize('other_warrior_arena', [{'rating': 250}], indirect=True)
@@ -106,28 +186,18 @@ def test_resolve_battle(arena, battle, monkeypatch):
     assert battle.warrior_1.body
     assert battle.warrior_2.body
 
-    completion_message = ChatCompletionMessage(
-        role='assistant',
-        content='Some result',
-    )
-    completion_choice = Choice(
-        index=0,
-        message=completion_message,
-        finish_reason='stop',
-    )
-    completions = ChatCompletion(
-        id='chatcmpl-123',
-        object='chat.completion',
-        created=1234567890,
-        model='gpt-3.5',
-        choices=[completion_choice],
-        usage=CompletionUsage(prompt_tokens=10, completion_tokens=10, total_tokens=20),
-        system_fingerprint='1234',
-    )
-    create_mock = mock.Mock(return_value=completions)
+    create_mock = mock.Mock(return_value=chat_completion_stream(
+        'Some result', model='gpt-3.5', system_fingerprint='1234',
+        usage={
+            'prompt_tokens': 40,
+            'completion_tokens': 5,
+            'total_tokens': 45,
+            'prompt_tokens_details': {'cached_tokens': 0},
+        },
+    ))
     monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
 
-    resolve_battle(None, battle.id, '2_1')
+    r = resolve_battle(None, battle.id, '2_1')
 
     # LLM was properly invoked
     assert create_mock.call_count == 1
@@ -143,6 +213,11 @@ def test_resolve_battle(arena, battle, monkeypatch):
     assert game.finish_reason == 'stop'
     assert game.resolved_at is not None
     assert game.llm_version == 'gpt-3.5/1234'
+    assert game.input_tokens == 40
+    assert game.output_tokens == 5
+    assert game.reasoning_tokens == 0
+    assert game.latency >= 0
+    assert game.total_latency == game.latency
 
     # and the battle's directional columns mirror it
     battle.refresh_from_db()
@@ -152,6 +227,14 @@ def test_resolve_battle(arena, battle, monkeypatch):
     assert battle.resolved_at_2_1 == game.resolved_at
     assert battle.llm_version_2_1 == game.llm_version
 
+    # scored in the same pass, only the embeddings score waits, on its goal
+    lcs_score = game.scores.get(algorithm=ScoreAlgorithm.LCS)
+    assert lcs_score.processed_goal is None
+    assert lcs_score.warrior_1_similarity is not None
+    embeddings_score = game.scores.get(algorithm=ScoreAlgorithm.EMBEDDINGS)
+    assert isinstance(r, RetryMeLater)
+    assert r.precondition_goals == [embeddings_score.processed_goal]
+
 
 @pytest.mark.django_db
 @pytest.mark.parametrize('battle', [{'attempts_2_1': 10}], indirect=True)
@@ -183,35 +266,329 @@ def test_resolve_battle_rate_limit(battle, monkeypatch):
     ret = resolve_battle(None, battle.id, '2_1')
     assert isinstance(ret, RetryMeLater)
 
-    # nothing recorded but the attempt, which the battle mirrors too
+    # nothing recorded but the attempt, which the battle mirrors too, and how long it took
     game = battle.games.get(warrior_1=battle.warrior_2)
     assert game.resolved_at is None
     assert game.attempts == 1
+    assert game.latency is None
+    assert game.total_latency >= 0
     battle.refresh_from_db()
     assert battle.attempts_2_1 == game.attempts
 
 
 @pytest.mark.django_db
-def test_resolve_battle_character_limit(battle, monkeypatch):
-    completion_message = ChatCompletionMessage(
-        role='assistant',
-        content='Some result' * 100,
+def test_resolve_battle_hedged(battle, settings, monkeypatch):
+    settings.LLM_HEDGES_PER_DAY = {battle.llm: 10}
+    take_hedge = mock.Mock(return_value=True)
+    monkeypatch.setattr('warriors.tasks.llm_hedging.take_hedge', take_hedge)
+    battle.games.update(latency_critical=True)
+    monkeypatch.setattr(
+        'warriors.tasks.llm_hedging.get_hedge_delay',
+        lambda llm: datetime.timedelta(milliseconds=50),
     )
-    completion_choice = Choice(
-        index=0,
-        message=completion_message,
-        finish_reason='stop',
+    calls = []
+
+    def resolve_battle_openai(prompt_a, prompt_b, max_output_tokens=None, cancel=None):
+        calls.append(cancel)
+        if len(calls) == 1:
+            # the first call hangs until the duplicate wins
+            cancel.wait(timeout=5)
+            raise CallCancelled()
+        return ('Some result', 'stop', 'gpt-5-mini/fp', None)
+    monkeypatch.setattr('warriors.tasks.resolve_battle_openai', resolve_battle_openai)
+
+    resolve_battle(None, battle.id, '1_2')
+
+    assert len(calls) == 2
+    game = game_of(battle, '1_2')
+    assert game.result == 'Some result'
+    assert game.hedged
+    take_hedge.assert_called_once_with(battle.llm)
+
+
+@pytest.mark.django_db
+def test_resolve_battle_waits_for_circuit(battle, monkeypatch):
+    monkeypatch.setattr('warriors.tasks.circuit_breaker.check', lambda llm: datetime.timedelta(minutes=3))
+    create_mock = mock.Mock()
+    monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
+
+    ret = resolve_battle(None, battle.id, '1_2')
+
+    assert isinstance(ret, RetryMeLater)
+    assert ret.precondition_date > timezone.now() + datetime.timedelta(minutes=2)
+    assert not create_mock.called
+    # parking is not an attempt
+    game = game_of(battle, '1_2')
+    assert game.attempts == 0
+    assert game.resolved_at is None
+
+
+@pytest.mark.django_db
+def test_resolve_battle_waits_for_rate_limit(battle, monkeypatch):
+    monkeypatch.setattr(
+        'warriors.tasks.rate_limit.acquire',
+        mock.Mock(return_value=datetime.timedelta(seconds=5)),
     )
-    completions = ChatCompletion(
-        id='chatcmpl-123',
-        object='chat.completion',
-        created=1234567890,
-        model='gpt-3.5',
-        choices=[completion_choice],
-        usage=CompletionUsage(prompt_tokens=10, completion_tokens=10, total_tokens=20),
-        system_fingerprint='1234',
+    create_mock = mock.Mock()
+    monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
+
+    ret = resolve_battle(None, battle.id, '1_2')
+    assert isinstance(ret, RetryMeLater)
+    assert ret.precondition_date > timezone.now()
+
+    # the call was never made, so it is not an attempt
+    assert not create_mock.called
+    game = battle.games.get(warrior_1=battle.warrior_1)
+    assert game.resolved_at is None
+    assert game.attempts == 0
+
+
+@pytest.fixture
+def identical_battle(arena, battle):
+    """An earlier battle between the same warriors, fully resolved an hour ago."""
+    resolved_at = timezone.now() - datetime.timedelta(hours=1)
+    identical_battle = BattleFactory(
+        llm=battle.llm,
+        warrior_1=battle.warrior_1,
+        warrior_2=battle.warrior_2,
+        scheduled_at=resolved_at,
+        resolved_at_1_2=resolved_at,
+        text_unit_1_2=TextUnitFactory(),
+        finish_reason_1_2='stop',
+        llm_version_1_2='gpt-3.5/1234',
+        input_sha256_1_2=hashlib.sha256(
+            (battle.warrior_1.body + battle.warrior_2.body).encode('utf-8')
+        ).digest(),
     )
-    create_mock = mock.Mock(return_value=completions)
+    battle.arena = arena
+    battle.save(update_fields=['arena'])
+    return identical_battle
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('reuse_results_max_age, reused', [
+    (datetime.timedelta(days=1), True),
+    (datetime.timedelta(minutes=10), False),
+    (None, False),
+])
+def test_resolve_battle_reuses_identical_result(
+    arena, battle, identical_battle, monkeypatch,
+    reuse_results_max_age, reused,
+):
+    arena.reuse_results_max_age = reuse_results_max_age
+    arena.save(update_fields=['reuse_results_max_age'])
+    create_mock = mock.Mock(return_value=chat_completion_stream(
+        'Fresh result', model='gpt-3.5', system_fingerprint='5678',
+    ))
+    monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
+
+    resolve_battle(None, battle.id, '1_2')
+
+    game = game_of(battle, '1_2')
+    identical_game = game_of(identical_battle, '1_2')
+    assert game.resolved_at is not None
+    assert create_mock.called != reused
+    if reused:
+        assert game.text_unit_id == identical_game.text_unit_id
+        assert game.finish_reason == 'stop'
+        assert game.llm_version == 'gpt-3.5/1234'
+    else:
+        assert game.text_unit.content == 'Fresh result'
+        assert game.llm_version == 'gpt-3.5/5678'
+
+
+@pytest.mark.django_db
+def test_latest_llm_version_is_cached(battle, django_assert_num_queries):
+    battle.games.update(llm_version='gpt-3.5/1234')
+    assert _get_latest_llm_version(battle.llm) == 'gpt-3.5/1234'
+
+    battle.games.update(llm_version='gpt-4/1234')
+    with django_assert_num_queries(0):
+        assert _get_latest_llm_version(battle.llm) == 'gpt-3.5/1234'
+
+
+@pytest.mark.django_db
+def test_resolve_battle_waits_for_identical_game_in_flight(arena, battle, identical_battle, monkeypatch):
+    arena.reuse_results_max_age = datetime.timedelta(days=1)
+    arena.save(update_fields=['reuse_results_max_age'])
+    identical_game = game_of(identical_battle, '1_2')
+    identical_game.resolved_at = None
+    identical_game.processed_goal = Goal.objects.create(
+        handler='warriors.tasks.resolve_battle_1_2',
+        state=GoalState.WAITING_FOR_WORKER,
+    )
+    identical_game.save(update_fields=['resolved_at', 'processed_goal'])
+    create_mock = mock.Mock()
+    monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
+
+    ret = resolve_battle(None, battle.id, '1_2')
+
+    assert isinstance(ret, RetryMeLater)
+    assert not create_mock.called
+    assert game_of(battle, '1_2').resolved_at is None
+
+
+@pytest.mark.django_db
+def test_resolve_battle_in_batch(battle, settings, monkeypatch):
+    settings.LLM_BATCH = {battle.llm: True}
+    battle.games.update(resolve_in_batch=True)
+    game_1_2 = game_of(battle, '1_2')
+    game_2_1 = game_of(battle, '2_1')
+    submit_mock = mock.Mock(return_value='batch-1')
+    monkeypatch.setattr('warriors.tasks.llm_batches.submit_battle_batch', submit_mock)
+    results_mock = mock.Mock(return_value=None)
+    monkeypatch.setattr('warriors.tasks.llm_batches.get_battle_batch_results', results_mock)
+    create_mock = mock.Mock(side_effect=openai.APIStatusError(
+        'not now',
+        response=httpx.Response(503, request=httpx.Request('POST', 'https://openai.com')),
+        body=None,
+    ))
+    monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
+
+    # waiting to be collected into a batch
+    ret = resolve_battle(None, battle.id, '1_2')
+    assert isinstance(ret, RetryMeLater)
+    assert ret.precondition_date > timezone.now()
+
+    submit_llm_batches()
+    llm_batch = LLMBatch.objects.get()
+    assert llm_batch.provider_batch_id == 'batch-1'
+    submit_mock.assert_called_once_with(battle.llm, {
+        str(game_1_2.id): battle.warrior_1.body + battle.warrior_2.body,
+        str(game_2_1.id): battle.warrior_2.body + battle.warrior_1.body,
+    }, output_budget.DEFAULT_BUDGET)
+
+    # waiting for the batch
+    ret = resolve_battle(None, battle.id, '1_2')
+    assert isinstance(ret, RetryMeLater)
+    assert list(ret.precondition_goals) == [llm_batch.processed_goal]
+
+    ret = poll_llm_batch(llm_batch.processed_goal)
+    assert isinstance(ret, RetryMeLater)
+
+    # one game came back, the other one ran out of tokens
+    results_mock.return_value = {
+        str(game_1_2.id): ('battle result', 'stop', 'gpt-5-mini/fp', None),
+        str(game_2_1.id): ('', 'error', 'gpt-5-mini/fp', None),
+    }
+    ret = poll_llm_batch(llm_batch.processed_goal)
+    assert isinstance(ret, AllDone)
+    game_1_2.refresh_from_db()
+    assert game_1_2.text_unit.content == 'battle result'
+    assert game_1_2.finish_reason == 'stop'
+    assert game_1_2.llm_version == 'gpt-5-mini/fp'
+    assert game_1_2.resolved_at is not None
+    assert game_1_2.max_output_tokens == output_budget.DEFAULT_BUDGET
+    battle.refresh_from_db()
+    assert battle.text_unit_1_2 == game_1_2.text_unit
+    assert not create_mock.called
+    game_2_1.refresh_from_db()
+    assert game_2_1.resolved_at is None
+
+    # which falls back to the synchronous call, with a raised budget
+    resolve_battle(None, battle.id, '2_1')
+    assert create_mock.called
+    assert create_mock.call_args.kwargs['max_completion_tokens'] == output_budget.RETRY_BUDGET
+
+
+@pytest.mark.django_db
+def test_failed_batch_submission_releases_games(battle, settings, monkeypatch):
+    settings.LLM_BATCH = {battle.llm: True}
+    battle.games.update(resolve_in_batch=True)
+    submit_mock = mock.Mock(side_effect=TransientLLMError('upload failed'))
+    monkeypatch.setattr('warriors.tasks.llm_batches.submit_battle_batch', submit_mock)
+
+    with pytest.raises(TransientLLMError):
+        submit_llm_batches()
+
+    assert LLMBatch.objects.get().completed_at is not None
+    assert not battle.games.filter(llm_batch__isnull=False).exists()
+
+    # and the next collection takes them again
+    submit_mock.side_effect = None
+    submit_mock.return_value = 'batch-2'
+    submit_llm_batches()
+    assert battle.games.filter(llm_batch__provider_batch_id='batch-2').count() == 2
+
+
+@pytest.mark.django_db
+def test_poll_releases_batch_never_submitted(battle, settings, monkeypatch):
+    settings.LLM_BATCH = {battle.llm: True}
+    battle.games.update(resolve_in_batch=True)
+    # the submitter died after claiming the games
+    monkeypatch.setattr('warriors.tasks.llm_batches.submit_battle_batch', mock.Mock(side_effect=SystemExit))
+    with pytest.raises(SystemExit):
+        submit_llm_batches()
+    llm_batch = LLMBatch.objects.get()
+
+    ret = poll_llm_batch(llm_batch.processed_goal)
+    assert isinstance(ret, RetryMeLater)
+    assert battle.games.filter(llm_batch=llm_batch).count() == 2
+
+    LLMBatch.objects.update(created_at=timezone.now() - llm_batches.SUBMIT_TIMEOUT)
+    ret = poll_llm_batch(llm_batch.processed_goal)
+    assert isinstance(ret, AllDone)
+    assert not battle.games.filter(llm_batch=llm_batch).exists()
+
+
+@pytest.mark.django_db
+def test_resolve_battle_retries_with_raised_output_budget(battle, monkeypatch):
+    def usage(completion_tokens, reasoning_tokens):
+        return {
+            'prompt_tokens': 40,
+            'completion_tokens': completion_tokens,
+            'total_tokens': 40 + completion_tokens,
+            'completion_tokens_details': {'reasoning_tokens': reasoning_tokens},
+        }
+
+    create_mock = mock.Mock(side_effect=[
+        # reasoning ate the whole budget
+        chat_completion_stream('', finish_reason='length', usage=usage(500, 500)),
+        chat_completion_stream('Some result', usage=usage(600, 590)),
+    ])
+    monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
+
+    ret = resolve_battle(None, battle.id, '1_2')
+    assert isinstance(ret, RetryMeLater)
+    assert create_mock.call_args.kwargs['max_completion_tokens'] == output_budget.DEFAULT_BUDGET
+    game = game_of(battle, '1_2')
+    assert game.resolved_at is None
+    assert game.max_output_tokens == output_budget.RETRY_BUDGET
+    assert game.output_tokens == 500
+
+    resolve_battle(None, battle.id, '1_2')
+    assert create_mock.call_args.kwargs['max_completion_tokens'] == output_budget.RETRY_BUDGET
+    game.refresh_from_db()
+    assert game.finish_reason == 'stop'
+    assert game.result == 'Some result'
+    assert game.max_output_tokens == output_budget.RETRY_BUDGET
+    # both calls were billed
+    assert game.input_tokens == 80
+    assert game.output_tokens == 1100
+    assert game.reasoning_tokens == 1090
+    # but what the game needed is what the last call spent
+    assert game.last_output_tokens == 600
+    assert game.total_latency >= game.latency
+
+
+@pytest.mark.django_db
+def test_resolve_battle_runs_out_of_raised_output_budget(battle, monkeypatch):
+    create_mock = mock.Mock(side_effect=lambda **kwargs: chat_completion_stream('', finish_reason='length'))
+    monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
+
+    resolve_battle(None, battle.id, '1_2')
+    resolve_battle(None, battle.id, '1_2')
+
+    # only one retry
+    assert create_mock.call_count == 2
+    game = game_of(battle, '1_2')
+    assert game.finish_reason == 'error'
+    assert game.resolved_at is not None
+
+
+@pytest.mark.django_db
+def test_resolve_battle_character_limit(battle, monkeypatch):
+    create_mock = mock.Mock(return_value=chat_completion_stream('Some result' * 300))
     monkeypatch.setattr(openai_client.chat.completions, 'create', create_mock)
 
     resolve_battle(None, battle.id, '1_2')
@@ -220,6 +597,9 @@ def test_resolve_battle_character_limit(battle, monkeypatch):
     game = battle.games.get(warrior_1=battle.warrior_1)
     assert game.finish_reason == 'character_limit'
     assert len(game.text_unit.content) == MAX_WARRIOR_LENGTH
+    # the hang-up left no usage reported, the estimate bills the game but teaches no budget
+    assert game.output_tokens > MAX_WARRIOR_LENGTH // 4
+    assert game.last_output_tokens is None
 
 
 @pytest.mark.django_db
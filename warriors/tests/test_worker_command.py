@@ -4,6 +4,7 @@ from unittest.mock import Mock
 
 import pytest
 
+from warriors import priority
 from warriors.management.commands import worker
 
 
@@ -30,3 +31,21 @@ def test_requested_stop_does_not_kill_the_process(monkeypatch):
     worker.Command._run_scheduler(stop_event)
 
     kill.assert_not_called()
+
+
+@pytest.mark.parametrize(('once', 'lane', 'expected'), [
+    (False, priority.BACKGROUND, worker.IDLE_POLL_INTERVAL),
+    (False, priority.INTERACTIVE, worker.SHORT_IDLE_POLL_INTERVAL),
+    (True, priority.BACKGROUND, worker.SHORT_IDLE_POLL_INTERVAL),
+])
+def test_idle_poll_interval(once, lane, expected):
+    """Interactive threads don't leave a goal waiting on a missed notification"""
+    thread = worker.ListeningThread(
+        listener=Mock(),
+        stop_event=threading.Event(),
+        once=once,
+        workers_state=Mock(),
+        thread_id='worker_0',
+        deadline_horizon=priority.LANE_HORIZONS[lane],
+    )
+    assert thread.idle_poll_interval() == expected
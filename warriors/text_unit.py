@@ -1,8 +1,9 @@
 import hashlib
 import uuid
 
-from django.db import models
+from django.db import connection, models
 from django.utils import timezone
+from django_goals.models import schedule
 
 from .embeddings import EmbeddingMixin, _ensure_voyage_3_embedding
 
@@ -22,7 +23,7 @@ class TextUnit(EmbeddingMixin, models.Model):
         default=timezone.now,
     )
 
-    class Meta:
+    class Meta(EmbeddingMixin.Meta):
         ordering = ('id',)
         constraints = [
             models.CheckConstraint(
@@ -40,21 +41,57 @@ class TextUnit(EmbeddingMixin, models.Model):
 
     @classmethod
     def get_or_create_by_content(cls, content, now=None):
+        return cls.bulk_get_or_create_by_content([content], now=now)[0]
+
+    @classmethod
+    def bulk_get_or_create_by_content(cls, contents, now=None):
+        """
+        Text units of the contents, in their order, created if missing.
+
+        One upsert for all of them, moving `created_at` back to `now` if it's earlier.
+        Only units without an embedding cost more statements, to schedule one.
+        """
         if now is None:
             now = timezone.now()
-        sha_256 = hashlib.sha256(content.encode('utf-8')).digest()
-        text_unit, created = cls.objects.get_or_create(
-            sha_256=sha_256,
-            defaults={
-                'content': content,
-                'created_at': now,
-            },
-        )
-        cls.objects.filter(pk=text_unit.pk).update(
-            created_at=models.functions.Least('created_at', now),
-        )
-        text_unit.schedule_voyage_3_embedding()
-        return text_unit
+        sha_256s = [hashlib.sha256(content.encode('utf-8')).digest() for content in contents]
+        if not sha_256s:
+            return []
+        # rows are locked in sha order, so concurrent upserts can't deadlock
+        rows = sorted(dict(zip(sha_256s, contents)).items())
+        # the embedding stays deferred, only whether there is one is returned
+        fields = [
+            field for field in cls._meta.concrete_fields
+            if field.attname != 'voyage_3_embedding'
+        ]
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (id, content, sha_256, created_at)
+                VALUES {', '.join(['(%s, %s, %s, %s)'] * len(rows))}
+                ON CONFLICT (sha_256) DO UPDATE
+                SET created_at = LEAST({table}.created_at, EXCLUDED.created_at)
+                RETURNING {', '.join(field.column for field in fields)}, voyage_3_embedding IS NOT NULL
+                """,
+                [
+                    value
+                    for sha_256, content in rows
+                    for value in (uuid.uuid4(), content, sha_256, now)
+                ],
+            )
+            text_units = {}
+            unscheduled = []
+            for *values, embedded in cursor.fetchall():
+                unit = cls.from_db(connection.alias, [field.attname for field in fields], values)
+                text_units[bytes(unit.sha_256)] = unit
+                if not embedded and not unit.voyage_3_embedding_goal_id:
+                    unscheduled.append(unit)
+
+        for unit in unscheduled:
+            unit.voyage_3_embedding_goal = schedule(unit.ensure_voyage_3_embedding_handler)
+        cls.objects.bulk_update(unscheduled, ['voyage_3_embedding_goal'])
+
+        return [text_units[sha_256] for sha_256 in sha_256s]
 
     @property
     def ensure_voyage_3_embedding_handler(self):
@@ -4,7 +4,9 @@ from unittest import mock
 import pytest
 from django.utils import timezone
 from django_goals.busy_worker import worker_turn
+from django_goals.models import Goal
 
+from .tests.factories import embedding
 from .text_unit import TextUnit
 
 
@@ -20,6 +22,29 @@ def test_text_unit_get_or_create_updates_created_at():
     assert text_unit.created_at == then
 
 
+@pytest.mark.django_db
+def test_bulk_get_or_create_by_content():
+    existing = TextUnit.get_or_create_by_content('b')
+
+    text_units = TextUnit.bulk_get_or_create_by_content(['a', 'b', 'a'])
+
+    assert [text_unit.content for text_unit in text_units] == ['a', 'b', 'a']
+    assert text_units[0].id == text_units[2].id
+    assert text_units[1].id == existing.id
+    assert text_units[1].voyage_3_embedding_goal_id == existing.voyage_3_embedding_goal_id
+    assert text_units[0].voyage_3_embedding_goal is not None
+    assert TextUnit.objects.count() == 2
+    assert TextUnit.bulk_get_or_create_by_content([]) == []
+
+
+@pytest.mark.django_db
+def test_get_or_create_existing_is_one_statement(django_assert_num_queries):
+    TextUnit.get_or_create_by_content('content')
+
+    with django_assert_num_queries(1):
+        TextUnit.get_or_create_by_content('content')
+
+
 @pytest.mark.django_db
 def test_embedding():
     text_unit = TextUnit.get_or_create_by_content('content')
@@ -36,3 +61,20 @@ def test_embedding():
     text_unit.refresh_from_db()
     assert text_unit.voyage_3_embedding is not None
     assert len(text_unit.voyage_3_embedding) == 1024
+
+
+@pytest.mark.django_db
+def test_embedding_deferred():
+    text_unit = TextUnit.get_or_create_by_content('content')
+    text_unit.voyage_3_embedding = embedding(0.5, 0.25)
+    text_unit.save(update_fields=['voyage_3_embedding'])
+
+    deferred = TextUnit.objects.get(id=text_unit.id)
+    assert 'voyage_3_embedding' in deferred.get_deferred_fields()
+    # and through relations too
+    related = Goal.objects.get(id=text_unit.voyage_3_embedding_goal_id).textunit
+    assert 'voyage_3_embedding' in related.get_deferred_fields()
+    assert related.voyage_3_embedding == embedding(0.5, 0.25)
+
+    loaded = TextUnit.objects.with_embeddings().get(id=text_unit.id)
+    assert not loaded.get_deferred_fields()
@@ -189,7 +189,10 @@ class ChallengeWarriorView(WarriorViewMixin, FormView):
         return context
 
     def form_valid(self, form):
-        self.battle, _, _ = Battle.create_from_warriors(self.warrior, form.cleaned_data['warrior'])
+        self.battle, _, _ = Battle.create_from_warriors(
+            self.warrior, form.cleaned_data['warrior'],
+            interactive=True,
+        )
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -356,6 +359,8 @@ class UpcomingBattlesView(ArenaViewMixin, ListView):
     def get_queryset(self):
         qs = WarriorArena.objects.battleworthy().filter(arena=self.arena).select_related(
             'warrior',
+        ).defer(
+            'warrior__voyage_3_embedding',
         )
         user = self.request.user
         if user.is_authenticated:
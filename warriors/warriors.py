@@ -1,3 +1,6 @@
+import datetime
+import random
+import threading
 import uuid
 from functools import lru_cache
 
@@ -7,24 +10,27 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_goals.models import AllDone
 
-from .embeddings import EmbeddingMixin, _ensure_voyage_3_embedding
+from . import onboarding
+from .embeddings import (
+    EmbeddingManager, EmbeddingMixin, EmbeddingQuerySet,
+    _ensure_voyage_3_embedding,
+)
 
 
 MAX_WARRIOR_LENGTH = 1000
+# Naming shows the LLM examples drawn from a pool of this many named warriors,
+# reloaded this often, rather than sorting the warrior table at random for each name.
+NAME_EXAMPLE_POOL_SIZE = 200
+NAME_EXAMPLE_POOL_MAX_AGE = datetime.timedelta(hours=1)
 
 
-class WarriorQuerySet(models.QuerySet):
+class WarriorQuerySet(EmbeddingQuerySet):
     def battleworthy(self):
         return self.filter(
             moderation_passed=True,
         )
 
 
-class WarriorManager(models.Manager):
-    def get_queryset(self):
-        return super().get_queryset().defer('voyage_3_embedding')
-
-
 class Warrior(EmbeddingMixin, models.Model):
     id = models.UUIDField(
         primary_key=True,
@@ -72,6 +78,11 @@ class Warrior(EmbeddingMixin, models.Model):
         max_length=100,
         blank=True,
     )
+    first_result_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text=_('When the first game of the warrior resolved, the end of its onboarding.'),
+    )
 
     public_battle_results = models.BooleanField(
         default=False,
@@ -97,9 +108,9 @@ class Warrior(EmbeddingMixin, models.Model):
         related_name='+',  # TODO: change to 'warriors'
     )
 
-    objects = WarriorManager.from_queryset(WarriorQuerySet)()
+    objects = EmbeddingManager.from_queryset(WarriorQuerySet)()
 
-    class Meta:
+    class Meta(EmbeddingMixin.Meta):
         ordering = ('id',)
         constraints = [
             models.CheckConstraint(
@@ -133,26 +144,27 @@ class Warrior(EmbeddingMixin, models.Model):
 
 def ensure_voyage_3_embedding(goal):
     instance = goal.warrior
-    return _ensure_voyage_3_embedding(instance)
+    result = _ensure_voyage_3_embedding(instance)
+    if isinstance(result, AllDone):
+        onboarding.log_stage(instance, onboarding.EMBEDDED)
+    return result
 
 
 def ensure_name_generated(goal, warrior_id):
     warrior = Warrior.objects.get(id=warrior_id)
     if not warrior.name and warrior.moderation_passed:
         generate_warrior_name(warrior)
+        onboarding.log_stage(warrior, onboarding.NAMED)
     return AllDone()
 
 
 def generate_warrior_name(warrior, samples=20):
-    from .llms.openai import call_llm
-
-    # Get 10 random warriors with names and approved moderation
-    example_warriors = Warrior.objects.filter(
-        moderation_passed=True,
-    ).exclude(name='').exclude(id=warrior.id).order_by('?')[:samples]
+    if settings.FAKE_BACKENDS:
+        from .llms.fake import call_llm
+    else:
+        from .llms.openai import call_llm
 
-    # Prepare examples for call_llm
-    examples = [(w.body, w.name) for w in example_warriors]
+    examples = get_name_examples(samples, exclude_id=warrior.id)
 
     # Call the language model
     system_prompt = (
@@ -174,3 +186,46 @@ def generate_warrior_name(warrior, samples=20):
 
     warrior.name = generated_name.strip()[:40]
     warrior.save(update_fields=['name'])
+
+
+_name_example_pool_lock = threading.Lock()
+_name_example_pool = []  # (warrior id, body, name)
+_name_example_pool_loaded_at = None
+
+
+def get_name_examples(samples, exclude_id=None):
+    """(body, name) of random named warriors, for few-shot naming."""
+    global _name_example_pool, _name_example_pool_loaded_at
+    with _name_example_pool_lock:
+        now = timezone.now()
+        if (
+            _name_example_pool_loaded_at is None or
+            now - _name_example_pool_loaded_at > NAME_EXAMPLE_POOL_MAX_AGE
+        ):
+            _name_example_pool = load_name_example_pool()
+            _name_example_pool_loaded_at = now
+        pool = [
+            (body, name)
+            for id_, body, name in _name_example_pool
+            if id_ != exclude_id
+        ]
+    return random.sample(pool, min(samples, len(pool)))
+
+
+def load_name_example_pool(size=NAME_EXAMPLE_POOL_SIZE):
+    """
+    A random sample of named warriors, without a random sort of the whole table.
+
+    Warrior ids are random, so the warriors following a random id make a random sample,
+    and the primary key index finds them reading no more than the sample.
+    """
+    named_warriors = Warrior.objects.filter(
+        moderation_passed=True,
+    ).exclude(
+        name='',
+    ).order_by('id').values_list('id', 'body', 'name')
+    start = uuid.uuid4()
+    pool = list(named_warriors.filter(id__gte=start)[:size])
+    # wrap around past the highest id
+    pool += named_warriors.filter(id__lt=start)[:size - len(pool)]
+    return pool
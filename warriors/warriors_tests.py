@@ -0,0 +1,40 @@
+import pytest
+
+from . import warriors
+from .tests.factories import WarriorFactory
+
+
+@pytest.fixture
+def fresh_name_example_pool(monkeypatch):
+    monkeypatch.setattr(warriors, '_name_example_pool', [])
+    monkeypatch.setattr(warriors, '_name_example_pool_loaded_at', None)
+
+
+@pytest.mark.django_db
+def test_load_name_example_pool():
+    named = {w.id for w in WarriorFactory.create_batch(5, name='named')}
+    WarriorFactory(name='')
+    WarriorFactory(name='flagged', moderation_passed=False)
+
+    # wrapping around, whatever the starting point, every named warrior is in
+    assert {id_ for id_, _, _ in warriors.load_name_example_pool()} == named
+    assert len(warriors.load_name_example_pool(size=3)) == 3
+
+
+@pytest.mark.django_db
+def test_get_name_examples(fresh_name_example_pool):
+    warrior, *others = WarriorFactory.create_batch(4, name='named')
+
+    examples = warriors.get_name_examples(10, exclude_id=warrior.id)
+
+    assert sorted(examples) == sorted((w.body, w.name) for w in others)
+    assert len(warriors.get_name_examples(2)) == 2
+
+
+@pytest.mark.django_db
+def test_name_example_pool_is_reused(fresh_name_example_pool, django_assert_num_queries):
+    WarriorFactory.create_batch(3, name='named')
+    warriors.get_name_examples(2)
+
+    with django_assert_num_queries(0):
+        warriors.get_name_examples(2)